@@ -1,22 +1,132 @@
+import os
 import re
-from fastapi import FastAPI, HTTPException, Depends, Query, APIRouter
+import time
+import io
+import csv
+import json
+import base64
+import random
+import asyncio
+import hashlib
+import logging
+import contextlib
+import functools
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import FastAPI, HTTPException, Depends, Query, APIRouter, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import validator
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import SQLModel, Field, Session, create_engine, select
-from typing import Optional, Annotated
-from sqlalchemy.orm import Session as SessionType
-from sqlalchemy import BigInteger
+from fastapi.responses import StreamingResponse
+from sqlmodel import SQLModel, Field, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional, Annotated, Literal
+from sqlalchemy import (BigInteger, Integer, Index, UniqueConstraint, cast, delete, event,
+                        func, literal_column, or_, text, tuple_, update)
+from sqlalchemy import inspect as sqlalchemy_inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex
 from datetime import date
 from fastapi.openapi.utils import get_openapi
 import jdatetime
 
-sqlite_file_name = "Final.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+import changes
+import encoding
+import metrics
+import profiling
+import scheduler
+import validation
+import writequeue
+
+try:
+    import pyarrow
+except ImportError:  # خروجی Arrow اختیاری است
+    pyarrow = None
+
+sqlite_file_name = os.environ.get("UNI_DB", "Final.db")
 
 router = APIRouter(prefix="/api")
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+logger = logging.getLogger("uvicorn.error")
+
+# پروفایل تنظیمات SQLite که روی هر اتصال اعمال می‌شود؛ مقدار خالی یعنی پیش‌فرض SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("UNI_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("UNI_SQLITE_SYNCHRONOUS", "NORMAL"),
+    # مقدار منفی یعنی کیلوبایت (64 مگابایت)
+    "cache_size": os.environ.get("UNI_SQLITE_CACHE_SIZE", "-65536"),
+    "mmap_size": os.environ.get("UNI_SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": os.environ.get("UNI_SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": os.environ.get("UNI_SQLITE_BUSY_TIMEOUT", "5000"),
+}
+
+for _name, _value in SQLITE_PRAGMAS.items():
+    if _value and not re.fullmatch(r"-?\w+", _value):
+        raise ValueError(f"Invalid value for SQLite pragma {_name}: {_value!r}")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if value:
+            cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+# زمان و تعداد دستورهای SQL هر درخواست برای /api/metrics و پروفایل
+def _start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    metrics.record_sql(elapsed)
+    profiling.record_sql(conn, statement, parameters, executemany, elapsed)
+
+
+def _create_engine(path: str):
+    """Create the async engine for the SQLite file at ``path`` with the per-connection hooks."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    event.listen(engine.sync_engine, "before_cursor_execute", _start_sql_timer)
+    event.listen(engine.sync_engine, "after_cursor_execute", _stop_sql_timer)
+    return engine
+
+
+# serve.py و benchmark.py پیش از بالا آمدن برنامه مهاجرت‌ها را با همین موتور اجرا می‌کنند
+engine = _create_engine(sqlite_file_name)
+
+
+async def _effective_pragmas() -> dict:
+    async with engine.connect() as conn:
+        return {name: (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+                for name in SQLITE_PRAGMAS}
+
+# تعداد ردیف‌هایی که در هر تراکنش ورود گروهی نوشته می‌شوند
+BULK_BATCH_SIZE = 1000
+
+# سقف اندازه صفحه در حالت offset و در حالت cursor (keyset)
+PAGE_MAX_LIMIT = 100
+KEYSET_MAX_LIMIT = 1000
+
+# تعداد ردیف‌هایی که در هر قطعه از خروجی کامل جدول فرستاده می‌شوند
+EXPORT_CHUNK_SIZE = 1000
+
+# سقف تعداد شناسه‌ها در هر درخواست batch-get و اندازه هر پرس‌وجوی IN
+BATCH_GET_MAX_IDS = 5000
+BATCH_GET_CHUNK_SIZE = 500
+
+# تلاش دوباره نوشتن‌ها هنگام قفل بودن پایگاه داده (SQLITE_BUSY) با عقب‌نشینی نمایی
+BUSY_RETRIES = int(os.environ.get("UNI_BUSY_RETRIES", "5"))
+BUSY_BACKOFF = float(os.environ.get("UNI_BUSY_BACKOFF", "0.05"))
+
+# کش درون‌فرایندی رکوردهای تکی؛ اندازه صفر کش را غیرفعال می‌کند
+ENTITY_CACHE_SIZE = int(os.environ.get("UNI_CACHE_SIZE", "10000"))
+ENTITY_CACHE_TTL = float(os.environ.get("UNI_CACHE_TTL", "300"))
 
 # Professors
 
@@ -35,6 +145,7 @@ class Professor(SQLModel, table=True):
     cphone: str
     hphone: str
     course_ids: str
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     class Config:
         validate_assignment = True
@@ -43,138 +154,51 @@ class Professor(SQLModel, table=True):
 
     @validator('lid')
     def validate_lid(cls, num: str):
-        if len(num) != 6:
-            raise ValueError("کد استاد باید شش رقمی باشد")
-        elif not num.isdigit():
-            raise ValueError("کد استادی متشکل از اعداد است")
-        return num
+        return validation.check("professor", "lid", num)
 
     @validator("fname", pre=True)
     def validate_professor_fname(cls, fname):
-        if len(fname) > 10:
-            raise ValueError("حداکثر طول نام باید 10 باشد")
-        if not isinstance(fname, str) or not re.match(r'^[\u0600-\u06FF\s]+$', fname):
-            raise ValueError("نام باید فقط حاوی کاراکترهای فارسی باشد")
-        return fname
+        return validation.check("professor", "fname", fname)
 
     @validator("lname", pre=True)
     def validate_professor_lname(cls, lname):
-        if len(lname) > 10:
-            raise ValueError("حداکثر طول نام خانوادگی باید 10 باشد")
-        if not isinstance(lname, str) or not re.match(r'^[\u0600-\u06FF\s]+$', lname):
-            raise ValueError(
-                "نام خانوادگی باید فقط حاوی کاراکترهای فارسی باشد")
-        return lname
+        return validation.check("professor", "lname", lname)
 
     @validator("department", pre=True)
     def validate_department(cls, department):
-        departments = ["فنی مهندسی", "علوم پایه", "اقتصاد"]
-        if not isinstance(department, str) or department not in departments:
-            raise ValueError(
-                "دانشکده باید یکی از دانشکده های مجاز یعنی فنی مهندسی، علوم پایه یا اقتصاد باشد")
-        return department
+        return validation.check("professor", "department", department)
 
     @validator("major", pre=True)
     def validate_major(cls, major):
-        majors = ["مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک",
-                  "مهندسی معدن", "مهندسی عمران", "مهندسی شهرسازی", "مهندسی پلیمر"]
-        if not isinstance(major, str) or major not in majors:
-            raise ValueError(
-                "رشته تحصیلی باید یکی از رشته های مجاز دانشکده باشد")
-        return major
+        return validation.check("professor", "major", major)
 
     @validator("address", pre=True)
     def validate_addres(cls, address):
-        if not isinstance(address, str) and len(address) > 100:
-            raise ValueError("آدرس باید کمتر از 100 حرف باشد")
-        if len(address) < 1:
-            raise ValueError("آدرس نمیتواند خالی باشد")
-        return address
+        return validation.check("professor", "address", address)
 
     @validator('postal_code')
     def validate_postal_code(cls, postal_code: str):
-        if len(postal_code) != 10:
-            raise ValueError("کد پستی باید ده رقمی باشد")
-        elif not postal_code.isdigit():
-            raise ValueError("کد پستی متشکل از اعداد است")
-        return postal_code
+        return validation.check("professor", "postal_code", postal_code)
 
     @validator("born_city")
     def validate_born_city(cls, born_city: str):
-        vcities = [
-            "تهران", "مشهد", "اصفهان", "کرج", "شیراز", "تبریز", "قم", "اهواز", "کرمانشاه",
-            "ارومیه", "رشت", "زاهدان", "همدان", "کرمان", "یزد", "اردبیل", "بندرعباس",
-            "اراک", "اسلامشهر", "زنجان", "سنندج", "قزوین", "خرم‌آباد", "گرگان",
-            "ساری", "بجنورد", "بوشهر", "بیرجند", "ایلام", "شهرکرد", "یاسوج"
-        ]
-        if not isinstance(born_city, str) or born_city not in vcities:
-            raise ValueError(
-                "محل تولد باید یکی از مراکز استان ها در کشور باشد")
-        return born_city
+        return validation.check("professor", "born_city", born_city)
 
     @validator("cphone")
     def validate_cell_phone(cls, phone_number):
-        if not phone_number.isdigit():
-            raise ValueError("کد استادی متشکل از اعداد است")
-        if len(phone_number) != 11:
-            raise ValueError("شماره تلقن همراه یاید 11 زقم باشد")
-        if not phone_number.startswith("09"):
-            raise ValueError("شماره تلقن همراه باید با 09 شروغ شود")
-        return phone_number
+        return validation.check("professor", "cphone", phone_number)
 
     @validator("hphone")
     def validate_home_phone(cls, phone_number):
-        if len(phone_number) != 11:
-            raise ValueError("شماره تلفن ثابت باید 11 رقم باشد")
-        vhphone = ["021", "031", "041", "042", "045", "051", "052", "053", "054", "055", "056", "057", "058", "059", "061", "062", "063", "064", "065", "066", "067", "068", "069", "070", "071", "072",
-                   "073", "074", "075", "076", "077", "078", "079", "080", "081", "082", "083", "084", "085", "086", "087", "088", "089", "090", "091", "092", "093", "094", "095", "096", "097", "098", "099"]
-        if phone_number[:3] not in vhphone:
-            raise ValueError("پیش شماره تلفن ثابت نادرست است")
-        return phone_number
+        return validation.check("professor", "hphone", phone_number)
 
     @validator("birth_date", pre=True)
     def validate_birth_date(cls, date):
-        parts = date.split("/")
-        if len(parts) != 3:
-            raise ValueError("فرمت تاریخ باید به صورت YYYY/MM/DD باشد")
-
-        try:
-            day, month, year = map(int, parts)
-        except ValueError:
-            raise ValueError(
-                "تاریخ باید فقط شامل اعداد صحیح باشد (مثلاً ۱۳۷۵/۰۵/۲۳)")
-
-        if not (1300 <= year <= 1400):
-            raise ValueError("سال باید بین ۱۳۰۰ تا ۱۴۰۰ باشد")
-
-        if not (1 <= month <= 12):
-            raise ValueError("ماه باید بین ۱ تا ۱۲ باشد")
-
-        if not (1 <= day <= 31):
-            raise ValueError("روز باید بین ۱ تا ۳۱ باشد")
-        if month in [1, 2, 3, 4, 5, 6] and day > 31:
-            raise ValueError(f"ماه {month} حداکثر ۳۱ روز دارد")
-        elif month in [7, 8, 9, 10, 11] and day > 30:
-            raise ValueError(f"ماه {month} حداکثر ۳۰ روز دارد")
-        elif month == 12 and day > 30:
-            raise ValueError(
-                "اسفندماه حداکثر ۳۰ روز دارد (بدون در نظر گرفتن سال کبیسه)")
-        return date
+        return validation.check("professor", "birth_date", date)
 
     @validator("nation_id")
     def validate_nation_id(cls, nid):
-        if not nid.isdigit():
-            raise ValueError("کد ملی تنها باید از ارقام تشکیل شده باشد.")
-        if len(nid) != 10:
-            raise ValueError("کد ملی باید عددی ده‌رقمی باشد.")
-        if len(set(nid)) == 1:
-            raise ValueError(
-                "کد ملی نمی‌تواند از ارقام تکراری تشکیل شده باشد.")
-        check = int(nid[9])
-        s = sum(int(nid[i]) * (10 - i) for i in range(9)) % 11
-        if (s < 2 and check != s) or (s >= 2 and check != (11 - s)):
-            raise ValueError("کد ملی وارد شده نامعتبر است.")
-        return nid
+        return validation.check("professor", "nation_id", nid)
 
 
 # Students
@@ -198,6 +222,7 @@ class Student(SQLModel, table=True):
     major: str
     courseids: str
     lids: str
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     class Config:
         validate_assignment = True
@@ -206,170 +231,71 @@ class Student(SQLModel, table=True):
 
     @validator("stid", pre=True)
     def validate_stid(cls, stid_value):
-        if not isinstance(stid_value, str):
-            raise ValueError("کد دانشجویی را در قالب یک رشته وارد کنید")
-        if not stid_value.isdigit():
-            raise ValueError("شماره دانشجویی باید تنها متشکل از اعداد باشد")
-        if not (stid_value.startswith("403114150")):
-            raise ValueError(
-                "قالب شماره دانشجویی صحیح نیست ( شماره دانشجویی باید با 403114150 شروع بشود)")
-        if len(stid_value) != 11:
-            raise ValueError("شماره دانشجویی باید دارای 11 رقم باشد")
-        return stid_value
+        return validation.check("student", "stid", stid_value)
 
     @validator("fname", pre=True)
     def validate_fname(cls, fname):
-        if not isinstance(fname, str) or not re.match(r'^[\u0600-\u06FF\s]+$', fname):
-            raise ValueError("نام باید تنها متشکل از حروف فارسی باشد")
-        return fname
+        return validation.check("student", "fname", fname)
 
     @validator("lname", pre=True)
     def validate_lname(cls, lname):
-        if not isinstance(lname, str) or not re.match(r'^[\u0600-\u06FF\s]+$', lname):
-            raise ValueError("نام خانوادگی باید تنها متشکل از حروف فارسی باشد")
-        return lname
+        return validation.check("student", "lname", lname)
 
     @validator("father", pre=True)
     def validate_father(cls, father):
-        if not isinstance(father, str) or not re.match(r'^[\u0600-\u06FF\s]+$', father):
-            raise ValueError("نام پدر باید تنها متشکل از حروف فارسی باشد")
-        return father
+        return validation.check("student", "father", father)
 
     @validator("ids_number", pre=True)
     def validate_ids_number(cls, ids_number):
-        if not isinstance(ids_number, str) or not (ids_number.isdigit() and len(ids_number) == 6):
-            raise ValueError("سریال شناسنامه باید عدد ۶ رقمی باشد")
-        return ids_number
+        return validation.check("student", "ids_number", ids_number)
 
     @validator("ids_letter", pre=True)
     def validate_ids_letter(cls, ids_letter):
-        persian_letters = "آابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی"
-        if not isinstance(ids_letter, str) or ids_letter not in persian_letters:
-            raise ValueError("حرف سریال شناسنامه باید یکی از حروف فارسی باشد")
-        return ids_letter
+        return validation.check("student", "ids_letter", ids_letter)
 
     @validator("ids_code", pre=True)
     def validate_ids_code(cls, ids_code):
-        if not isinstance(ids_code, str) or not (ids_code.isdigit() and len(ids_code) == 2):
-            raise ValueError("کد سریال شناسنامه باید عدد ۲ رقمی باشد")
-        return ids_code
+        return validation.check("student", "ids_code", ids_code)
 
     @validator("borncity", pre=True)
     def validate_borncity(cls, borncity):
-        valid_cities = [
-            "تهران", "مشهد", "اصفهان", "کرج", "شیراز", "تبریز", "قم", "اهواز", "کرمانشاه",
-            "ارومیه", "رشت", "زاهدان", "همدان", "کرمان", "یزد", "اردبیل", "بندرعباس",
-            "اراک", "اسلامشهر", "زنجان", "سنندج", "قزوین", "خرم‌آباد", "گرگان",
-            "ساری", "بجنورد", "بوشهر", "بیرجند", "ایلام", "شهرکرد", "یاسوج"
-        ]
-        if borncity not in valid_cities:
-            raise ValueError("شهر محل تولد باید یکی از مراکز استان ها باشد")
-        return borncity
+        return validation.check("student", "borncity", borncity)
 
     @validator("birth", pre=True)
     def validate_birth(cls, date):
-        parts = date.split("/")
-        if len(parts) != 3:
-            raise ValueError("فرمت تاریخ باید به صورت YYYY/MM/DD باشد")
-
-        try:
-            day, month, year = map(int, parts)
-        except ValueError:
-            raise ValueError(
-                "تاریخ باید فقط شامل اعداد صحیح باشد (مثلاً ۱۳۷۵/۰۵/۲۳)")
-
-        if not (1300 <= year <= 1400):
-            raise ValueError("سال باید بین ۱۳۰۰ تا ۱۴۰۰ باشد")
-
-        if not (1 <= month <= 12):
-            raise ValueError("ماه باید بین ۱ تا ۱۲ باشد")
-
-        if not (1 <= day <= 31):
-            raise ValueError("روز باید بین ۱ تا ۳۱ باشد")
-        if month in [1, 2, 3, 4, 5, 6] and day > 31:
-            raise ValueError(f"ماه {month} حداکثر ۳۱ روز دارد")
-        elif month in [7, 8, 9, 10, 11] and day > 30:
-            raise ValueError(f"ماه {month} حداکثر ۳۰ روز دارد")
-        elif month == 12 and day > 30:
-            raise ValueError(
-                "اسفندماه حداکثر ۳۰ روز دارد (بدون در نظر گرفتن سال کبیسه)")
-        return date
+        return validation.check("student", "birth", date)
 
     @validator("address", pre=True)
     def validate_address(cls, address):
-        if not isinstance(address, str) or len(address) > 100:
-            raise ValueError("آدرس باید حداکثر دارای ۱۰۰ حرف باشد")
-        if len(address) < 1:
-            raise ValueError("آدرس نمیتواند خالی باشد")
-        return address
+        return validation.check("student", "address", address)
 
     @validator("postalcode", pre=True)
     def validate_postalcode(cls, postalcode):
-        if not isinstance(postalcode, str) or not (postalcode.isdigit() and len(postalcode) == 10):
-            raise ValueError("کد پستی باید عدد ۱۰ رقمی باشد")
-        return postalcode
+        return validation.check("student", "postalcode", postalcode)
 
     @validator("cphone")
     def validate_cell_phone(cls, phone_number):
-        if not phone_number.isdigit():
-            raise ValueError("شماره تلفن همراه باید تنها متشکل از اعداد باشد")
-        if len(phone_number) != 11:
-            raise ValueError("شماره تلفن همراه باید دارای 11 رقم باشد")
-        if not phone_number.startswith("09"):
-            raise ValueError("شماره تلفن همراه باید با 09 شروغ شود")
-        return phone_number
+        return validation.check("student", "cphone", phone_number)
 
     @validator("hphone")
     def validate_hphone(cls, hphone):
-        vhphone = ["021", "031", "041", "042", "045", "051", "052", "053", "054", "055", "056", "057", "058", "059", "061", "062", "063", "064", "065", "066", "067", "068", "069", "070", "071", "072",
-                   "073", "074", "075", "076", "077", "078", "079", "080", "081", "082", "083", "084", "085", "086", "087", "088", "089", "090", "091", "092", "093", "094", "095", "096", "097", "098", "099"]
-        if hphone[:3] not in vhphone:
-            raise ValueError("پیش شماره تلفن ثابت نادرست است")
-        if len(hphone) != 11:
-            raise ValueError("شماره تلفن ثابت باید 11 رقم باشد")
-        return hphone
+        return validation.check("student", "hphone", hphone)
 
     @validator("department", pre=True)
     def validate_department(cls, department):
-        departments = ["فنی مهندسی", "علوم پایه", "اقتصاد"]
-        if department not in departments:
-            raise ValueError(
-                "دانشکده باید یکی از دانشکده های {فنی مهندسی، علوم پایه یا اقتصاد} باشد")
-        return department
+        return validation.check("student", "department", department)
 
     @validator("major", pre=True)
     def validate_major(cls, major):
-        majors = {
-            "فنی مهندسی": ["مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک"],
-            "علوم پایه": ["ریاضی", "فیزیک", "شیمی"],
-            "اقتصاد": ["اقتصاد", "مدیریت", "حسابداری"]
-        }
-        for major_list in majors.values():
-            if major in major_list:
-                return major
-        raise ValueError("رشته تحصیلی باید معتبر و مرتبط با دانشکده باشد")
+        return validation.check("student", "major", major)
 
     @validator("married", pre=True)
     def validate_married(cls, married):
-        if married not in ["مجرد", "متاهل"]:
-            raise ValueError("وضعیت تأهل باید {مجرد یا متاهل} باشد")
-        return married
+        return validation.check("student", "married", married)
 
     @validator("nid")
     def validate_nid(cls, nid):
-        if not nid.isdigit():
-            raise ValueError("کد ملی تنها باید از ارقام تشکیل شده باشد.")
-        if len(nid) != 10:
-            raise ValueError("کد ملی باید عددی ده‌رقمی باشد.")
-        if len(set(nid)) == 1:
-            raise ValueError(
-                "کد ملی نمی‌تواند از ارقام تکراری تشکیل شده باشد.")
-
-        check = int(nid[9])
-        s = sum(int(nid[i]) * (10 - i) for i in range(9)) % 11
-        if (s < 2 and check != s) or (s >= 2 and check != (11 - s)):
-            raise ValueError("کد ملی وارد شده نامعتبر است.")
-        return nid
+        return validation.check("student", "nid", nid)
 
 
 # Courses
@@ -378,6 +304,7 @@ class Course(SQLModel, table=True):
     course_name: str
     credit: int
     department: str
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     class Config:
         validate_assignment = True
@@ -386,231 +313,2287 @@ class Course(SQLModel, table=True):
 
     @validator('cid')
     def validate_cid(cls, cid):
-        if len(cid) != 5:
-            raise ValueError("کد درس باید پنج رقمی باشد")
-        elif not cid.isdigit():
-            raise ValueError("کد درس تنها متشکل از اعداد است")
-        return cid
+        return validation.check("course", "cid", cid)
 
     @validator('course_name')
     def validate_course_name(cls, course_name):
-        if len(course_name) > 25:
-            raise ValueError("حداکثر طول نام درس باید 25 حرف باشد")
-        if not isinstance(course_name, str) or not re.match(r'^[\u0600-\u06FF\s]+$', course_name):
-            raise ValueError("نام درس تنها باید حاوی حروف فارسی باشد")
-        return course_name
+        return validation.check("course", "course_name", course_name)
 
     @validator('credit')
     def validate_credit(cls, credit):
-        if credit > 4 or credit < 1:
-            raise ValueError("تعداد واحد عددی صحیح از بازه 1 تا 4 است")
-        return credit
+        return validation.check("course", "credit", credit)
 
     @validator('department')
     def validate_department(cls, department):
-        departments = ["فنی مهندسی", "علوم پایه", "اقتصاد"]
-        if not isinstance(department, str) or department not in departments:
-            raise ValueError(
-                "دانشکده باید یکی از دانشکده های مجاز یعنی فنی مهندسی، علوم پایه یا اقتصاد باشد")
-        return department
+        return validation.check("course", "department", department)
+
+
+def _primary_key(model):
+    return model.__table__.primary_key.columns.values()[0]
+
+
+# جدول‌های ارتباطی (دانشجو-درس، استاد-درس، دانشجو-استاد)
+
+
+class Enrollment(SQLModel, table=True):
+    stid: str = Field(foreign_key="student.stid", primary_key=True)
+    cid: str = Field(foreign_key="course.cid", primary_key=True)
+
+    __table_args__ = (Index("ix_enrollment_cid_stid", "cid", "stid"),)
+
+
+class Teaching(SQLModel, table=True):
+    lid: str = Field(foreign_key="professor.lid", primary_key=True)
+    cid: str = Field(foreign_key="course.cid", primary_key=True)
+
+    __table_args__ = (Index("ix_teaching_cid_lid", "cid", "lid"),)
+
+
+class StudentProfessor(SQLModel, table=True):
+    stid: str = Field(foreign_key="student.stid", primary_key=True)
+    lid: str = Field(foreign_key="professor.lid", primary_key=True)
+
+    __table_args__ = (
+        Index("ix_studentprofessor_lid_stid", "lid", "stid"),)
+
+
+# ثبت‌نام: گروه‌های درسی با ظرفیت و برنامه زمانی، ثبت‌نام‌ها و صف انتظار
+
+
+class Section(SQLModel, table=True):
+    section_id: Optional[str] = Field(default=None, primary_key=True)
+    cid: str = Field(foreign_key="course.cid", index=True)
+    lid: Optional[str] = Field(default=None, foreign_key="professor.lid")
+    capacity: int
+    schedule: str
+    # تعداد صندلی‌های گرفته‌شده؛ تنها موتور ثبت‌نام آن را تغییر می‌دهد
+    enrolled: int = 0
+
+    class Config:
+        validate_assignment = True
+        extra = "forbid"
+        strict = True
+
+    @validator('section_id')
+    def validate_section_id(cls, section_id):
+        return validation.check("section", "section_id", section_id)
+
+    @validator('cid')
+    def validate_cid(cls, cid):
+        return validation.check("section", "cid", cid)
+
+    @validator('lid')
+    def validate_lid(cls, lid):
+        return validation.check("section", "lid", lid)
+
+    @validator('capacity')
+    def validate_capacity(cls, capacity):
+        return validation.check("section", "capacity", capacity)
+
+    @validator('schedule')
+    def validate_schedule(cls, schedule):
+        return validation.check("section", "schedule", schedule)
+
+
+# جلسه‌های هر گروه که از رشته schedule ساخته می‌شوند (دقیقه از ابتدای روز)
+class SectionSlot(SQLModel, table=True):
+    section_id: str = Field(foreign_key="section.section_id", primary_key=True)
+    day: int = Field(primary_key=True)
+    start: int = Field(primary_key=True)
+    end: int
+
+
+class Registration(SQLModel, table=True):
+    stid: str = Field(foreign_key="student.stid", primary_key=True)
+    section_id: str = Field(foreign_key="section.section_id", primary_key=True)
+
+    __table_args__ = (Index("ix_registration_section_stid", "section_id", "stid"),)
+
+
+class Waitlist(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    section_id: str = Field(foreign_key="section.section_id")
+    stid: str = Field(foreign_key="student.stid", index=True)
+    created: int = 0
+
+    __table_args__ = (
+        UniqueConstraint("section_id", "stid"),
+        Index("ix_waitlist_section_id_id", "section_id", "id"),)
+
+
+# ثبت تغییرات: جدول فقط‌افزودنی changelog که changes.py پس از commit و خارج از مسیر درخواست می‌نویسد
+
+
+class ChangeLog(SQLModel, table=True):
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    entity: str
+    key: str
+    op: str
+    # ستون‌های تغییرکرده با کاما؛ خالی یعنی کل ردیف
+    fields: Optional[str] = None
+    # میلی‌ثانیه از epoch
+    at: int = Field(sa_type=BigInteger)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+# پاسخ ذخیره‌شده هر سرآیند Idempotency-Key تا تکرار درخواست دوباره اجرا نشود
+
+
+class IdempotencyKey(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    # هش روش، مسیر و بدنه درخواست؛ همان کلید برای درخواست دیگری پذیرفته نمی‌شود
+    fingerprint: str
+    response: Optional[str] = None
+    # ثانیه از epoch
+    created: int = Field(index=True)
+
+
+# مدل‌هایی که نوشتن‌های ORM آن‌ها خودکار ثبت می‌شوند؛ ایجاد و ویرایش آن‌ها از _write می‌گذرد
+CHANGE_ENTITIES = (Professor, Student, Course, Section)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    collected = session.info.setdefault("changes", [])
+    for objects, op in ((session.new, "create"), (session.dirty, "update"), (session.deleted, "delete")):
+        for obj in objects:
+            if not isinstance(obj, CHANGE_ENTITIES):
+                continue
+            fields = None
+            if op == "update":
+                # setattr با همان مقدار قبلی تاریخچه‌ای نمی‌سازد و ثبت نمی‌شود
+                fields = [attr.key for attr in sqlalchemy_inspect(obj).attrs if attr.history.has_changes()]
+                if not fields:
+                    continue
+            collected.append((obj.__tablename__, getattr(obj, _primary_key(type(obj)).name), op, fields))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    for change in session.info.pop("changes", ()):
+        changes.record(*change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changes", None)
+
+
+# فیلتر، مرتب‌سازی و انتخاب ستون در فهرست‌ها
+
+
+def _birth_year(column):
+    """SQL expression for the year of a ``D/M/Y`` birth date column."""
+    # -4 باید در متن پرس‌وجو بیاید، نه پارامتر؛ وگرنه SQLite نمایه عبارتی را تطبیق نمی‌دهد
+    return cast(func.substr(column, literal_column("-4")), Integer)
+
+
+# ستون تاریخ تولد هر مدل برای فیلتر بازه سال تولد
+BIRTH_COLUMNS = {Student: Student.birth, Professor: Professor.birth_date}
+
+# ستون‌هایی که مرتب‌سازی روی آن‌ها با نمایه پشتیبانی می‌شود
+SORTABLE_COLUMNS = {
+    Student: ["stid", "department", "major"],
+    Professor: ["lid", "department", "major"],
+    Course: ["cid", "department"],
+    Section: ["section_id", "cid"],
+}
+
+# کلید اصلی در انتهای هر نمایه می‌آید تا ORDER BY (ستون، کلید) صفحه‌بندی cursor را پوشش دهد
+LIST_INDEXES = [
+    Index("ix_student_department_stid", Student.department, Student.stid),
+    Index("ix_student_major_stid", Student.major, Student.stid),
+    Index("ix_student_birth_year", _birth_year(Student.birth)),
+    Index("ix_professor_department_lid", Professor.department, Professor.lid),
+    Index("ix_professor_major_lid", Professor.major, Professor.lid),
+    Index("ix_professor_birth_year", _birth_year(Professor.birth_date)),
+    Index("ix_course_department_cid", Course.department, Course.cid),
+]
+
+
+# نسخه هر جدول که با تریگر در هر نوشتن افزایش می‌یابد (برای ETag)
+
+
+class TableVersion(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    version: int = 0
+    modified: int = 0
+
+
+VERSIONED_TABLES = ["professor", "student", "course",
+                    "enrollment", "teaching", "studentprofessor",
+                    "section", "registration", "waitlist"]
+
+
+# (جدول ارتباطی، ستون مالک، ستون مقصد، فیلد رشته‌ای مدل) برای هر مدل
+LINKS = {
+    Student: [(Enrollment, "stid", "cid", "courseids"),
+              (StudentProfessor, "stid", "lid", "lids")],
+    Professor: [(Teaching, "lid", "cid", "course_ids")],
+}
+
+
+def _parse_ids(value) -> list[str]:
+    """Split a free-form id list such as ``"99917, 99902"`` into its ids."""
+    return list(dict.fromkeys(re.findall(r"\d+", str(value or ""))))
+
+
+def _write_links(conn, model, objects: list):
+    """Rewrite the association rows of ``objects`` from their id strings."""
+    for link, owner, target, field in LINKS.get(model, []):
+        keys = [getattr(obj, owner) for obj in objects]
+        conn.execute(delete(link).where(getattr(link, owner).in_(keys)))
+        rows = [{owner: getattr(obj, owner), target: target_id}
+                for obj in objects for target_id in _parse_ids(getattr(obj, field))]
+        if rows:
+            conn.execute(sqlite_insert(link).on_conflict_do_nothing(), rows)
+
+
+async def _sync_links(session, model, objects: list):
+    await session.run_sync(_write_links, model, objects)
+
+
+async def _delete_links(session, model, key: str):
+    """Delete the association rows owned by ``model`` row ``key`` and those pointing at it."""
+    for link, owner, _, _ in LINKS.get(model, []):
+        await session.execute(delete(link).where(getattr(link, owner) == key))
+    # PRAGMA foreign_keys روشن نیست، پس ردیف‌هایی که به رکورد حذف‌شده اشاره می‌کنند همین‌جا پاک می‌شوند
+    for links in LINKS.values():
+        for link, _, target, _ in links:
+            column = link.__table__.c[target]
+            if any(fk.column.table is model.__table__ for fk in column.foreign_keys):
+                await session.execute(delete(link).where(column == key))
+
+
+# مهاجرت‌های پایگاه داده؛ شماره نسخه در PRAGMA user_version نگه داشته می‌شود
+
+
+def _migrate_link_tables(conn):
+    for model, links in LINKS.items():
+        pk = _primary_key(model)
+        for link, owner, target, field in links:
+            rows = [{owner: key, target: target_id}
+                    for key, value in conn.execute(select(pk, model.__table__.c[field]))
+                    for target_id in _parse_ids(value)]
+            if rows:
+                conn.execute(sqlite_insert(link).on_conflict_do_nothing(), rows)
+
+
+def _migrate_table_versions(conn):
+    now = int(time.time())
+    for table in VERSIONED_TABLES:
+        conn.exec_driver_sql(
+            "INSERT OR IGNORE INTO tableversion (name, version, modified) VALUES (?, 0, ?)",
+            (table, now))
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            conn.exec_driver_sql(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{op.lower()}
+                AFTER {op} ON {table}
+                BEGIN
+                    UPDATE tableversion
+                    SET version = version + 1,
+                        modified = CAST(strftime('%s', 'now') AS INTEGER)
+                    WHERE name = '{table}';
+                END""")
+
+
+# یکسان‌سازی متن فارسی برای جستجو: حروف عربی، نیم‌فاصله، کشیده و اعراب.
+# این نگاشت در تریگرها هم با replace() اعمال می‌شود، پس باید کوتاه بماند
+# (تو در تویی بیش از حدود ۲۵ replace از پشته تجزیه‌گر SQLite بیشتر است).
+PERSIAN_FOLD = {
+    "ي": "ی", "ى": "ی", "ئ": "ی", "ك": "ک", "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "ٱ": "ا", "ؤ": "و",
+    "\u200c": " ", "\u200d": "", "\u0640": "",
+    **{chr(c): "" for c in range(0x064B, 0x0653)},
+}
+# ارقام فارسی و عربی فقط در عبارت جستجو به ارقام لاتین تبدیل می‌شوند؛
+# کد ملی و شماره‌ها با ارقام لاتین ذخیره می‌شوند
+_PERSIAN_FOLD_TABLE = str.maketrans({
+    **PERSIAN_FOLD,
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+})
+
+
+def normalize_persian(value: str) -> str:
+    return value.translate(_PERSIAN_FOLD_TABLE)
+
+
+def _sql_fold(expr: str) -> str:
+    """Wrap a SQL expression in the ``replace()`` calls of PERSIAN_FOLD."""
+    for source, target in PERSIAN_FOLD.items():
+        expr = f"replace({expr}, char({ord(source)}), '{target}')"
+    return expr
+
+
+# (نوع، جدول، کلید، ستون‌ها به ترتیب fname, lname, father, nid) برای نمایه جستجو
+SEARCH_SOURCES = [
+    ("student", "student", "stid", ("fname", "lname", "father", "nid")),
+    ("professor", "professor", "lid", ("fname", "lname", None, "nation_id")),
+]
+
+
+def _migrate_search_index(conn):
+    # searchdoc شناسه پایدار هر سند FTS را نگه می‌دارد تا حذف و ویرایش با rowid انجام شود
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS searchdoc (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            UNIQUE (kind, key)
+        )""")
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            fname, lname, father, nid, code,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )""")
+    for kind, table, key, columns in SEARCH_SOURCES:
+        def values(ref):
+            fname, lname, father, nid = columns
+            return ", ".join([
+                _sql_fold(f"{ref}.{fname}"),
+                _sql_fold(f"{ref}.{lname}"),
+                _sql_fold(f"{ref}.{father}") if father else "''",
+                f"{ref}.{nid}",
+                f"{ref}.{key}",
+            ])
+
+        def doc_id(ref):
+            return f"(SELECT id FROM searchdoc WHERE kind = '{kind}' AND key = {ref}.{key})"
+
+        insert = f"""
+            INSERT INTO searchdoc (kind, key) VALUES ('{kind}', NEW.{key});
+            INSERT INTO search_index (rowid, fname, lname, father, nid, code)
+            VALUES ({doc_id("NEW")}, {values("NEW")});"""
+        remove = f"""
+            DELETE FROM search_index WHERE rowid = {doc_id("OLD")};
+            DELETE FROM searchdoc WHERE kind = '{kind}' AND key = OLD.{key};"""
+        watched = ", ".join([key] + [c for c in columns if c])
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_delete AFTER DELETE ON {table} BEGIN {remove} END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_update AFTER UPDATE OF {watched} ON {table} "
+            f"BEGIN {remove} {insert} END")
+
+        conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO searchdoc (kind, key) SELECT '{kind}', {key} FROM {table}")
+        conn.exec_driver_sql(f"""
+            INSERT INTO search_index (rowid, fname, lname, father, nid, code)
+            SELECT searchdoc.id, {values(table)}
+            FROM {table} JOIN searchdoc ON searchdoc.kind = '{kind}' AND searchdoc.key = {table}.{key}""")
+
+
+# شمارنده‌های آماری که تریگرها با هر نوشتن به‌روز می‌کنند
+
+
+class StatCounter(SQLModel, table=True):
+    dimension: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    count: int = 0
+    total: int = 0
+
+
+# (بخش پاسخ، کلید پاسخ، جدول، ستون گروه‌بندی، ستونی که جمع آن در total نگه داشته می‌شود)
+STAT_DIMENSIONS = [
+    ("students", "department", "student", "department", None),
+    ("students", "major", "student", "major", None),
+    ("students", "borncity", "student", "borncity", None),
+    ("students", "married", "student", "married", None),
+    ("professors", "department", "professor", "department", None),
+    ("professors", "major", "professor", "major", None),
+    ("courses", "department", "course", "department", "credit"),
+]
+
+
+def _stat_triggers(conn):
+    for table in dict.fromkeys(dim[2] for dim in STAT_DIMENSIONS):
+        dimensions = [dim for dim in STAT_DIMENSIONS if dim[2] == table]
+
+        def add(ref):
+            return "".join(f"""
+                INSERT INTO statcounter (dimension, value, count, total)
+                VALUES ('{table}.{column}', {ref}.{column}, 1, {f"{ref}.{amount}" if amount else 0})
+                ON CONFLICT (dimension, value) DO UPDATE
+                SET count = count + 1, total = total + excluded.total;"""
+                for _, _, _, column, amount in dimensions)
+
+        def remove(ref):
+            return "".join(f"""
+                UPDATE statcounter
+                SET count = count - 1, total = total - {f"{ref}.{amount}" if amount else 0}
+                WHERE dimension = '{table}.{column}' AND value = {ref}.{column};"""
+                for _, _, _, column, amount in dimensions) + f"""
+                DELETE FROM statcounter WHERE dimension LIKE '{table}.%' AND count <= 0;"""
+
+        watched = ", ".join(dict.fromkeys(
+            c for _, _, _, column, amount in dimensions for c in (column, amount) if c))
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert AFTER INSERT ON {table} BEGIN {add('NEW')} END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete AFTER DELETE ON {table} BEGIN {remove('OLD')} END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_update AFTER UPDATE OF {watched} ON {table} "
+            f"BEGIN {remove('OLD')} {add('NEW')} END")
+
+
+def _computed_stats(conn) -> dict:
+    """Aggregate the source tables directly; ``{(dimension, value): (count, total)}``."""
+    stats = {}
+    for _, _, table, column, amount in STAT_DIMENSIONS:
+        rows = conn.exec_driver_sql(
+            f"SELECT {column}, COUNT(*), SUM({amount or 0}) FROM {table} GROUP BY {column}")
+        for value, count, total in rows:
+            stats[f"{table}.{column}", value] = (count, total)
+    return stats
+
+
+def _rebuild_stats(conn) -> list[dict]:
+    """Recompute the counters from scratch; return the entries that were wrong."""
+    stored = {(dimension, value): (count, total) for dimension, value, count, total
+              in conn.exec_driver_sql("SELECT dimension, value, count, total FROM statcounter")}
+    computed = _computed_stats(conn)
+    mismatches = [
+        {"dimension": key[0], "value": key[1],
+         "stored": stored.get(key), "computed": computed.get(key)}
+        for key in sorted(stored.keys() | computed.keys(), key=repr)
+        if stored.get(key) != computed.get(key)]
+    conn.exec_driver_sql("DELETE FROM statcounter")
+    if computed:
+        conn.execute(StatCounter.__table__.insert(), [
+            {"dimension": dimension, "value": value, "count": count, "total": total}
+            for (dimension, value), (count, total) in computed.items()])
+    return mismatches
+
+
+def _migrate_stat_counters(conn):
+    _stat_triggers(conn)
+    _rebuild_stats(conn)
+
+
+def _migrate_list_indexes(conn):
+    # create_all نمایه‌های تازه را روی جدول‌های موجود نمی‌سازد و
+    # checkfirst نمایه‌های عبارتی را تشخیص نمی‌دهد
+    for index in LIST_INDEXES:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+# مدل‌هایی که ستون version دارند (همروندی خوش‌بینانه در PUT و PATCH)
+ROW_VERSIONED_MODELS = [Professor, Student, Course]
+
+
+def _migrate_row_versions(conn):
+    # هر نوشتنی که خودش version را بالا نبرده (PUT، ورود گروهی، ثبت‌نام) با تریگر یکی افزایش می‌دهد
+    for model in ROW_VERSIONED_MODELS:
+        table, key = model.__tablename__, _primary_key(model).name
+        columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+        if "version" not in columns:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_row_version
+            AFTER UPDATE ON {table} WHEN NEW.version = OLD.version
+            BEGIN
+                UPDATE {table} SET version = OLD.version + 1 WHERE {key} = NEW.{key};
+            END""")
+
+
+MIGRATIONS = [
+    _migrate_link_tables,
+    _migrate_table_versions,
+    _migrate_search_index,
+    _migrate_list_indexes,
+    _migrate_stat_counters,
+    # نسخه و تریگرهای جدول‌های ثبت‌نام؛ برای جدول‌های قبلی کاری انجام نمی‌دهد
+    _migrate_table_versions,
+    _migrate_row_versions,
+]
 
 # ایجاد جدول‌ها
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+def _run_migrations(conn):
+    SQLModel.metadata.create_all(conn)
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for number, migration in enumerate(MIGRATIONS, 1):
+        if version < number:
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(_run_migrations)
 
 # ایجاد Session برای ارتباط با پایگاه داده
 
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
 
-# ایجاد جدول‌ها هنگام شروع برنامه
 
+def _is_busy(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "busy" in message
 
-@router.on_event("startup")
-def on_startup():
-    create_db_and_tables()
 
+async def _with_busy_retry(session, operation):
+    """Run ``operation()``, rolling back and retrying while SQLite reports busy.
 
-@router.post("/professors/")
-def create_professor(professor: Professor):
-    with Session(engine) as session:
-        existing_professor = session.exec(
-            select(Professor).where(Professor.nation_id == professor.nation_id)
-        ).first()
-        if existing_professor:
+    ``busy_timeout`` already waits for the write lock, but a transaction that
+    read before writing can still fail at once when another process committed
+    in between (its WAL snapshot is stale); re-running it is the only fix.
+    """
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return await operation()
+        except OperationalError as e:
+            if attempt == BUSY_RETRIES or not _is_busy(e):
+                raise
+            await session.rollback()
+            logger.warning("SQLite busy, retrying (%d/%d)", attempt + 1, BUSY_RETRIES)
+            await asyncio.sleep(BUSY_BACKOFF * 2 ** attempt * (0.5 + random.random()))
+
+
+def retry_on_busy(handler):
+    """Decorate a write handler taking ``session`` so it is retried on SQLITE_BUSY."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        return await _with_busy_retry(kwargs["session"], lambda: handler(*args, **kwargs))
+    return wrapper
+
+# ایجاد جدول‌ها هنگام شروع برنامه؛ با serve.py مهاجرت‌ها یک بار پیش از کارگرها اجرا می‌شوند
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Migrate, start the change-log flusher and the write queue, and tear them down on exit."""
+    if os.environ.get("UNI_SKIP_MIGRATIONS") != "1":
+        await create_db_and_tables()
+    changes.start(engine)
+    writequeue.start(engine)
+    logger.info("SQLite pragmas for %s: %s",
+                sqlite_file_name, await _effective_pragmas())
+    try:
+        yield
+    finally:
+        # نوشتن‌های صف پیش از تخلیه گزارش تغییرات ثبت می‌شوند
+        await writequeue.stop()
+        await changes.stop(engine)
+        await engine.dispose()
+
+
+# کش خواندن رکوردهای تکی
+
+
+class EntityCache:
+    """Bounded LRU cache with a TTL, keyed by entity name and primary key.
+
+    Writers call :meth:`invalidate`, which also bumps a per-entity generation
+    so a read that started before the write cannot store its stale row.  The
+    entity's table version is kept the same way, so a cached read can answer
+    a conditional request without querying ``tableversion``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._generations = {}
+        self._versions = {}
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def generation(self, entity: str) -> int:
+        return self._generations.get(entity, 0)
+
+    def get(self, entity: str, key: str):
+        item = self._data.get((entity, key))
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[(entity, key)]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end((entity, key))
+        self.hits += 1
+        return value
+
+    def set(self, entity: str, key: str, value, generation: int):
+        if self.maxsize <= 0 or generation != self.generation(entity):
+            return
+        self._data[(entity, key)] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end((entity, key))
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def version(self, entity: str):
+        item = self._versions.get(entity)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def set_version(self, entity: str, state, generation: int):
+        if self.maxsize <= 0 or generation != self.generation(entity):
+            return
+        self._versions[entity] = (time.monotonic() + self.ttl, state)
+
+    def invalidate(self, entity: str, keys=()):
+        self._generations[entity] = self.generation(entity) + 1
+        self._versions.pop(entity, None)
+        for key in keys:
+            self._data.pop((entity, key), None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+entity_cache = EntityCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+
+
+async def _read_cached(session, model, key: str):
+    """Return ``model`` row ``key`` as a dict, going through ``entity_cache``."""
+    entity = model.__tablename__
+    row = entity_cache.get(entity, key)
+    if row is not None:
+        return row
+    generation = entity_cache.generation(entity)
+    obj = await session.get(model, key)
+    if obj is None:
+        return None
+    row = obj.model_dump()
+    entity_cache.set(entity, key, row, generation)
+    return row
+
+
+async def _read_many_cached(session, model, keys: list[str]) -> dict:
+    """Return ``{key: row dict}`` for the ``keys`` that exist, using chunked IN queries."""
+    entity = model.__tablename__
+    rows = {}
+    for key in dict.fromkeys(keys):
+        row = entity_cache.get(entity, key)
+        if row is not None:
+            rows[key] = row
+    missing = [key for key in dict.fromkeys(keys) if key not in rows]
+    generation = entity_cache.generation(entity)
+    pk = _primary_key(model)
+    for start in range(0, len(missing), BATCH_GET_CHUNK_SIZE):
+        chunk = missing[start:start + BATCH_GET_CHUNK_SIZE]
+        for obj in (await session.exec(select(model).where(pk.in_(chunk)))).all():
+            key = getattr(obj, pk.name)
+            rows[key] = obj.model_dump()
+            entity_cache.set(entity, key, rows[key], generation)
+    return rows
+
+
+# اعتبارسنجی شرطی (ETag / Last-Modified)
+
+
+async def _table_versions(session, tables: list[str]) -> tuple:
+    """Return the sorted ``(name, version)`` pairs of ``tables`` and their latest write time."""
+    rows = (await session.exec(
+        select(TableVersion).where(TableVersion.name.in_(tables)))).all()
+    versions = sorted((row.name, row.version) for row in rows)
+    return versions, max((row.modified for row in rows), default=0)
+
+
+async def _not_modified(request: Request, response: Response, session, tables: list[str], *parts):
+    """Return a 304 response if the client's validators are still current.
+
+    The weak ETag is derived from the version counters of ``tables`` (bumped by
+    triggers on every write) plus ``parts`` such as the key or query string,
+    so it can be checked without loading or serializing any rows.  The
+    validators are also set on ``response`` for the full 200 reply.
+    """
+    versions, modified = await _table_versions(session, tables)
+    return _conditional(request, response, versions, modified, parts)
+
+
+async def _entity_not_modified(request: Request, response: Response, session, model, key: str):
+    """Like :func:`_not_modified` for one cached row, reusing ``entity_cache``'s table version.
+
+    The version is cached for as long as the rows are, so the validators
+    never claim a newer state than the row the cache serves.
+    """
+    entity = model.__tablename__
+    state = entity_cache.version(entity)
+    if state is None:
+        generation = entity_cache.generation(entity)
+        state = await _table_versions(session, [entity])
+        entity_cache.set_version(entity, state, generation)
+    return _conditional(request, response, *state, (key,))
+
+
+def _conditional(request: Request, response: Response, versions: list, modified: int, parts: tuple):
+    digest = hashlib.blake2b(
+        repr((versions, parts)).encode(), digest_size=12).hexdigest()
+    # همیشه ضعیف، چون لایه فشرده‌سازی بدنه را تغییر می‌دهد؛ 200 و 304 باید یک اعتبارسنج داشته باشند
+    headers = {"ETag": f'W/"{digest}"',
+               "Last-Modified": formatdate(modified, usegmt=True)}
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/")
+                for tag in if_none_match.split(",")]
+        fresh = "*" in tags or f'"{digest}"' in tags
+    elif "if-modified-since" in request.headers:
+        try:
+            since = parsedate_to_datetime(
+                request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        fresh = since is not None and modified <= since
+    else:
+        fresh = False
+    return Response(status_code=304, headers=headers) if fresh else None
+
+
+def _json(response: Response, content) -> Response:
+    """Serialize ``content`` directly, skipping FastAPI's ``jsonable_encoder``.
+
+    Headers already set on the injected ``response`` (validators, cursor) are kept.
+    """
+    return encoding.JSONResponse(content, headers=response.headers)
+
+
+# صفحه‌بندی (offset/limit یا cursor)، فیلتر و مرتب‌سازی فهرست‌ها
+
+
+def _encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        key = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except ValueError:
+        key = None
+    # مکان‌نمای خراب نباید بی‌صدا صفحه اول را برگرداند؛ فقط خروجی _encode_cursor پذیرفته می‌شود
+    if key is None or _encode_cursor(key) != cursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def _list_filters(model, filters: dict) -> list:
+    conditions = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name == "birth_year_min":
+            conditions.append(_birth_year(BIRTH_COLUMNS[model]) >= value)
+        elif name == "birth_year_max":
+            conditions.append(_birth_year(BIRTH_COLUMNS[model]) <= value)
+        else:
+            conditions.append(getattr(model, name) == value)
+    return conditions
+
+
+def _list_columns(model, fields: Optional[str]) -> Optional[list[str]]:
+    """Parse ``fields=a,b`` into column names; the primary key is always included."""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.__table__.c]
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys([_primary_key(model).name] + names))
+
+
+def _sort_column(model, sort: Optional[str]):
+    """Parse ``sort=col`` / ``sort=-col``; return ``(column, descending)``."""
+    if not sort:
+        return _primary_key(model), False
+    name = sort.removeprefix("-")
+    if name not in SORTABLE_COLUMNS[model]:
+        raise HTTPException(
+            status_code=422,
+            detail=f"sort must be one of {', '.join(SORTABLE_COLUMNS[model])}")
+    return model.__table__.c[name], sort.startswith("-")
+
+
+async def _read_page(session, model, response: Response, offset: int, limit: int, after: Optional[str],
+                     filters: dict = None, sort: Optional[str] = None, fields: Optional[str] = None,
+                     count: bool = False):
+    """Return one page of ``model`` rows.
+
+    Without ``after`` this is the classic offset/limit page.  With ``after``
+    (empty for the first page, then the previous ``X-Next-Cursor``) rows are
+    read in ``(sort column, primary key)`` order starting after the cursor,
+    which costs the same at any depth and is stable under concurrent inserts.
+    ``filters`` are ANDed equality or birth-year range conditions, and with
+    ``fields`` only those columns are selected and dicts are returned.
+    With ``count`` the number of matching rows is sent in ``X-Total-Count``.
+    """
+    pk = _primary_key(model)
+    sort_column, descending = _sort_column(model, sort)
+    order = [pk] if sort_column is pk else [sort_column, pk]
+    columns = _list_columns(model, fields)
+    if columns is None:
+        statement = select(model)
+    else:
+        selected = dict.fromkeys(columns + [sort_column.name])
+        statement = select(*(model.__table__.c[name] for name in selected))
+    conditions = _list_filters(model, filters or {})
+    statement = statement.where(*conditions)
+    if count:
+        total = (await session.exec(
+            select(func.count()).select_from(model).where(*conditions))).one()
+        response.headers["X-Total-Count"] = str(total)
+
+    if after is None:
+        if limit > PAGE_MAX_LIMIT:
+            raise HTTPException(
+                status_code=422, detail=f"limit must be at most {PAGE_MAX_LIMIT} without a cursor")
+        if sort:
+            statement = statement.order_by(*(c.desc() if descending else c for c in order))
+        rows = (await session.exec(statement.offset(offset).limit(limit))).all()
+    else:
+        statement = statement.order_by(
+            *(c.desc() if descending else c for c in order)).limit(limit)
+        if after:
+            if sort_column is pk:
+                position, key = pk, _decode_cursor(after)
+            else:
+                try:
+                    key = tuple(json.loads(_decode_cursor(after)))
+                except (ValueError, TypeError):
+                    key = None
+                # (ستون مرتب‌سازی، کلید اصلی)؛ هر شکل دیگری مقایسه keyset را خراب می‌کند
+                if key is None or len(key) != len(order) or not all(isinstance(v, (str, int)) for v in key):
+                    raise HTTPException(status_code=400, detail="Invalid cursor")
+                position = tuple_(*order)
+            statement = statement.where(position < key if descending else position > key)
+        rows = (await session.exec(statement)).all()
+        if len(rows) == limit:
+            last = rows[-1] if columns is None else rows[-1]._mapping
+            values = [last[c.name] if columns else getattr(last, c.name) for c in order]
+            response.headers["X-Next-Cursor"] = _encode_cursor(
+                values[0] if sort_column is pk else json.dumps(values, ensure_ascii=False))
+
+    if columns is None:
+        return rows
+    return [{name: row._mapping[name] for name in columns} for row in rows]
+
+
+# خروجی کامل جدول به صورت جریانی
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+async def _iter_export_chunks(model):
+    """Yield lists of row tuples read through a server-side cursor."""
+    async with engine.connect() as conn:
+        result = await conn.stream(select(*model.__table__.columns))
+        async for chunk in result.partitions(EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+async def _export_ndjson(model):
+    names = [c.name for c in model.__table__.columns]
+    async for chunk in _iter_export_chunks(model):
+        yield "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n"
+                      for row in chunk).encode()
+
+
+async def _export_csv(model):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM تا اکسل متن فارسی را UTF-8 تشخیص دهد
+    buffer.write("\ufeff")
+    writer.writerow([c.name for c in model.__table__.columns])
+    async for chunk in _iter_export_chunks(model):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _export_arrow(model):
+    columns = model.__table__.columns
+    schema = pyarrow.schema([
+        (c.name, pyarrow.int64() if isinstance(c.type, Integer) else pyarrow.string())
+        for c in columns])
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        async for chunk in _iter_export_chunks(model):
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [row[i] for row in chunk]
+                if field.type == pyarrow.string():
+                    values = [None if v is None else str(v) for v in values]
+                arrays.append(pyarrow.array(values, type=field.type))
+            writer.write_batch(
+                pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+# نام پارامتر پرس‌وجو همان format می‌ماند
+ExportFormat = Annotated[Literal["ndjson", "csv", "arrow"], Query(alias="format")]
+
+
+def _export_response(model, fmt: str, name: str, validators: dict):
+    if fmt == "arrow" and pyarrow is None:
+        raise HTTPException(
+            status_code=406, detail="Arrow export requires pyarrow on the server")
+    body = {"ndjson": _export_ndjson, "csv": _export_csv,
+            "arrow": _export_arrow}[fmt](model)
+    extension = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows"}[fmt]
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={**validators,
+                 "Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
+
+
+@router.get("/professors/export")
+async def export_professors(request: Request, response: Response, session: SessionDep, fmt: ExportFormat = "ndjson"):
+    if not_modified := await _not_modified(request, response, session, ["professor"], fmt):
+        return not_modified
+    return _export_response(Professor, fmt, "professors", dict(response.headers))
+
+
+@router.get("/students/export")
+async def export_students(request: Request, response: Response, session: SessionDep, fmt: ExportFormat = "ndjson"):
+    if not_modified := await _not_modified(request, response, session, ["student"], fmt):
+        return not_modified
+    return _export_response(Student, fmt, "students", dict(response.headers))
+
+
+@router.get("/courses/export")
+async def export_courses(request: Request, response: Response, session: SessionDep, fmt: ExportFormat = "ndjson"):
+    if not_modified := await _not_modified(request, response, session, ["course"], fmt):
+        return not_modified
+    return _export_response(Course, fmt, "courses", dict(response.headers))
+
+
+# ایجاد و ویرایش: هر نوشتن یک عملیات همگام روی اتصال است که مستقیم یا از صف نوشتن اجرا می‌شود
+
+# عمر پاسخ‌های ذخیره‌شده Idempotency-Key (ثانیه)
+IDEMPOTENCY_TTL = int(os.environ.get("UNI_IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_PRUNE_INTERVAL = 3600
+
+_REPLAYED = object()
+_idempotency_pruned = 0
+
+
+def _check_version(row, expected: Optional[int]):
+    if expected is not None and expected != row.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Version mismatch: expected {expected}, current is {row.version}; reload and retry")
+
+
+def _insert_row(conn, model, values: dict) -> tuple:
+    row = conn.execute(model.__table__.insert().values(**values)
+                       .returning(*model.__table__.c)).first()
+    _write_links(conn, model, [row])
+    return row._asdict(), ("create", None)
+
+
+def _insert_professor(conn, values: dict) -> tuple:
+    if conn.execute(select(Professor.lid).where(Professor.nation_id == values["nation_id"])).first():
+        raise HTTPException(
+            status_code=409, detail="کد ملی قبلاً ثبت شده است.")
+    return _insert_row(conn, Professor, values)
+
+
+def _update_row(conn, model, key: str, values: dict, expected: Optional[int], not_found: str) -> tuple:
+    """Write ``values`` with one ``UPDATE ... RETURNING`` that also bumps the row version.
+
+    The update matches only if at least one column actually changes, so a
+    body that changes nothing writes nothing.  The row is read again only
+    in that case, to tell 404, 409 and "unchanged" apart.
+    """
+    table = model.__table__
+    pk = _primary_key(model)
+    row = None
+    if values:
+        stmt = (update(table)
+                .where(pk == key, or_(*(table.c[name].is_not(value) for name, value in values.items())))
+                .values(**values, version=table.c.version + 1)
+                .returning(*table.c))
+        if expected is not None:
+            stmt = stmt.where(table.c.version == expected)
+        row = conn.execute(stmt).first()
+    if row is None:
+        row = conn.execute(select(*table.c).where(pk == key)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        _check_version(row, expected)
+        return row._asdict(), None
+    if any(field in values for *_, field in LINKS.get(model, [])):
+        _write_links(conn, model, [row])
+    return row._asdict(), ("update", list(values))
+
+
+def _replace_row(conn, model, key: str, values: dict, expected: Optional[int], not_found: str) -> tuple:
+    """PUT: read the row first so only the columns that really change are written and logged."""
+    table = model.__table__
+    current = conn.execute(select(*table.c).where(_primary_key(model) == key)).first()
+    if current is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    _check_version(current, expected)
+    changed = {name: value for name, value in values.items() if getattr(current, name) != value}
+    if not changed:
+        return current._asdict(), None
+    return _update_row(conn, model, key, changed, current.version, not_found)
+
+
+def _idempotent(conn, key: str, fingerprint: str, operation, *args) -> tuple:
+    """Claim ``key`` and run ``operation`` in the same transaction, or replay the stored response."""
+    global _idempotency_pruned
+    now = int(time.time())
+    if now - _idempotency_pruned >= IDEMPOTENCY_PRUNE_INTERVAL:
+        conn.exec_driver_sql("DELETE FROM idempotencykey WHERE created < ?", (now - IDEMPOTENCY_TTL,))
+        _idempotency_pruned = now
+    # کلید منقضی‌شده دوباره قابل استفاده است
+    claimed = conn.exec_driver_sql("""
+        INSERT INTO idempotencykey (key, fingerprint, created) VALUES (?, ?, ?)
+        ON CONFLICT (key) DO UPDATE
+        SET fingerprint = excluded.fingerprint, response = NULL, created = excluded.created
+        WHERE idempotencykey.created < ?
+        RETURNING key""", (key, fingerprint, now, now - IDEMPOTENCY_TTL)).first()
+    if claimed is None:
+        stored, response = conn.exec_driver_sql(
+            "SELECT fingerprint, response FROM idempotencykey WHERE key = ?", (key,)).first()
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used for a different request")
+        return json.loads(response), _REPLAYED
+    body, change = operation(conn, *args)
+    conn.exec_driver_sql("UPDATE idempotencykey SET response = ? WHERE key = ?",
+                         (json.dumps(body, ensure_ascii=False), key))
+    return body, change
+
+
+async def _write(session, request: Request, model, operation, *args) -> Response:
+    """Run the sync write ``operation(conn, *args)`` and respond with its result.
+
+    ``operation`` returns ``(body, change)``, where ``change`` is ``(op, fields)``
+    for the change log, or ``None`` if nothing was written.  With
+    ``UNI_WRITE_QUEUE=1`` the operation is group-committed by ``writequeue``.
+    With an ``Idempotency-Key`` header the key is claimed in the same
+    transaction, and a retry gets the stored response back instead of
+    writing again.  Only successful responses are stored.  A constraint
+    violation, such as a duplicate primary key, is answered with 409.
+    """
+    key = request.headers.get("idempotency-key")
+    if key is not None:
+        if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
             raise HTTPException(
-                status_code=400, detail="کد ملی قبلاً ثبت شده است.")
+                status_code=422, detail=f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+        digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode())
+        digest.update(await request.body())
+        operation, args = _idempotent, (key, digest.hexdigest(), operation, *args)
+
+    try:
+        if writequeue.ENABLED:
+            body, change = await writequeue.submit(operation, *args)
+        else:
+            conn = await session.connection()
+            # مثل صف نوشتن: قفل از ابتدا گرفته می‌شود تا خواندن پیش از نوشتن (PUT، کد ملی) کهنه نشود
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                body, change = await conn.run_sync(operation, *args)
+            except (HTTPException, IntegrityError):
+                await session.rollback()
+                raise
+            await session.commit()
+    except IntegrityError as e:
+        # کلید تکراری یا کد ملی تکراری خطای ورودی است، نه خطای سرور
+        raise HTTPException(status_code=409, detail=f"Conflicts with an existing record: {e.orig}")
+
+    if change is _REPLAYED:
+        return encoding.JSONResponse(body, headers={"Idempotent-Replayed": "true"})
+    if change is not None:
+        # نوشتن مستقیم از رویدادهای ORM نمی‌گذرد، پس تغییر اینجا ثبت می‌شود
+        key = body[_primary_key(model).name]
+        entity_cache.invalidate(model.__tablename__, [key])
+        changes.record(model.__tablename__, key, *change)
+    return encoding.JSONResponse(body)
 
-        session.add(professor)
-        session.commit()
-        session.refresh(professor)
-    return professor
+
+@router.post("/professors/")
+@retry_on_busy
+async def create_professor(professor: Professor, request: Request, session: SessionDep):
+    return await _write(session, request, Professor, _insert_professor, professor.model_dump(exclude={"version"}))
 
 
 @router.get("/professors/{professor_id}")
-def read_professor(professor_id: str):
-    with Session(engine) as session:
-        professor = session.get(Professor, professor_id)
+async def read_professor(professor_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _entity_not_modified(request, response, session, Professor, professor_id):
+        return not_modified
+    professor = await _read_cached(session, Professor, professor_id)
     if professor is None:
         return {"message": "Professor not found"}
-    return professor
+    return _json(response, professor)
 
 
 @router.get("/professors/")
-def read_professors(
+async def read_professors(
     session: SessionDep,
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
-) -> list[Professor]:
-    professors = session.exec(
-        select(Professor).offset(offset).limit(limit)).all()
-    return professors
+    limit: Annotated[int, Query(ge=1, le=KEYSET_MAX_LIMIT)] = 100,
+    after: Optional[str] = None,
+    department: Optional[str] = None,
+    major: Optional[str] = None,
+    born_city: Optional[str] = None,
+    birth_year_min: Optional[int] = None,
+    birth_year_max: Optional[int] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    count: bool = False,
+):
+    if not_modified := await _not_modified(request, response, session, ["professor"], str(request.query_params)):
+        return not_modified
+    filters = {
+        "department": department, "major": major, "born_city": born_city,
+        "birth_year_min": birth_year_min, "birth_year_max": birth_year_max,
+    }
+    return _json(response, await _read_page(session, Professor, response, offset, limit, after, filters, sort, fields, count))
 
 
 @router.post("/students/")
-def create_student(student: Student):
-    with Session(engine) as session:
-        session.add(student)
-        session.commit()
-        session.refresh(student)
-    return student
+@retry_on_busy
+async def create_student(student: Student, request: Request, session: SessionDep):
+    return await _write(session, request, Student, _insert_row, Student, student.model_dump(exclude={"version"}))
 
 
 @router.get("/students/{student_id}")
-def read_student(student_id: str):
-    with Session(engine) as session:
-        student = session.get(Student, student_id)
+async def read_student(student_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _entity_not_modified(request, response, session, Student, student_id):
+        return not_modified
+    student = await _read_cached(session, Student, student_id)
     if student is None:
         return {"message": "Student not found"}
-    return student
+    return _json(response, student)
 
 
 @router.get("/students/")
-def read_students(
+async def read_students(
     session: SessionDep,
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
-) -> list[Student]:
-    students = session.exec(select(Student).offset(offset).limit(limit)).all()
-    return students
+    limit: Annotated[int, Query(ge=1, le=KEYSET_MAX_LIMIT)] = 100,
+    after: Optional[str] = None,
+    department: Optional[str] = None,
+    major: Optional[str] = None,
+    borncity: Optional[str] = None,
+    married: Optional[str] = None,
+    birth_year_min: Optional[int] = None,
+    birth_year_max: Optional[int] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    count: bool = False,
+):
+    if not_modified := await _not_modified(request, response, session, ["student"], str(request.query_params)):
+        return not_modified
+    filters = {
+        "department": department, "major": major, "borncity": borncity, "married": married,
+        "birth_year_min": birth_year_min, "birth_year_max": birth_year_max,
+    }
+    return _json(response, await _read_page(session, Student, response, offset, limit, after, filters, sort, fields, count))
 
 
 @router.post("/courses/")
-def create_course(course: Course):
-    with Session(engine) as session:
-        session.add(course)
-        session.commit()
-        session.refresh(course)
-    return course
+@retry_on_busy
+async def create_course(course: Course, request: Request, session: SessionDep):
+    return await _write(session, request, Course, _insert_row, Course, course.model_dump(exclude={"version"}))
 
 
 @router.get("/courses/{course_id}")
-def read_course(course_id: str):
-    with Session(engine) as session:
-        course = session.get(Course, course_id)
+async def read_course(course_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _entity_not_modified(request, response, session, Course, course_id):
+        return not_modified
+    course = await _read_cached(session, Course, course_id)
     if course is None:
         return {"message": "Course not found"}
-    return course
+    return _json(response, course)
 
 
 @router.get("/courses/")
-def read_courses(
+async def read_courses(
     session: SessionDep,
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
-) -> list[Course]:
-    courses = session.exec(select(Course).offset(offset).limit(limit)).all()
-    return courses
+    limit: Annotated[int, Query(ge=1, le=KEYSET_MAX_LIMIT)] = 100,
+    after: Optional[str] = None,
+    department: Optional[str] = None,
+    credit: Optional[int] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    count: bool = False,
+):
+    if not_modified := await _not_modified(request, response, session, ["course"], str(request.query_params)):
+        return not_modified
+    filters = {
+        "department": department, "credit": credit,
+    }
+    return _json(response, await _read_page(session, Course, response, offset, limit, after, filters, sort, fields, count))
+
+
+@router.get("/courses/{course_id}/students")
+async def read_course_students(course_id: str, request: Request, response: Response, session: SessionDep) -> list[Student]:
+    if not_modified := await _not_modified(request, response, session, ["student", "enrollment"], course_id):
+        return not_modified
+    return _json(response, (await session.exec(
+        select(Student).join(Enrollment, Enrollment.stid == Student.stid)
+        .where(Enrollment.cid == course_id))).all())
+
+
+@router.get("/professors/{professor_id}/students")
+async def read_professor_students(professor_id: str, request: Request, response: Response, session: SessionDep) -> list[Student]:
+    if not_modified := await _not_modified(
+            request, response, session, ["student", "enrollment", "teaching", "studentprofessor"], professor_id):
+        return not_modified
+    # دانشجویانی که مستقیماً به استاد مرتبط‌اند یا در درسی از او ثبت‌نام کرده‌اند
+    advised = select(StudentProfessor.stid).where(
+        StudentProfessor.lid == professor_id)
+    taught = (select(Enrollment.stid)
+              .join(Teaching, Teaching.cid == Enrollment.cid)
+              .where(Teaching.lid == professor_id))
+    return _json(response, (await session.exec(
+        select(Student).where(or_(Student.stid.in_(advised), Student.stid.in_(taught))))).all())
 
 
 @router.delete("/professors/{professor_id}")
-def delete_professor(professor_id: str):
-    with Session(engine) as session:
-        professor = session.get(Professor, professor_id)
-        if professor:
-            session.delete(professor)
-            session.commit()
-            return {"message": "Professor deleted"}
-        else:
-            return {"message": "Professor not found"}
+@retry_on_busy
+async def delete_professor(professor_id: str, session: SessionDep):
+    professor = await session.get(Professor, professor_id)
+    if professor:
+        await session.delete(professor)
+        # مثل delete_course: حذف اول قفل نوشتن را می‌گیرد، بعد گروه‌های درسی استاد شمرده می‌شوند
+        await session.flush()
+        if (await session.exec(select(Section.section_id).where(Section.lid == professor_id).limit(1))).first():
+            await session.rollback()
+            raise HTTPException(
+                status_code=409, detail="Professor teaches sections; reassign or delete them first")
+        await _delete_links(session, Professor, professor_id)
+        await session.commit()
+        entity_cache.invalidate("professor", [professor_id])
+        return {"message": "Professor deleted"}
+    else:
+        return {"message": "Professor not found"}
 
 
 @router.delete("/students/{student_id}")
-def delete_student(student_id: str):
-    with Session(engine) as session:
-        student = session.get(Student, student_id)
-        if student:
-            session.delete(student)
-            session.commit()
-            return {"message": "Student deleted"}
-        else:
-            return {"message": "Student not found"}
+@retry_on_busy
+async def delete_student(student_id: str, session: SessionDep):
+    student = await session.get(Student, student_id)
+    if student:
+        async with _registration_lock:
+            released = await (await session.connection()).run_sync(_release_student, student_id)
+            await _delete_links(session, Student, student_id)
+            await session.delete(student)
+            await session.commit()
+        promoted = [stid for students in released.values() for stid in students]
+        for section_id, students in released.items():
+            _record_seats(section_id, students, [] if students else ["enrolled"])
+        entity_cache.invalidate("student", [student_id, *promoted])
+        return {"message": "Student deleted"}
+    else:
+        return {"message": "Student not found"}
 
 
 @router.delete("/courses/{course_id}")
-def delete_course(course_id: str):
-    with Session(engine) as session:
-        course = session.get(Course, course_id)
-        if course:
-            session.delete(course)
-            session.commit()
-            return {"message": "Course deleted"}
-        else:
-            return {"message": "Course not found"}
-
-
-def get_session_dep():
-    with Session(engine) as session:
-        yield session
+@retry_on_busy
+async def delete_course(course_id: str, session: SessionDep):
+    course = await session.get(Course, course_id)
+    if course:
+        await session.delete(course)
+        # حذف اول قفل نوشتن را می‌گیرد؛ گروه‌های درسی پس از آن شمرده می‌شوند تا create_section جا نماند
+        await session.flush()
+        if (await session.exec(select(Section.section_id).where(Section.cid == course_id).limit(1))).first():
+            await session.rollback()
+            raise HTTPException(
+                status_code=409, detail="Course has sections; delete its sections first")
+        await _delete_links(session, Course, course_id)
+        await session.commit()
+        entity_cache.invalidate("course", [course_id])
+        return {"message": "Course deleted"}
+    else:
+        return {"message": "Course not found"}
 
 
 @router.put("/professors/{professor_id}")
-def update_professor(professor_id: str, professor: Professor, session: SessionType = Depends(get_session_dep)) -> Professor:
-    db_professor = session.get(Professor, professor_id)
-    if not db_professor:
-        raise HTTPException(status_code=404, detail="Professor not found")
-    prof_data = professor.dict(exclude_unset=True)
-    for key, value in prof_data.items():
-        setattr(db_professor, key, value)
-    session.add(db_professor)
-    session.commit()
-    session.refresh(db_professor)
-    return db_professor
+@retry_on_busy
+async def update_professor(professor_id: str, professor: Professor, request: Request, session: SessionDep):
+    prof_data = professor.dict(exclude_unset=True, exclude={"lid"})
+    expected = prof_data.pop("version", None)
+    return await _write(session, request, Professor, _replace_row, Professor, professor_id, prof_data, expected, "Professor not found")
 
 
 @router.put("/students/{student_id}")
-def update_student(student_id: str, student: Student, session: SessionType = Depends(get_session_dep)) -> Student:
-    db_student = session.get(Student, student_id)
-    if not db_student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    student_data = student.dict(exclude_unset=True)
-    for key, value in student_data.items():
-        setattr(db_student, key, value)
-    session.add(db_student)
-    session.commit()
-    session.refresh(db_student)
-    return db_student
+@retry_on_busy
+async def update_student(student_id: str, student: Student, request: Request, session: SessionDep):
+    student_data = student.dict(exclude_unset=True, exclude={"stid"})
+    expected = student_data.pop("version", None)
+    return await _write(session, request, Student, _replace_row, Student, student_id, student_data, expected, "Student not found")
 
 
 @router.put("/courses/{course_id}")
-def update_course(course_id: str, course: Course, session: SessionType = Depends(get_session_dep)) -> Course:
-    db_course = session.get(Course, course_id)
-    if not db_course:
+@retry_on_busy
+async def update_course(course_id: str, course: Course, request: Request, session: SessionDep):
+    course_data = course.dict(exclude_unset=True, exclude={"cid"})
+    expected = course_data.pop("version", None)
+    return await _write(session, request, Course, _replace_row, Course, course_id, course_data, expected, "Course not found")
+
+
+# ویرایش جزئی (PATCH): فقط فیلدهای فرستاده‌شده اعتبارسنجی و با یک UPDATE نوشته می‌شوند
+
+
+def _patch_errors(model, key_name: str, values: dict, expected) -> dict:
+    errors = {}
+    if expected is not None and (isinstance(expected, bool) or not isinstance(expected, int)):
+        errors["version"] = "version must be an integer"
+    for name, value in values.items():
+        if name == key_name:
+            errors[name] = f"{key_name} cannot be changed"
+        elif name not in model.model_fields or name == "version":
+            errors[name] = "Unknown field"
+        elif isinstance(value, bool) or not isinstance(value, model.model_fields[name].annotation):
+            errors[name] = f"{name} must be of type {model.model_fields[name].annotation.__name__}"
+    errors.update(validation.check_fields(
+        model.__tablename__, {name: value for name, value in values.items() if name not in errors}))
+    return errors
+
+
+async def _patch(session, request: Request, model, key: str, body: dict, not_found: str) -> Response:
+    """Validate the sparse ``body`` field by field and write only the supplied fields.
+
+    An optional ``version`` in the body must match the row's, otherwise 409.
+    """
+    values = dict(body)
+    expected = values.pop("version", None)
+    if errors := _patch_errors(model, _primary_key(model).name, values, expected):
+        raise HTTPException(status_code=422, detail=[
+            {"loc": ["body", name], "msg": message, "type": "value_error"}
+            for name, message in errors.items()])
+    return await _write(session, request, model, _update_row, model, key, values, expected, not_found)
+
+
+@router.patch("/professors/{professor_id}")
+@retry_on_busy
+async def patch_professor(professor_id: str, body: dict, request: Request, session: SessionDep):
+    return await _patch(session, request, Professor, professor_id, body, "Professor not found")
+
+
+@router.patch("/students/{student_id}")
+@retry_on_busy
+async def patch_student(student_id: str, body: dict, request: Request, session: SessionDep):
+    return await _patch(session, request, Student, student_id, body, "Student not found")
+
+
+@router.patch("/courses/{course_id}")
+@retry_on_busy
+async def patch_course(course_id: str, body: dict, request: Request, session: SessionDep):
+    return await _patch(session, request, Course, course_id, body, "Course not found")
+
+
+# خواندن گروهی با فهرست شناسه‌ها
+
+
+class BatchGet(SQLModel):
+    ids: list[str]
+
+
+async def _batch_get(session, model, body: BatchGet) -> dict:
+    """Resolve ``body.ids`` in request order; ``items`` holds ``None`` for each miss."""
+    if len(body.ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=422, detail=f"At most {BATCH_GET_MAX_IDS} ids per request")
+    rows = await _read_many_cached(session, model, body.ids)
+    return {
+        "items": [rows.get(key) for key in body.ids],
+        "missing": [key for key in dict.fromkeys(body.ids) if key not in rows],
+    }
+
+
+@router.post("/professors/batch-get")
+async def batch_get_professors(body: BatchGet, session: SessionDep):
+    return encoding.JSONResponse(await _batch_get(session, Professor, body))
+
+
+@router.post("/students/batch-get")
+async def batch_get_students(body: BatchGet, session: SessionDep):
+    return encoding.JSONResponse(await _batch_get(session, Student, body))
+
+
+@router.post("/courses/batch-get")
+async def batch_get_courses(body: BatchGet, session: SessionDep):
+    return encoding.JSONResponse(await _batch_get(session, Course, body))
+
+
+# ثبت‌نام در گروه‌های درسی: صندلی، سقف واحد، تداخل زمانی و صف انتظار
+
+# سقف مجموع واحدهای هر دانشجو
+MAX_CREDITS = int(os.environ.get("UNI_MAX_CREDITS", "20"))
+
+# تراکنش‌های ثبت‌نام در هر فرایند پشت سر هم اجرا می‌شوند؛ درخواست‌های هم‌زمان در این صف
+# منتظر می‌مانند و نه در busy handler خود SQLite که با فاصله‌های تا ۱۰۰ میلی‌ثانیه دوباره تلاش می‌کند
+_registration_lock = asyncio.Lock()
+
+
+class RegistrationRequest(SQLModel):
+    stid: str
+
+
+# موتور ثبت‌نام روی اتصال همگام و با SQL خام اجرا می‌شود (با conn.run_sync)؛ هر تراکنش
+# چند دستور کوتاه است و ساختن عبارت‌های SQLAlchemy و رفت‌وبرگشت async بیشتر از خود SQLite زمان می‌برد
+
+_ELIGIBILITY_SQL = """
+    SELECT student.courseids,
+           EXISTS (SELECT 1 FROM enrollment WHERE stid = :stid AND cid = :cid),
+           (SELECT credit FROM course WHERE cid = :cid),
+           (SELECT COALESCE(SUM(course.credit), 0) FROM enrollment
+            JOIN course ON course.cid = enrollment.cid WHERE enrollment.stid = :stid),
+           (SELECT registration.section_id FROM registration
+            JOIN sectionslot AS taken ON taken.section_id = registration.section_id
+            JOIN sectionslot AS new ON new.section_id = :section_id AND new.day = taken.day
+                 AND new.start < taken."end" AND taken.start < new."end"
+            WHERE registration.stid = :stid LIMIT 1)
+    FROM student WHERE student.stid = :stid"""
+
+
+def _sync_slots(conn, section_id: str, schedule: str):
+    conn.exec_driver_sql("DELETE FROM sectionslot WHERE section_id = ?", (section_id,))
+    conn.exec_driver_sql(
+        'INSERT INTO sectionslot (section_id, day, start, "end") VALUES (?, ?, ?, ?)',
+        [(section_id, day, start, end) for day, start, end in validation.parse_schedule(schedule)])
+
+
+def _check_eligible(conn, section_id: str, cid: str, stid: str) -> str:
+    """Raise if ``stid`` cannot take ``section_id`` (a section of ``cid``); return their courseids."""
+    row = conn.exec_driver_sql(_ELIGIBILITY_SQL, {
+        "stid": stid, "cid": cid, "section_id": section_id}).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    courseids, takes_course, credit, credits, conflict = row
+    if takes_course:
+        raise HTTPException(status_code=409, detail="Student already takes this course")
+    if credit is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if credits + credit > MAX_CREDITS:
+        raise HTTPException(status_code=409, detail={
+            "message": "Credit limit exceeded", "credits": credits, "max_credits": MAX_CREDITS})
+    if conflict is not None:
+        raise HTTPException(status_code=409, detail={
+            "message": "Time conflict with another section", "section_id": conflict})
+    return courseids
+
+
+def _add_registration(conn, section_id: str, cid: str, stid: str, courseids: str):
+    # درس به courseids هم اضافه می‌شود تا جدول Enrollment و رشته دانشجو یکسان بمانند
+    conn.exec_driver_sql("INSERT INTO registration (stid, section_id) VALUES (?, ?)", (stid, section_id))
+    conn.exec_driver_sql("INSERT OR IGNORE INTO enrollment (stid, cid) VALUES (?, ?)", (stid, cid))
+    conn.exec_driver_sql("UPDATE student SET courseids = ? WHERE stid = ?",
+                         (", ".join(_parse_ids(courseids) + [cid]), stid))
+
+
+def _remove_course(conn, stid: str, cid: str):
+    conn.exec_driver_sql("DELETE FROM enrollment WHERE stid = ? AND cid = ?", (stid, cid))
+    courseids = conn.exec_driver_sql("SELECT courseids FROM student WHERE stid = ?", (stid,)).scalar()
+    if courseids is not None:
+        conn.exec_driver_sql("UPDATE student SET courseids = ? WHERE stid = ?",
+                             (", ".join(i for i in _parse_ids(courseids) if i != cid), stid))
+
+
+def _promote_waitlist(conn, section_id: str) -> list[str]:
+    """Move waitlisted students into the free seats of ``section_id`` in queue order.
+
+    Must run after the transaction has written (so it holds the write lock).
+    Entries that are no longer eligible are dropped from the queue.
+    Returns the promoted student ids.
+    """
+    section = conn.exec_driver_sql(
+        "SELECT cid, capacity - enrolled FROM section WHERE section_id = ?", (section_id,)).first()
+    if section is None or section[1] <= 0:
+        return []
+    cid, free = section
+    entries = conn.exec_driver_sql(
+        "SELECT id, stid FROM waitlist WHERE section_id = ? ORDER BY id", (section_id,)).all()
+    promoted = []
+    for entry_id, stid in entries:
+        if len(promoted) == free:
+            break
+        conn.exec_driver_sql("DELETE FROM waitlist WHERE id = ?", (entry_id,))
+        try:
+            courseids = _check_eligible(conn, section_id, cid, stid)
+        except HTTPException:
+            continue
+        _add_registration(conn, section_id, cid, stid, courseids)
+        promoted.append(stid)
+    if promoted:
+        conn.exec_driver_sql("UPDATE section SET enrolled = enrolled + ? WHERE section_id = ?",
+                             (len(promoted), section_id))
+    return promoted
+
+
+def _release_student(conn, stid: str) -> dict:
+    """Free the seats and queue entries of a student being deleted; return ``{section: promoted ids}``."""
+    conn.exec_driver_sql("DELETE FROM waitlist WHERE stid = ?", (stid,))
+    sections = conn.exec_driver_sql(
+        "DELETE FROM registration WHERE stid = ? RETURNING section_id", (stid,)).scalars().all()
+    released = {}
+    for section_id in sections:
+        conn.exec_driver_sql("UPDATE section SET enrolled = enrolled - 1 WHERE section_id = ?", (section_id,))
+        released[section_id] = _promote_waitlist(conn, section_id)
+    return released
+
+
+def _record_seats(section_id: str, students: list, section_fields: list):
+    """Log the student and section rows the registration engine changed with raw SQL."""
+    for stid in students:
+        changes.record("student", stid, "update", ["courseids"])
+    if section_fields:
+        changes.record("section", section_id, "update", section_fields)
+
+
+def _waitlist_position(conn, section_id: str, stid: str) -> Optional[int]:
+    return conn.exec_driver_sql("""
+        SELECT (SELECT COUNT(*) FROM waitlist AS ahead
+                WHERE ahead.section_id = waitlist.section_id AND ahead.id <= waitlist.id)
+        FROM waitlist WHERE section_id = ? AND stid = ?""", (section_id, stid)).scalar()
+
+
+def _enroll(conn, section_id: str, stid: str, waitlist: bool) -> dict:
+    # گرفتن صندلی نخستین نوشتن تراکنش است؛ از اینجا قفل نوشتن SQLite در دست است
+    # و بررسی‌های بعدی داده تازه را می‌بینند، حتی وقتی چند کارگر هم‌زمان می‌نویسند
+    cid = conn.exec_driver_sql(
+        "UPDATE section SET enrolled = enrolled + 1 "
+        "WHERE section_id = ? AND enrolled < capacity RETURNING cid", (section_id,)).scalar()
+    seated = cid is not None
+    if not seated:
+        cid = conn.exec_driver_sql("SELECT cid FROM section WHERE section_id = ?", (section_id,)).scalar()
+        if cid is None:
+            raise HTTPException(status_code=404, detail="Section not found")
+    courseids = _check_eligible(conn, section_id, cid, stid)
+
+    if not seated:
+        if not waitlist:
+            raise HTTPException(status_code=409, detail="Section is full")
+        position = _waitlist_position(conn, section_id, stid)
+        if position is None:
+            conn.exec_driver_sql("INSERT INTO waitlist (section_id, stid, created) VALUES (?, ?, ?)",
+                                 (section_id, stid, int(time.time())))
+            position = _waitlist_position(conn, section_id, stid)
+        return {"status": "waitlisted", "section_id": section_id, "stid": stid, "position": position}
+
+    _add_registration(conn, section_id, cid, stid, courseids)
+    return {"status": "enrolled", "section_id": section_id, "stid": stid}
+
+
+def _drop(conn, section_id: str, stid: str) -> dict:
+    registered = conn.exec_driver_sql(
+        "DELETE FROM registration WHERE stid = ? AND section_id = ? RETURNING stid",
+        (stid, section_id)).first()
+    if registered is None:
+        queued = conn.exec_driver_sql(
+            "DELETE FROM waitlist WHERE section_id = ? AND stid = ? RETURNING id",
+            (section_id, stid)).first()
+        if queued is None:
+            raise HTTPException(status_code=404, detail="Student is not registered in this section")
+        return {"status": "unqueued", "section_id": section_id, "stid": stid}
+
+    cid = conn.exec_driver_sql(
+        "UPDATE section SET enrolled = enrolled - 1 WHERE section_id = ? RETURNING cid",
+        (section_id,)).scalar()
+    _remove_course(conn, stid, cid)
+    promoted = _promote_waitlist(conn, section_id)
+    return {"status": "dropped", "section_id": section_id, "stid": stid, "promoted": promoted}
+
+
+async def _registration_transaction(session, operation, *args):
+    """Run the sync ``operation(conn, *args)`` under ``_registration_lock`` and commit it.
+
+    An ``HTTPException`` raised by the operation rolls the transaction back
+    before the lock is released, so the next request finds the write lock free.
+    """
+    async with _registration_lock:
+        conn = await session.connection()
+        try:
+            result = await conn.run_sync(operation, *args)
+        except HTTPException:
+            await session.rollback()
+            raise
+        await session.commit()
+    return result
+
+
+@router.post("/sections/")
+@retry_on_busy
+async def create_section(section: Section, session: SessionDep):
+    if await session.get(Section, section.section_id) is not None:
+        raise HTTPException(status_code=400, detail="Section already exists")
+    section.enrolled = 0
+    session.add(section)
+    await (await session.connection()).run_sync(_sync_slots, section.section_id, section.schedule)
+    # درس و استاد پس از گرفتن قفل نوشتن بررسی می‌شوند تا با حذف همزمان آن‌ها گروه یتیم ساخته نشود
+    if (await session.exec(select(Course.cid).where(Course.cid == section.cid))).first() is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Course not found")
-    course_data = course.dict(exclude_unset=True)
-    for key, value in course_data.items():
-        setattr(db_course, key, value)
-    session.add(db_course)
-    session.commit()
-    session.refresh(db_course)
-    return db_course
+    if section.lid is not None and (await session.exec(
+            select(Professor.lid).where(Professor.lid == section.lid))).first() is None:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Professor not found")
+    await session.commit()
+    return encoding.JSONResponse(section.model_dump())
+
+
+@router.get("/sections/{section_id}")
+async def read_section(section_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _not_modified(request, response, session, ["section", "waitlist"], section_id):
+        return not_modified
+    section = await session.get(Section, section_id)
+    if section is None:
+        return {"message": "Section not found"}
+    waitlisted = (await session.execute(
+        select(func.count()).where(Waitlist.section_id == section_id))).scalar()
+    return _json(response, {**section.model_dump(),
+                            "available": section.capacity - section.enrolled,
+                            "waitlisted": waitlisted})
+
+
+@router.get("/sections/")
+async def read_sections(
+    session: SessionDep,
+    request: Request,
+    response: Response,
+    offset: int = 0,
+    limit: Annotated[int, Query(ge=1, le=KEYSET_MAX_LIMIT)] = 100,
+    after: Optional[str] = None,
+    cid: Optional[str] = None,
+    lid: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    count: bool = False,
+):
+    if not_modified := await _not_modified(request, response, session, ["section"], str(request.query_params)):
+        return not_modified
+    filters = {"cid": cid, "lid": lid}
+    return _json(response, await _read_page(session, Section, response, offset, limit, after, filters, sort, fields, count))
+
+
+def _update_section(conn, section_id: str, cid: str, values: dict) -> dict:
+    row = conn.execute(
+        update(Section).where(Section.section_id == section_id).values(**values)
+        .returning(*Section.__table__.c)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    if row.cid != cid:
+        raise HTTPException(status_code=400, detail="The course of a section cannot be changed")
+    if values.get("lid") is not None and conn.execute(
+            select(Professor.lid).where(Professor.lid == values["lid"])).first() is None:
+        raise HTTPException(status_code=404, detail="Professor not found")
+    if row.capacity < row.enrolled:
+        raise HTTPException(status_code=409, detail="Capacity is below the number of enrolled students")
+    if "schedule" in values:
+        _sync_slots(conn, section_id, row.schedule)
+    # افزایش ظرفیت صندلی‌های تازه را به صف انتظار می‌دهد
+    promoted = _promote_waitlist(conn, section_id)
+    return {**row._asdict(), "enrolled": row.enrolled + len(promoted), "promoted": promoted}
+
+
+@router.put("/sections/{section_id}")
+@retry_on_busy
+async def update_section(section_id: str, section: Section, session: SessionDep):
+    values = section.dict(exclude_unset=True, exclude={"section_id", "cid", "enrolled"})
+    result = await _registration_transaction(session, _update_section, section_id, section.cid, values)
+    _record_seats(section_id, result["promoted"], list(values) + (["enrolled"] if result["promoted"] else []))
+    entity_cache.invalidate("student", result["promoted"])
+    return encoding.JSONResponse(result)
+
+
+def _delete_section(conn, section_id: str) -> dict:
+    enrolled = conn.exec_driver_sql(
+        "DELETE FROM section WHERE section_id = ? RETURNING enrolled", (section_id,)).scalar()
+    if enrolled is None:
+        return {"message": "Section not found"}
+    if enrolled:
+        raise HTTPException(status_code=409, detail="Section has enrolled students")
+    conn.exec_driver_sql("DELETE FROM sectionslot WHERE section_id = ?", (section_id,))
+    conn.exec_driver_sql("DELETE FROM waitlist WHERE section_id = ?", (section_id,))
+    return {"message": "Section deleted"}
+
+
+@router.delete("/sections/{section_id}")
+@retry_on_busy
+async def delete_section(section_id: str, session: SessionDep):
+    result = await _registration_transaction(session, _delete_section, section_id)
+    if result["message"] == "Section deleted":
+        changes.record("section", section_id, "delete")
+    return encoding.JSONResponse(result)
+
+
+@router.post("/sections/{section_id}/enroll")
+@retry_on_busy
+async def enroll(section_id: str, body: RegistrationRequest, session: SessionDep,
+                 waitlist: bool = True):
+    """Take a seat in the section, or join its waitlist (202) when it is full."""
+    result = await _registration_transaction(session, _enroll, section_id, body.stid, waitlist)
+    if result["status"] == "waitlisted":
+        return encoding.JSONResponse(result, status_code=202)
+    _record_seats(section_id, [body.stid], ["enrolled"])
+    entity_cache.invalidate("student", [body.stid])
+    return encoding.JSONResponse(result)
+
+
+@router.post("/sections/{section_id}/drop")
+@retry_on_busy
+async def drop(section_id: str, body: RegistrationRequest, session: SessionDep):
+    """Leave the section (or its waitlist); the freed seat goes to the head of the queue."""
+    result = await _registration_transaction(session, _drop, section_id, body.stid)
+    if result["status"] == "dropped":
+        # با جایگزینی از صف انتظار تعداد ثبت‌نام‌شدگان تغییر نمی‌کند
+        _record_seats(section_id, [body.stid, *result["promoted"]],
+                      [] if result["promoted"] else ["enrolled"])
+    entity_cache.invalidate("student", [body.stid, *result.get("promoted", [])])
+    return encoding.JSONResponse(result)
+
+
+@router.get("/sections/{section_id}/waitlist")
+async def read_section_waitlist(section_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _not_modified(request, response, session, ["waitlist"], section_id):
+        return not_modified
+    entries = (await session.execute(
+        select(Waitlist.stid, Waitlist.created).where(Waitlist.section_id == section_id)
+        .order_by(Waitlist.id))).all()
+    return _json(response, [{"position": position, "stid": stid, "created": created}
+                            for position, (stid, created) in enumerate(entries, 1)])
+
+
+@router.get("/students/{student_id}/sections")
+async def read_student_sections(student_id: str, request: Request, response: Response, session: SessionDep):
+    if not_modified := await _not_modified(
+            request, response, session, ["section", "registration", "waitlist", "enrollment", "course"], student_id):
+        return not_modified
+    sections = (await session.exec(
+        select(Section).join(Registration, Registration.section_id == Section.section_id)
+        .where(Registration.stid == student_id).order_by(Section.section_id))).all()
+    credits = (await session.execute(
+        select(func.coalesce(func.sum(Course.credit), 0))
+        .join(Enrollment, Enrollment.cid == Course.cid)
+        .where(Enrollment.stid == student_id))).scalar()
+    queued = (await session.execute(text("""
+        SELECT section_id, (SELECT COUNT(*) FROM waitlist AS ahead
+                            WHERE ahead.section_id = waitlist.section_id AND ahead.id <= waitlist.id)
+        FROM waitlist WHERE stid = :stid ORDER BY id"""), {"stid": student_id})).all()
+    return _json(response, {
+        "sections": sections,
+        "waitlist": [{"section_id": section_id, "position": position}
+                     for section_id, position in queued],
+        "credits": credits,
+        "max_credits": MAX_CREDITS,
+    })
+
+
+# زمان‌بندی کلاس‌ها و امتحان‌ها به صورت کار ناهمگام با گزارش پیشرفت
+
+# کارها در حافظه همین فرایند نگه داشته می‌شوند؛ با چند کارگر تنها کارگر سازنده وضعیت کار را می‌داند
+SCHEDULE_JOBS_KEEP = 20
+SCHEDULE_MAX_WAIT = 30
+DEFAULT_PERIODS = ["08:00-09:30", "09:45-11:15", "11:30-13:00", "14:00-15:30", "15:45-17:15"]
+
+
+class ScheduleRoom(SQLModel):
+    name: str
+    capacity: int
+
+
+class ScheduleRequest(SQLModel):
+    department: Optional[str] = None
+    rooms: list[ScheduleRoom]
+    # روزهای هفته از شنبه (0) و بازه‌های ساعتی هر روز
+    days: list[int] = [0, 1, 2, 3, 4]
+    periods: list[str] = DEFAULT_PERIODS
+    exam_days: int = 14
+    exam_times: list[str] = ["09:00", "14:00"]
+    # {کد استاد: ["0 08:00-09:30", ...]} ساعت‌هایی که استاد ترجیح می‌دهد درس ندهد
+    avoid: dict[str, list[str]] = {}
+    # درس‌هایی با کمتر از این تعداد دانشجوی مشترک می‌توانند هم‌زمان باشند (با هزینه نرم)
+    min_shared: int = 1
+    time_limit: float = 10.0
+
+    @validator("rooms")
+    def validate_rooms(cls, rooms):
+        if not rooms:
+            raise ValueError("At least one room is required")
+        return rooms
+
+    @validator("days")
+    def validate_days(cls, days):
+        if not days or any(not 0 <= day <= 6 for day in days):
+            raise ValueError("days must be weekday numbers from 0 (Saturday) to 6")
+        return sorted(set(days))
+
+    @validator("periods")
+    def validate_periods(cls, periods):
+        if not periods:
+            raise ValueError("At least one period is required")
+        return [validation.schedule(f"0 {period}")[2:] for period in periods]
+
+    @validator("exam_times")
+    def validate_exam_times(cls, exam_times):
+        if not exam_times or any(not re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d", at) for at in exam_times):
+            raise ValueError("exam_times must be HH:MM times")
+        return exam_times
+
+    @validator("exam_days")
+    def validate_exam_days(cls, exam_days):
+        if not 1 <= exam_days <= 60:
+            raise ValueError("exam_days must be between 1 and 60")
+        return exam_days
+
+    @validator("min_shared")
+    def validate_min_shared(cls, min_shared):
+        if min_shared < 1:
+            raise ValueError("min_shared must be at least 1")
+        return min_shared
+
+    @validator("time_limit")
+    def validate_time_limit(cls, time_limit):
+        if not 0 < time_limit <= 120:
+            raise ValueError("time_limit must be between 0 and 120 seconds")
+        return time_limit
+
+
+schedule_jobs = OrderedDict()
+# ارجاع به taskها تا پیش از پایان جمع‌آوری نشوند
+_schedule_tasks = set()
+
+
+async def _load_schedule_input(department: Optional[str]):
+    async with AsyncSession(engine) as session:
+        selected = select(Course.cid)
+        if department is not None:
+            selected = selected.where(Course.department == department)
+        courses = [{"cid": cid, "credit": credit} for cid, credit in (await session.exec(
+            select(Course.cid, Course.credit).where(Course.cid.in_(selected)).order_by(Course.cid))).all()]
+        teachers, enrollments = {}, {}
+        for lid, cid in (await session.exec(
+                select(Teaching.lid, Teaching.cid).where(Teaching.cid.in_(selected)))).all():
+            teachers.setdefault(cid, []).append(lid)
+        for stid, cid in (await session.exec(
+                select(Enrollment.stid, Enrollment.cid).where(Enrollment.cid.in_(selected)))).all():
+            enrollments.setdefault(cid, []).append(stid)
+    return courses, teachers, enrollments
+
+
+async def _run_schedule_job(job: dict, body: ScheduleRequest):
+    def progress(phase, fraction):
+        job["phase"] = phase
+        job["progress"] = round(fraction, 3)
+
+    job["status"] = "running"
+    progress("loading", 0.0)
+    try:
+        courses, teachers, enrollments = await _load_schedule_input(body.department)
+        # حل‌کننده محاسباتی است و در thread اجرا می‌شود تا حلقه رویداد آزاد بماند
+        job["result"] = await run_in_threadpool(
+            scheduler.solve, courses, teachers, enrollments,
+            [room.model_dump() for room in body.rooms], body.days, body.periods,
+            body.exam_days, body.exam_times, body.avoid, body.min_shared, body.time_limit, progress)
+        job["status"] = "done"
+        progress("done", 1.0)
+    except Exception as e:
+        logger.exception("Schedule job %s failed", job["id"])
+        job["status"] = "failed"
+        job["error"] = str(e)
+    job["finished"] = time.time()
+
+
+@router.post("/schedule/jobs", status_code=202)
+async def create_schedule_job(body: ScheduleRequest):
+    job = {"id": uuid.uuid4().hex[:12], "status": "queued", "phase": None, "progress": 0.0,
+           "department": body.department, "created": time.time(), "finished": None,
+           "result": None, "error": None}
+    schedule_jobs[job["id"]] = job
+    finished = [key for key, old in schedule_jobs.items() if old["finished"] is not None]
+    for key in finished[:max(0, len(schedule_jobs) - SCHEDULE_JOBS_KEEP)]:
+        del schedule_jobs[key]
+    task = asyncio.create_task(_run_schedule_job(job, body))
+    _schedule_tasks.add(task)
+    task.add_done_callback(_schedule_tasks.discard)
+    return encoding.JSONResponse(
+        {"id": job["id"], "status": job["status"], "url": f"/api/schedule/jobs/{job['id']}"}, status_code=202)
+
+
+@router.get("/schedule/jobs")
+async def read_schedule_jobs():
+    return encoding.JSONResponse([{key: value for key, value in job.items() if key != "result"}
+                                  for job in reversed(schedule_jobs.values())])
+
+
+@router.get("/schedule/jobs/{job_id}")
+async def read_schedule_job(job_id: str, wait: Annotated[float, Query(ge=0, le=SCHEDULE_MAX_WAIT)] = 0):
+    """Job status and progress; with ``wait`` the reply is held until the job ends or ``wait`` seconds pass."""
+    job = schedule_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Schedule job not found")
+    deadline = time.monotonic() + wait
+    while job["finished"] is None and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    return encoding.JSONResponse(job)
+
+
+# جستجوی متن کامل
+
+
+def _search_query(q: str) -> str:
+    """Turn free text into an FTS5 query that prefix-matches every term."""
+    terms = re.findall(r"\w+", normalize_persian(q))
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+@router.get("/search")
+async def search(
+    q: str,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    kind: Optional[Literal["student", "professor"]] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    if not_modified := await _not_modified(request, response, session, ["student", "professor"], str(request.query_params)):
+        return not_modified
+    match = _search_query(q)
+    if not match:
+        return []
+    statement = """
+        SELECT searchdoc.kind, searchdoc.key, bm25(search_index) AS rank
+        FROM search_index JOIN searchdoc ON searchdoc.id = search_index.rowid
+        WHERE search_index MATCH :match"""
+    if kind:
+        statement += " AND searchdoc.kind = :kind"
+    statement += " ORDER BY rank LIMIT :limit"
+    hits = (await session.execute(
+        text(statement), {"match": match, "kind": kind, "limit": limit})).all()
+
+    records = {}
+    for source_kind, model in (("student", Student), ("professor", Professor)):
+        keys = [hit.key for hit in hits if hit.kind == source_kind]
+        if keys:
+            pk = _primary_key(model)
+            for obj in (await session.exec(select(model).where(pk.in_(keys)))).all():
+                records[source_kind, getattr(obj, pk.name)] = obj
+    results = []
+    for hit in hits:
+        obj = records.get((hit.kind, hit.key))
+        if obj is None:
+            continue
+        results.append({
+            "kind": hit.kind,
+            "id": hit.key,
+            "fname": obj.fname,
+            "lname": obj.lname,
+            "nid": obj.nid if hit.kind == "student" else obj.nation_id,
+            "rank": hit.rank,
+        })
+    return _json(response, results)
+
+
+# آمار تجمعی از جدول شمارنده‌ها
+
+
+@router.get("/stats")
+async def read_stats(request: Request, response: Response, session: SessionDep, recompute: bool = False):
+    mismatches = None
+    if recompute:
+        conn = await session.connection()
+        mismatches = await conn.run_sync(_rebuild_stats)
+        await session.commit()
+    elif not_modified := await _not_modified(request, response, session, ["student", "professor", "course"]):
+        return not_modified
+
+    counters = {(row.dimension, row.value): row
+                for row in (await session.exec(select(StatCounter))).all()}
+    stats = {}
+    for section, key, table, column, amount in STAT_DIMENSIONS:
+        rows = sorted(((value, row) for (dimension, value), row in counters.items()
+                       if dimension == f"{table}.{column}"), key=lambda item: -item[1].count)
+        part = stats.setdefault(section, {})
+        part.setdefault("total", sum(row.count for _, row in rows))
+        part[f"by_{key}"] = {value: row.count for value, row in rows}
+        if amount:
+            part[f"{amount}s_by_{key}"] = {value: row.total for value, row in rows}
+    if mismatches is not None:
+        stats["recomputed"] = {"mismatches": mismatches}
+    return _json(response, stats)
+
+
+# فید تغییرات برای همگام‌سازی افزایشی (long-poll یا SSE)
+
+CHANGES_MAX_LIMIT = 1000
+CHANGES_MAX_WAIT = 60
+# فاصله پیام زنده‌نگه‌داشتن در جریان SSE (ثانیه)
+SSE_KEEPALIVE = 15
+
+
+async def _read_changes(since: int, limit: int, entity: Optional[str]) -> list[dict]:
+    statement = select(ChangeLog.seq, ChangeLog.entity, ChangeLog.key, ChangeLog.op,
+                       ChangeLog.fields, ChangeLog.at).where(ChangeLog.seq > since)
+    if entity is not None:
+        statement = statement.where(ChangeLog.entity == entity)
+    # نشست کوتاه جدا تا درخواست‌های منتظر تراکنش خواندنی را باز نگه ندارند
+    async with AsyncSession(engine) as session:
+        rows = (await session.exec(statement.order_by(ChangeLog.seq).limit(limit))).all()
+    return [{"seq": seq, "entity": kind, "key": key, "op": op,
+             "fields": fields.split(",") if fields else None, "at": at}
+            for seq, kind, key, op, fields, at in rows]
+
+
+async def _stream_changes(request: Request, since: int, entity: Optional[str]):
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        rows = await _read_changes(since, CHANGES_MAX_LIMIT, entity)
+        for row in rows:
+            yield f"id: {row['seq']}\nevent: change\ndata: {encoding.dumps(row).decode()}\n\n"
+        if rows:
+            since = rows[-1]["seq"]
+            last_sent = time.monotonic()
+            continue
+        if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+        await changes.wait(1.0)
+
+
+@router.get("/changes")
+async def read_changes(
+    request: Request,
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=CHANGES_MAX_LIMIT)] = CHANGES_MAX_LIMIT,
+    entity: Optional[str] = None,
+    wait: Annotated[float, Query(ge=0, le=CHANGES_MAX_WAIT)] = 0,
+    stream: bool = False,
+):
+    """Change records after sequence number ``since``, oldest first.
+
+    With ``wait`` an empty result is held back until a change arrives or
+    ``wait`` seconds pass (long-poll); pass the returned ``next`` as the
+    following ``since``.  With ``stream`` or ``Accept: text/event-stream``
+    the reply is an SSE stream that resumes from ``Last-Event-ID``.
+    """
+    if stream or "text/event-stream" in request.headers.get("accept", ""):
+        last_event_id = request.headers.get("last-event-id", "")
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+        return StreamingResponse(
+            _stream_changes(request, since, entity), media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    deadline = time.monotonic() + wait
+    rows = await _read_changes(since, limit, entity)
+    while not rows and time.monotonic() < deadline:
+        # بیدار شدن با flush همین فرایند، یا هر ثانیه برای نوشته‌های کارگرهای دیگر
+        await changes.wait(min(1.0, deadline - time.monotonic()))
+        rows = await _read_changes(since, limit, entity)
+    return encoding.JSONResponse({"changes": rows, "next": rows[-1]["seq"] if rows else since})
+
+
+@router.get("/cache/stats")
+async def read_cache_stats():
+    return encoding.JSONResponse(entity_cache.stats())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# ورود گروهی (bulk)
+
+
+def _validate_batch(model, rows: list, start: int, upsert: bool):
+    """Validate raw rows; return ``{key: (index, obj)}`` and per-row errors."""
+    pk = _primary_key(model)
+    objects = {}
+    valid, errors = validation.validate_many(model, rows, start)
+    for error in errors:
+        row = rows[error["index"] - start]
+        if isinstance(row, _InvalidLine):
+            error["detail"] = str(row)
+        elif isinstance(row, dict):
+            error["key"] = row.get(pk.name)
+    for index, obj in valid:
+        key = getattr(obj, pk.name)
+        if key is None:
+            errors.append({"index": index, "detail": f"{pk.name} is required"})
+            continue
+        if key in objects and not upsert:
+            errors.append(
+                {"index": index, "key": key, "detail": f"Duplicate {pk.name} in request"})
+            continue
+        objects[key] = (index, obj)
+    return objects, errors
+
+
+async def _write_batch(session, model, rows: list, start: int, upsert: bool) -> dict:
+    """Validate and write one batch of raw rows in a single transaction."""
+    pk = _primary_key(model)
+    # اعتبارسنجی پردازشی است؛ حلقه رویداد را برای درخواست‌های دیگر آزاد نگه می‌داریم
+    objects, errors = await run_in_threadpool(_validate_batch, model, rows, start, upsert)
+    result = {"inserted": 0, "updated": 0, "errors": errors}
+    if not objects:
+        return result
+
+    existing = set((await session.exec(
+        select(pk).where(pk.in_(list(objects))))).all())
+    if not upsert:
+        for key in existing:
+            index, _ = objects.pop(key)
+            result["errors"].append(
+                {"index": index, "key": key, "detail": f"{model.__name__} already exists"})
+    if not objects:
+        return result
+
+    stmt = sqlite_insert(model.__table__)
+    if upsert:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[pk.name],
+            # version را تریگر بالا می‌برد، نه مقدار ردیف ورودی
+            set_={c.name: stmt.excluded[c.name]
+                  for c in model.__table__.columns if c.name not in (pk.name, "version")},
+        )
+    try:
+        await session.execute(stmt, [obj.model_dump()
+                              for _, obj in objects.values()])
+        await _sync_links(session, model, [obj for _, obj in objects.values()])
+        await session.commit()
+    except IntegrityError:
+        # یک ردیف مشکل‌دار کل دسته را خراب نکند؛ ردیف‌ها را تک‌تک ثبت می‌کنیم
+        await session.rollback()
+        for key, (index, obj) in list(objects.items()):
+            try:
+                async with session.begin_nested():
+                    await session.execute(stmt, [obj.model_dump()])
+                    await _sync_links(session, model, [obj])
+            except IntegrityError as e:
+                objects.pop(key)
+                result["errors"].append(
+                    {"index": index, "key": key, "detail": str(e.orig)})
+        await session.commit()
+
+    entity_cache.invalidate(model.__tablename__, objects.keys())
+    for key in objects:
+        changes.record(model.__tablename__, key, "update" if key in existing else "create")
+    updated = len(existing & objects.keys())
+    result["updated"] += updated
+    result["inserted"] += len(objects) - updated
+    return result
+
+
+async def _iter_bulk_rows(request: Request):
+    """Yield rows from a JSON array body or, line by line, an NDJSON stream."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        line_no = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    yield _parse_ndjson_line(line, line_no)
+        if buffer.strip():
+            yield _parse_ndjson_line(buffer, line_no + 1)
+        return
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status_code=400, detail="Body must be a JSON array or NDJSON stream")
+    for row in rows:
+        yield row
+
+
+class _InvalidLine(str):
+    """Stands in for an NDJSON line that is not JSON; its text is that row's error."""
+
+
+def _parse_ndjson_line(line: bytes, line_no: int):
+    # دسته‌های قبلی ثبت شده‌اند، پس خط خراب به جای قطع جریان خطای همان ردیف می‌شود
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _InvalidLine(f"Invalid JSON on line {line_no}")
+
+
+async def _bulk_import(session, model, request: Request, upsert: bool) -> dict:
+    summary = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+    start = 0
+
+    async def flush():
+        result = await _with_busy_retry(
+            session, lambda: _write_batch(session, model, batch, start, upsert))
+        summary["inserted"] += result["inserted"]
+        summary["updated"] += result["updated"]
+        summary["errors"].extend(result["errors"])
+
+    async for row in _iter_bulk_rows(request):
+        batch.append(row)
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush()
+            start += len(batch)
+            batch = []
+    if batch:
+        await flush()
+    summary["failed"] = len(summary["errors"])
+    return summary
+
+
+@router.post("/professors/bulk")
+async def bulk_professors(request: Request, session: SessionDep, mode: Literal["insert", "upsert"] = "insert"):
+    return await _bulk_import(session, Professor, request, mode == "upsert")
+
+
+@router.post("/students/bulk")
+async def bulk_students(request: Request, session: SessionDep, mode: Literal["insert", "upsert"] = "insert"):
+    return await _bulk_import(session, Student, request, mode == "upsert")
+
+
+@router.post("/courses/bulk")
+async def bulk_courses(request: Request, session: SessionDep, mode: Literal["insert", "upsert"] = "insert"):
+    return await _bulk_import(session, Course, request, mode == "upsert")
 
 
 app = FastAPI(
@@ -619,7 +2602,9 @@ app = FastAPI(
     description="API for managing students, professors, and courses.",
     openapi_url="/api/openapi.json",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=encoding.JSONResponse,
+    lifespan=lifespan,
 )
 origins = ["*"]
 
@@ -629,7 +2614,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified", "X-Profile-Id"],
 )
+app.add_middleware(encoding.CompressionMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 def custom_openapi():
@@ -0,0 +1,561 @@
+"""Benchmark and load-test suite for the University API.
+
+Usage::
+
+    python benchmark.py seed --db bench.db --students 10000
+    python benchmark.py asgi --db bench.db --requests 200 --concurrency 1,16,64 -o run.json
+    python benchmark.py http --db bench.db --workers 1 --concurrency 1,16,64,128 -o run.json
+    python benchmark.py scale --db bench.db --workers 1,2,4,8 --concurrency 8,64 -o scale.json
+    python benchmark.py compare baseline.json run.json
+
+``seed`` builds a synthetic database through the API's own migrations, so
+search, version and join tables are populated exactly as in production.
+``asgi`` drives every endpoint in-process through httpx's ASGI transport and
+``http`` does the same against a local ``serve.py`` (or ``--url``), sweeping
+the given concurrency levels; ``scale`` repeats the HTTP sweep for several
+worker counts.  All write JSON with throughput and p50/p95/p99 latency per
+endpoint and concurrency level; ``compare`` diffs two such files.
+
+The student id validator only admits ``403114150xx``, i.e. 100 ids.  Seeded
+students use the same 11-digit shape with the following prefixes, which the
+API serves but would refuse to create; the valid block is left free for the
+create/delete scenarios.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import subprocess
+from dataclasses import dataclass
+
+import httpx
+
+import validation
+
+FIRST_NAMES = [
+    "علی", "محمد", "حسین", "رضا", "مهدی", "امیر", "سارا", "مریم", "زهرا", "فاطمه",
+    "نرگس", "هیراد", "کوشا", "ایلیا", "آرمین", "مجید", "نیما", "پریسا", "الهام", "یاسمن",
+]
+LAST_NAMES = [
+    "احمدی", "محمدی", "حسینی", "رضایی", "کریمی", "موسوی", "جعفری", "طولابی", "رشنو", "مویدی",
+    "صادقی", "رحیمی", "نوری", "قاسمی", "عباسی", "کاظمی", "هاشمی", "یوسفی", "اکبری", "سلیمانی",
+]
+COURSE_WORDS = ["ریاضی", "فیزیک", "برنامه نویسی", "مدار", "اقتصاد", "آمار", "شیمی",
+                "ساختمان داده", "مدیریت", "حسابداری"]
+
+STUDENT_ID_PREFIX = 403114150
+VALID_STUDENT_IDS = 100
+
+# گروه درسی پرتقاضا که همه درخواست‌های ثبت‌نام بار روی آن می‌آیند
+POPULAR_SECTION_CAPACITY = 100
+
+
+# تولید داده‌های مصنوعی معتبر
+
+
+def national_id(n: int) -> str:
+    body = f"{n % 10**9:09d}"
+    s = sum(int(body[i]) * (10 - i) for i in range(9)) % 11
+    nid = body + str(s if s < 2 else 11 - s)
+    return nid if len(set(nid)) > 1 else national_id(n + 1)
+
+
+def student_id(i: int) -> str:
+    return f"{STUDENT_ID_PREFIX + i // VALID_STUDENT_IDS}{i % VALID_STUDENT_IDS:02d}"
+
+
+def birth(rng: random.Random) -> str:
+    return f"{rng.randint(1, 30):02d}/{rng.randint(1, 12):02d}/{rng.randint(1360, 1385)}"
+
+
+def home_phone(rng: random.Random) -> str:
+    return rng.choice(PHONE_PREFIXES) + f"{rng.randint(0, 10**8 - 1):08d}"
+
+
+PHONE_PREFIXES = sorted(validation.HOME_PHONE_PREFIXES)
+CITIES = sorted(validation.CITIES)
+DEPARTMENTS = sorted(validation.STUDENT_MAJORS_BY_DEPARTMENT)
+LETTERS = sorted(validation.PERSIAN_LETTERS)
+
+
+def make_student(i: int, rng: random.Random, courses: list, professors: list) -> dict:
+    department = rng.choice(DEPARTMENTS)
+    return {
+        "stid": student_id(i),
+        "fname": rng.choice(FIRST_NAMES),
+        "lname": rng.choice(LAST_NAMES),
+        "father": rng.choice(FIRST_NAMES),
+        "birth": birth(rng),
+        "ids_number": f"{rng.randint(0, 999999):06d}",
+        "ids_letter": rng.choice(LETTERS),
+        "ids_code": f"{rng.randint(10, 99)}",
+        "borncity": rng.choice(CITIES),
+        "address": "خیابان " + rng.choice(LAST_NAMES) + f" پلاک {rng.randint(1, 200)}",
+        "postalcode": f"{rng.randint(10**9, 10**10 - 1)}",
+        "cphone": f"09{rng.randint(0, 10**9 - 1):09d}",
+        "hphone": home_phone(rng),
+        "department": department,
+        "married": rng.choice(sorted(validation.MARITAL_STATUSES)),
+        "nid": national_id(10**8 + i),
+        "major": rng.choice(sorted(validation.STUDENT_MAJORS_BY_DEPARTMENT[department])),
+        "courseids": ",".join(rng.sample(courses, min(5, len(courses)))),
+        "lids": ",".join(rng.sample(professors, min(2, len(professors)))),
+    }
+
+
+def make_professor(i: int, rng: random.Random, courses: list) -> dict:
+    return {
+        "lid": f"{100000 + i}",
+        "fname": rng.choice(FIRST_NAMES),
+        "lname": rng.choice(LAST_NAMES),
+        "nation_id": national_id(5 * 10**8 + i),
+        "department": rng.choice(DEPARTMENTS),
+        "major": rng.choice(sorted(validation.PROFESSOR_MAJORS)),
+        "birth_date": birth(rng),
+        "born_city": rng.choice(CITIES),
+        "address": "خیابان " + rng.choice(LAST_NAMES),
+        "postal_code": f"{rng.randint(10**9, 10**10 - 1)}",
+        "cphone": f"09{rng.randint(0, 10**9 - 1):09d}",
+        "hphone": home_phone(rng),
+        "course_ids": ",".join(rng.sample(courses, min(3, len(courses)))),
+    }
+
+
+def make_course(i: int, rng: random.Random) -> dict:
+    return {
+        "cid": f"{10000 + i}",
+        "course_name": f"{rng.choice(COURSE_WORDS)} {rng.choice(['پایه', 'پیشرفته', 'عمومی'])}",
+        "credit": rng.randint(1, 4),
+        "department": rng.choice(DEPARTMENTS),
+    }
+
+
+def _check_sample(entity: str, rows: list):
+    for row in rows[:200]:
+        errors = validation.check_fields(entity, row)
+        if errors:
+            raise SystemExit(f"generated {entity} fails validation: {errors}")
+
+
+def _insert(db, table: str, rows: list):
+    if rows:
+        columns = list(rows[0])
+        db.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row[c] for c in columns) for row in rows])
+
+
+def seed(args):
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ["UNI_DB"] = args.db
+    import Uni
+    asyncio.run(Uni.create_db_and_tables())
+    asyncio.run(Uni.engine.dispose())
+
+    rng = random.Random(args.seed)
+    n_courses = args.courses or max(20, min(90000, args.students // 50))
+    n_professors = args.professors or max(10, args.students // 100)
+    started = time.perf_counter()
+    db = sqlite3.connect(args.db)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = OFF")
+
+    courses = [make_course(i, rng) for i in range(n_courses)]
+    _check_sample("course", courses)
+    course_ids = [c["cid"] for c in courses]
+    _insert(db, "course", courses)
+
+    professors = [make_professor(i, rng, course_ids) for i in range(n_professors)]
+    _check_sample("professor", professors)
+    professor_ids = [p["lid"] for p in professors]
+    _insert(db, "professor", professors)
+    _insert(db, "teaching", [{"lid": p["lid"], "cid": cid}
+            for p in professors for cid in Uni._parse_ids(p["course_ids"])])
+    db.commit()
+
+    # بلوک اول شماره‌های معتبر برای سناریوهای ایجاد و حذف خالی می‌ماند
+    sample = [make_student(i, rng, course_ids, professor_ids)
+              for i in range(VALID_STUDENT_IDS)]
+    _check_sample("student", sample)
+    batch = 10000
+    for start in range(VALID_STUDENT_IDS, VALID_STUDENT_IDS + args.students, batch):
+        stop = min(start + batch, VALID_STUDENT_IDS + args.students)
+        students = [make_student(i, rng, course_ids, professor_ids)
+                    for i in range(start, stop)]
+        _insert(db, "student", students)
+        _insert(db, "enrollment", [{"stid": s["stid"], "cid": cid}
+                for s in students for cid in Uni._parse_ids(s["courseids"])])
+        _insert(db, "studentprofessor", [{"stid": s["stid"], "lid": lid}
+                for s in students for lid in Uni._parse_ids(s["lids"])])
+        db.commit()
+    popular = course_ids[0] + "01"
+    _insert(db, "section", [{"section_id": popular, "cid": course_ids[0], "lid": None,
+                             "capacity": POPULAR_SECTION_CAPACITY,
+                             "schedule": "0 08:00-10:00", "enrolled": 0}])
+    _insert(db, "sectionslot", [{"section_id": popular, "day": 0, "start": 480, "end": 600}])
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+    print(json.dumps({
+        "db": args.db, "students": args.students, "professors": n_professors,
+        "courses": n_courses, "seconds": round(time.perf_counter() - started, 2),
+    }))
+
+
+# سناریوها
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    build: callable
+    # سناریوهای سنگین (مثل خروجی کامل) با درخواست کمتری اجرا می‌شوند
+    weight: float = 1.0
+    # سقف درخواست‌ها، برای سناریوهایی که هر شناسه را تنها یک بار می‌توانند به کار ببرند
+    cap: int = None
+    # درخواست دوم روی پاسخ اول، مثل صبر برای پایان کار زمان‌بندی؛ زمان هر دو با هم سنجیده می‌شود
+    follow: callable = None
+
+
+def _sample_keys(db_path: str) -> dict:
+    db = sqlite3.connect(db_path)
+
+    def keys(sql):
+        return [row[0] for row in db.execute(sql)]
+    ctx = {
+        "students": keys("SELECT stid FROM student ORDER BY random() LIMIT 1000"),
+        "professors": keys("SELECT lid FROM professor ORDER BY random() LIMIT 1000"),
+        "courses": keys("SELECT cid FROM course ORDER BY random() LIMIT 1000"),
+        "names": keys("SELECT lname FROM student ORDER BY random() LIMIT 1000"),
+    }
+    ctx["last_change"] = db.execute("SELECT coalesce(max(seq), 0) FROM changelog").fetchone()[0]
+    # کوچک‌ترین دانشکده تا هر کار زمان‌بندی کوتاه بماند
+    ctx["schedule_department"] = db.execute(
+        "SELECT department FROM course GROUP BY department ORDER BY count(*) LIMIT 1").fetchone()[0]
+    section = db.execute("SELECT section_id, cid FROM section ORDER BY section_id LIMIT 1").fetchone()
+    if section:
+        ctx["section"] = section[0]
+        # دانشجویانی که این درس و گروه دیگری ندارند و با هر درس چهار واحدی از سقف پیش‌فرض ۲۰ واحد نمی‌گذرند
+        ctx["registrants"] = keys(f"""
+            SELECT stid FROM student
+            WHERE stid NOT IN (SELECT stid FROM enrollment WHERE cid = '{section[1]}')
+            AND stid NOT IN (SELECT stid FROM registration)
+            AND stid NOT IN (SELECT enrollment.stid FROM enrollment JOIN course USING (cid)
+                             GROUP BY enrollment.stid HAVING SUM(course.credit) > 16)
+            ORDER BY random() LIMIT 1000""")
+    row = db.execute("SELECT * FROM student LIMIT 1").fetchone()
+    columns = [d[0] for d in db.execute("SELECT * FROM student LIMIT 1").description]
+    ctx["student_row"] = dict(zip(columns, row))
+    row = db.execute("SELECT * FROM course LIMIT 1").fetchone()
+    columns = [d[0] for d in db.execute("SELECT * FROM course LIMIT 1").description]
+    # بدون version تا PUTهای پیاپی با نسخه کهنه 409 نگیرند
+    ctx["course_row"] = {k: v for k, v in zip(columns, row) if k != "version"}
+    db.close()
+    return ctx
+
+
+def _valid_student(ctx, i: int) -> dict:
+    row = {k: v for k, v in ctx["student_row"].items()
+           if k in validation.RULES["student"] or k in ("courseids", "lids")}
+    row["stid"] = student_id(i % VALID_STUDENT_IDS)
+    return row
+
+
+def scenarios() -> list:
+    def pick(ctx, kind, i):
+        return ctx[kind][i % len(ctx[kind])]
+
+    def student_update(ctx, i):
+        # بدنه کامل باید از اعتبارسنجی بگذرد، پس ردیف‌های درج‌شده توسط bulk ویرایش می‌شوند
+        body = _valid_student(ctx, 50 + i % 50)
+        return f"/api/students/{body['stid']}", {"json": body}
+
+    def student_bulk(ctx, i):
+        # نیمه دوم بلوک معتبر تا با سناریوی ایجاد و حذف تداخل نکند
+        return "/api/students/bulk?mode=upsert", {
+            "json": [_valid_student(ctx, 50 + (i * 20 + j) % 50) for j in range(20)]}
+
+    def schedule_job(ctx, i):
+        return "/api/schedule/jobs", {"json": {
+            "department": ctx["schedule_department"], "time_limit": 0.5,
+            "rooms": [{"name": f"R{n}", "capacity": 200} for n in range(20)]}}
+
+    async def wait_for_job(client, response):
+        return await client.get(response.json()["url"], params={"wait": 30})
+
+    return [
+        Scenario("read_student", "GET",
+                 lambda ctx, i: (f"/api/students/{pick(ctx, 'students', i)}", {})),
+        Scenario("read_professor", "GET",
+                 lambda ctx, i: (f"/api/professors/{pick(ctx, 'professors', i)}", {})),
+        Scenario("read_course", "GET",
+                 lambda ctx, i: (f"/api/courses/{pick(ctx, 'courses', i)}", {})),
+        Scenario("batch_get_students", "POST", lambda ctx, i: (
+            "/api/students/batch-get", {"json": {"ids": ctx["students"][i % 10 * 100:][:100]}})),
+        Scenario("batch_get_courses", "POST", lambda ctx, i: (
+            "/api/courses/batch-get", {"json": {"ids": ctx["courses"][i % 10 * 100:][:100]}})),
+        Scenario("read_students_offset", "GET",
+                 lambda ctx, i: (f"/api/students/?offset={(i * 997) % 10000}&limit=100", {})),
+        Scenario("read_students_cursor", "GET",
+                 lambda ctx, i: ("/api/students/?after=&limit=100", {})),
+        Scenario("read_professors", "GET", lambda ctx, i: ("/api/professors/", {})),
+        Scenario("read_courses", "GET", lambda ctx, i: ("/api/courses/", {})),
+        Scenario("course_students", "GET",
+                 lambda ctx, i: (f"/api/courses/{pick(ctx, 'courses', i)}/students", {})),
+        Scenario("professor_students", "GET",
+                 lambda ctx, i: (f"/api/professors/{pick(ctx, 'professors', i)}/students", {}),
+                 weight=0.25),
+        Scenario("search", "GET",
+                 lambda ctx, i: ("/api/search", {"params": {"q": pick(ctx, "names", i)[:3]}})),
+        Scenario("export_courses", "GET",
+                 lambda ctx, i: ("/api/courses/export?format=ndjson", {}), weight=0.05),
+        Scenario("cache_stats", "GET", lambda ctx, i: ("/api/cache/stats", {})),
+        Scenario("stats", "GET", lambda ctx, i: ("/api/stats", {})),
+        # از نزدیکی انتهای دفتر تغییرات، همان‌طور که مصرف‌کننده‌ای که عقب نمانده می‌خواند
+        Scenario("read_changes", "GET", lambda ctx, i: (
+            "/api/changes", {"params": {"since": max(0, ctx["last_change"] - i % 100), "limit": 100}})),
+        Scenario("bulk_students", "POST", student_bulk, weight=0.25),
+        Scenario("update_student", "PUT", student_update),
+        Scenario("update_course", "PUT", lambda ctx, i: (
+            f"/api/courses/{ctx['course_row']['cid']}",
+            {"json": dict(ctx["course_row"], credit=1 + i % 4)})),
+        Scenario("patch_course", "PATCH", lambda ctx, i: (
+            f"/api/courses/{pick(ctx, 'courses', i)}", {"json": {"credit": 1 + i % 4}})),
+        Scenario("create_student", "POST", lambda ctx, i: (
+            "/api/students/", {"json": _valid_student(ctx, i % 50)}), cap=50),
+        Scenario("delete_student", "DELETE", lambda ctx, i: (
+            f"/api/students/{student_id(i % 50)}", {}), cap=50),
+        # همه روی یک گروه؛ پس از پر شدن ظرفیت بقیه به صف انتظار می‌روند و حذف بعدی آن را خالی می‌کند
+        Scenario("enroll_popular_section", "POST", lambda ctx, i: (
+            f"/api/sections/{ctx['section']}/enroll", {"json": {"stid": pick(ctx, "registrants", i)}}),
+            cap=1000),
+        Scenario("drop_popular_section", "POST", lambda ctx, i: (
+            f"/api/sections/{ctx['section']}/drop", {"json": {"stid": pick(ctx, "registrants", i)}}),
+            cap=1000),
+        # حل‌کننده تا time_limit کار می‌کند، پس با چند درخواست سنجیده می‌شود
+        Scenario("schedule_job", "POST", schedule_job, cap=10, follow=wait_for_job),
+    ]
+
+
+# اجرای بار
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _run_scenario(client, scenario, ctx, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    total = max(1, int(requests * scenario.weight))
+    counter = iter(range(min(total, scenario.cap or total)))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            url, kwargs = scenario.build(ctx, i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, url, **kwargs)
+                if scenario.follow and response.status_code < 400:
+                    response = await scenario.follow(client, response)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "endpoint": scenario.name,
+        "method": scenario.method,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def _sweep(client, args, ctx) -> list:
+    selected = [s for s in scenarios() if not args.only or s.name in args.only]
+    results = []
+    for concurrency in args.concurrency:
+        for scenario in selected:
+            result = await _run_scenario(client, scenario, ctx, args.requests, concurrency)
+            results.append(result)
+            print(f"{result['endpoint']:<22} c={concurrency:<4} {result['throughput_rps']:>9} rps "
+                  f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}",
+                  file=sys.stderr)
+    return results
+
+
+def _report(args, mode: str, results: list, **meta):
+    report = {"meta": {"mode": mode, "db": args.db, "requests": args.requests,
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta},
+              "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def run_asgi(args):
+    os.environ["UNI_DB"] = args.db
+    import Uni
+    ctx = _sample_keys(args.db)
+
+    async def main():
+        async with Uni.app.router.lifespan_context(Uni.app):
+            transport = httpx.ASGITransport(app=Uni.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await _sweep(client, args, ctx)
+    _report(args, "asgi", asyncio.run(main()))
+
+
+def _http_results(args, ctx, workers: int) -> tuple:
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        # serve.py اجرا می‌شود تا مهاجرت یک‌باره و تنظیمات چندکارگری هم سنجیده شوند
+        server = subprocess.Popen(
+            [sys.executable, "serve.py"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, "UNI_DB": os.path.abspath(args.db), "UNI_HOST": "127.0.0.1",
+                 "UNI_PORT": str(args.port), "UNI_WORKERS": str(workers)})
+        _wait_for(url)
+
+    async def main():
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            return await _sweep(client, args, ctx)
+    try:
+        return url, asyncio.run(main())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def run_http(args):
+    url, results = _http_results(args, _sample_keys(args.db), args.workers)
+    _report(args, "http", results, url=url, workers=args.workers)
+
+
+def run_scale(args):
+    """Repeat the HTTP sweep for each worker count and summarize the scaling curve."""
+    ctx = _sample_keys(args.db)
+    results, curve = [], []
+    for workers in args.workers:
+        _, run = _http_results(args, ctx, workers)
+        for result in run:
+            result["workers"] = workers
+        results.extend(run)
+        for concurrency in args.concurrency:
+            level = [r for r in run if r["concurrency"] == concurrency]
+            requests = sum(r["requests"] for r in level)
+            seconds = sum(r["requests"] / r["throughput_rps"] for r in level if r["throughput_rps"])
+            curve.append({"workers": workers, "concurrency": concurrency,
+                          "throughput_rps": round(requests / seconds, 1) if seconds else 0.0,
+                          "errors": sum(r["errors"] for r in level)})
+    print(f"{'workers':>7} {'c':>5} {'rps':>10} {'errors':>7}", file=sys.stderr)
+    for point in curve:
+        print(f"{point['workers']:>7} {point['concurrency']:>5} {point['throughput_rps']:>10}"
+              f" {point['errors']:>7}", file=sys.stderr)
+    _report(args, "scale", results, cpus=os.cpu_count(), curve=curve)
+
+
+def _wait_for(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/api/cache/stats", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"server at {url} did not start")
+
+
+def compare(args):
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            return {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    baseline, current = load(args.baseline), load(args.current)
+    regressions = 0
+    print(f"{'endpoint':<22} {'c':>4} {'rps':>18} {'p99 ms':>20}")
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        rps_change = (new["throughput_rps"] - old["throughput_rps"]) / (old["throughput_rps"] or 1)
+        p99_change = (new["p99_ms"] - old["p99_ms"]) / (old["p99_ms"] or 1)
+        flag = ""
+        if rps_change < -args.threshold or p99_change > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{key[0]:<22} {key[1]:>4} {old['throughput_rps']:>8} -> {new['throughput_rps']:<8}"
+              f" {old['p99_ms']:>9} -> {new['p99_ms']:<9}{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+def _levels(value: str) -> list:
+    return [int(level) for level in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("seed", help="build a synthetic database")
+    p.add_argument("--db", default="bench.db")
+    p.add_argument("--students", type=int, default=10000)
+    p.add_argument("--professors", type=int)
+    p.add_argument("--courses", type=int)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=seed)
+
+    for name, func in (("asgi", run_asgi), ("http", run_http), ("scale", run_scale)):
+        p = commands.add_parser(name, help=f"load-test through the {name} path")
+        p.add_argument("--db", default="bench.db")
+        p.add_argument("--requests", type=int, default=200,
+                       help="requests per endpoint and concurrency level")
+        p.add_argument("--concurrency", type=_levels, default=[1, 16, 64])
+        p.add_argument("--only", type=lambda v: v.split(","),
+                       help="comma-separated scenario names")
+        p.add_argument("-o", "--output")
+        if name != "asgi":
+            p.add_argument("--url", help="target an already running server")
+            p.add_argument("--port", type=int, default=8765)
+        if name == "http":
+            p.add_argument("--workers", type=int, default=1)
+        if name == "scale":
+            p.add_argument("--workers", type=_levels, default=[1, 2, 4, 8])
+        p.set_defaults(func=func)
+
+    p = commands.add_parser("compare", help="diff two result files")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="relative change that counts as a regression")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
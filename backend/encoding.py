@@ -0,0 +1,154 @@
+"""JSON response class and negotiated response compression.
+
+``JSONResponse`` serializes with orjson when it is installed (falling back to
+the standard library) and always emits raw UTF-8, so Persian text is not
+``\\u``-escaped.  SQLModel instances are dumped directly instead of going
+through FastAPI's generic ``jsonable_encoder``.
+
+``CompressionMiddleware`` compresses responses above ``UNI_COMPRESS_MIN_SIZE``
+bytes with brotli or gzip, whichever the client accepts first from the
+``UNI_COMPRESSION`` list; streamed responses are compressed chunk by chunk.
+"""
+import os
+import json
+import zlib
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson اختیاری است
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # فشرده‌سازی brotli اختیاری است
+    brotli = None
+
+COMPRESSION = [name.strip() for name in os.environ.get("UNI_COMPRESSION", "br,gzip").split(",")
+               if name.strip() and (name.strip() != "br" or brotli is not None)]
+COMPRESS_MIN_SIZE = int(os.environ.get("UNI_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("UNI_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("UNI_BROTLI_QUALITY", "4"))
+
+# نوع‌هایی که فشرده کردن آن‌ها ارزش دارد
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/",
+                      "application/vnd.apache.arrow.stream")
+# رویدادهای SSE باید بی‌درنگ برسند و فشرده‌ساز آن‌ها را نگه می‌دارد
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class JSONResponse(_StarletteJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self._finish = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self._finish = self._compressor.flush
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def _negotiate(headers: Headers):
+    accepted = {}
+    for item in headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in COMPRESSION:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """Compress response bodies with the best encoding the client accepts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        encoding = _negotiate(Headers(scope=scope)) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                start["headers"] = headers.raw
+                content_type = headers.get("content-type", "")
+                if ("content-encoding" in headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or content_type.startswith(UNCOMPRESSED_TYPES)
+                        or (not more_body and len(body) < COMPRESS_MIN_SIZE)):
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # بدنه تغییر کرده، پس ETag قوی برای نسخه فشرده ضعیف می‌شود
+                    headers["etag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["content-length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
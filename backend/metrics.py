@@ -0,0 +1,226 @@
+"""Prometheus-style request and database metrics.
+
+A small in-process registry (counters, gauges and histograms) rendered in the
+Prometheus text exposition format, plus an ASGI middleware that records every
+HTTP request under its route template.  SQL statements executed while a
+request is being served are attributed to it through ``current_request``,
+which the engine's cursor events update via ``record_sql``.
+"""
+import time
+import threading
+from contextvars import ContextVar
+
+import anyio.to_thread
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), collect=None):
+        super().__init__(name, help, labels)
+        # تابعی که مقدار را هنگام خواندن محاسبه می‌کند (مثلاً صف threadpool)
+        self._collect = collect
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list:
+        if self._collect is not None:
+            for labels, value in self._collect():
+                self.set(*labels, value=value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, ([*counts], total, count))
+                           for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _threadpool_stats():
+    try:
+        stats = anyio.to_thread.current_default_thread_limiter().statistics()
+    except RuntimeError:  # بیرون از حلقه رویداد
+        return []
+    return [
+        (("busy",), stats.borrowed_tokens),
+        (("waiting",), stats.tasks_waiting),
+        (("limit",), stats.total_tokens),
+    ]
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "uni_http_requests_total", "HTTP requests by route, method and status code.",
+    ("route", "method", "status")))
+LATENCY = registry.register(Histogram(
+    "uni_http_request_duration_seconds", "HTTP request latency.", ("route", "method")))
+IN_FLIGHT = registry.register(Gauge(
+    "uni_http_requests_in_flight", "HTTP requests currently being served.", ("method",)))
+SQL_STATEMENTS = registry.register(Counter(
+    "uni_sql_statements_total", "SQL statements executed, by route.", ("route", "method")))
+SQL_PER_REQUEST = registry.register(Histogram(
+    "uni_sql_statements_per_request", "SQL statements executed per request.",
+    ("route", "method"), COUNT_BUCKETS))
+SQL_SECONDS = registry.register(Histogram(
+    "uni_sql_duration_seconds_per_request", "Time spent in SQL per request.", ("route", "method")))
+WRITE_BATCH_SIZE = registry.register(Histogram(
+    "uni_write_batch_size", "Writes committed per transaction by the write queue.", (), COUNT_BUCKETS))
+THREADPOOL = registry.register(Gauge(
+    "uni_threadpool_tokens", "Worker threadpool tokens in use, queued tasks and the limit.",
+    ("state",), collect=_threadpool_stats))
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+# آمار درخواست جاری؛ رویدادهای cursor موتور آن را به‌روز می‌کنند
+current_request: ContextVar[RequestStats] = ContextVar("current_request", default=None)
+
+
+def record_sql(seconds: float):
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += seconds
+
+
+class MetricsMiddleware:
+    """Record count, latency, status and SQL usage of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec(method)
+            current_request.reset(token)
+            # مسیر با الگوی route ثبت می‌شود تا شناسه‌ها برچسب جداگانه نسازند
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUESTS.inc(path, method, str(status))
+            LATENCY.observe(path, method, value=elapsed)
+            SQL_STATEMENTS.inc(path, method, amount=stats.statements)
+            SQL_PER_REQUEST.observe(path, method, value=stats.statements)
+            SQL_SECONDS.observe(path, method, value=stats.sql_seconds)
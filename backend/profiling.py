@@ -0,0 +1,185 @@
+"""Opt-in request profiling and slow-query log.
+
+Profiling is off unless ``UNI_PROFILE=1`` (every request) or
+``UNI_PROFILE_TOKEN`` is set, in which case a request carrying
+``X-Profile: <token>`` is profiled.  A profiled request runs its handler under
+cProfile and writes two files to ``UNI_PROFILE_DIR``: the raw ``.prof`` dump
+(for snakeviz / pstats) and a ``.txt`` report with the top functions and every
+SQL statement it executed, with timings and ``EXPLAIN QUERY PLAN``.  Only the
+newest ``UNI_PROFILE_KEEP`` reports are kept.
+
+Independently, ``UNI_SLOW_QUERY_MS`` turns on a rotating slow-query log in
+the same directory for statements above that many milliseconds.
+
+cProfile only sees the event-loop thread, and only one request is profiled
+at a time; concurrent requests are served unprofiled while one is running,
+although their frames can still show up in its profile.
+"""
+import io
+import os
+import hmac
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+import logging.handlers
+from contextvars import ContextVar
+
+import anyio.to_thread
+
+PROFILE_ALL = os.environ.get("UNI_PROFILE", "") == "1"
+PROFILE_TOKEN = os.environ.get("UNI_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("UNI_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("UNI_PROFILE_KEEP", "200"))
+SLOW_QUERY_MS = float(os.environ.get("UNI_SLOW_QUERY_MS", "0"))
+
+# تعداد توابعی که در گزارش متنی آورده می‌شوند
+REPORT_FUNCTIONS = 40
+
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class ProfileReport:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        # (میلی‌ثانیه، دستور، پارامترها، طرح اجرا)
+        self.statements = []
+
+
+# گزارش درخواستی که در حال پروفایل شدن است
+current_profile: ContextVar[ProfileReport] = ContextVar("current_profile", default=None)
+
+_slow_log = None
+
+
+def _slow_query_logger():
+    global _slow_log
+    if _slow_log is None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(PROFILE_DIR, "slow-queries.log"),
+            maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _slow_log = logging.getLogger("uni.slow_queries")
+        _slow_log.addHandler(handler)
+        _slow_log.setLevel(logging.INFO)
+        _slow_log.propagate = False
+    return _slow_log
+
+
+def explain(conn, statement: str, parameters, executemany: bool) -> list[str]:
+    """Return the ``EXPLAIN QUERY PLAN`` lines for a statement just executed on ``conn``."""
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return []
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def record_sql(conn, statement: str, parameters, executemany: bool, seconds: float):
+    """Called after every cursor execute; feeds the profile report and slow-query log."""
+    report = current_profile.get()
+    slow = SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS
+    if report is None and not slow:
+        return
+    plan = explain(conn, statement, parameters, executemany)
+    if report is not None:
+        report.statements.append((seconds * 1000, statement, parameters, plan))
+    if slow:
+        _slow_query_logger().info(
+            "%.1f ms\n%s\nparams: %r\nplan:\n  %s\n",
+            seconds * 1000, statement.strip(), parameters, "\n  ".join(plan) or "-")
+
+
+def _write_report(name: str, profile: cProfile.Profile, report: ProfileReport,
+                  method: str, path: str, status: int, elapsed: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    profile.dump_stats(base + ".prof")
+
+    out = io.StringIO()
+    out.write(f"{method} {path} -> {status} in {elapsed * 1000:.1f} ms\n")
+    sql_ms = sum(s[0] for s in report.statements)
+    out.write(f"{len(report.statements)} SQL statements, {sql_ms:.1f} ms\n\n")
+    for ms, statement, parameters, plan in report.statements:
+        out.write(f"-- {ms:.2f} ms  params: {parameters!r}\n{statement.strip()}\n")
+        for line in plan:
+            out.write(f"   plan: {line}\n")
+        out.write("\n")
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+
+    # نگه‌داشتن تنها جدیدترین گزارش‌ها
+    reports = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".txt")),
+        key=lambda entry: entry.stat().st_mtime)
+    for entry in reports[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for suffix in (".txt", ".prof"):
+            try:
+                os.remove(entry.path[:-4] + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """Profile requests selected by ``UNI_PROFILE`` or the ``X-Profile`` header."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_ALL:
+            return True
+        if not PROFILE_TOKEN:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or self._lock.locked():
+            await self.app(scope, receive, send)
+            return
+        async with self._lock:
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope, receive, send):
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.monotonic_ns() % 10**9:09d}"
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-profile-id", name.encode())]
+            await send(message)
+
+        report = ProfileReport()
+        token = current_profile.set(report)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            current_profile.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope["path"]
+            await anyio.to_thread.run_sync(
+                _write_report, name, profile, report, scope["method"], path, status, elapsed)
@@ -0,0 +1,390 @@
+"""Timetable and exam-schedule solver.
+
+The input is plain data: courses, who teaches them, who takes them, rooms
+and the weekly grid.  The module has no database or web dependencies.
+``Uni.py`` loads the data and runs :func:`solve` in a worker thread as a job.
+
+Both problems are graph colouring.  A course meeting (or an exam) is a node
+and a time slot is a colour.  Two nodes are joined when they share a
+professor, share at least ``min_shared`` students, or are two meetings of
+the same course.  Adjacency is kept as Python ints used as bitsets, so
+"does this slot already hold a neighbour" is a single AND.
+
+Nodes are coloured in DSatur order: the node with the most distinct
+neighbour colours goes first, ties broken by degree.  Each node takes its
+cheapest feasible slot by soft cost, with a best-fit room.  A node that has
+no feasible slot gets one repair attempt: a single blocking neighbour is
+moved elsewhere.  Hill climbing then moves nodes to cheaper slots until
+nothing improves or the time limit is reached.
+"""
+import time
+import heapq
+import bisect
+
+# تعداد جلسه‌های هفتگی هر درس بر اساس تعداد واحد
+MEETINGS_BY_CREDIT = {1: 1, 2: 1, 3: 2, 4: 2}
+
+# وزن‌های هزینه نرم
+AVOID_PENALTY = 10      # جلسه در ساعتی که استاد نخواسته است
+SAME_DAY_PENALTY = 4    # دو جلسه یک درس در یک روز
+SHARED_PENALTY = 1      # به ازای هر دانشجوی مشترک دو درس هم‌زمان (زیر آستانه) یا دو امتحان هم‌روز
+
+# هر چند گره یک بار پیشرفت گزارش می‌شود
+PROGRESS_EVERY = 25
+
+
+def _bits(mask: int):
+    """Yield the indices of the set bits of ``mask``."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def shared_counts(enrollments: dict, index: dict) -> dict:
+    """Count the common students of each course pair: ``{(i, j): n}`` with ``i < j``."""
+    by_student = {}
+    for cid, students in enrollments.items():
+        i = index.get(cid)
+        if i is not None:
+            for stid in students:
+                by_student.setdefault(stid, []).append(i)
+    counts = {}
+    for courses in by_student.values():
+        courses.sort()
+        for a, i in enumerate(courses):
+            for j in courses[a + 1:]:
+                counts[i, j] = counts.get((i, j), 0) + 1
+    return counts
+
+
+class _Rooms:
+    """Discrete rooms: one node per room per slot, smallest room that fits."""
+
+    def __init__(self, rooms: list, n_colors: int):
+        ordered = sorted((room["capacity"], room["name"]) for room in rooms)
+        self.free = [list(ordered) for _ in range(n_colors)]
+
+    def fits(self, color: int, size: int) -> bool:
+        return bool(self.free[color]) and self.free[color][-1][0] >= size
+
+    def take(self, color: int, size: int):
+        free = self.free[color]
+        return free.pop(bisect.bisect_left(free, (size, "")))
+
+    def give(self, color: int, room):
+        bisect.insort(self.free[color], room)
+
+
+class _Seats:
+    """Pooled seats: a slot holds any set of nodes whose sizes fit the total capacity."""
+
+    def __init__(self, rooms: list, n_colors: int):
+        self.free = [sum(room["capacity"] for room in rooms)] * n_colors
+
+    def fits(self, color: int, size: int) -> bool:
+        return self.free[color] >= size
+
+    def take(self, color: int, size: int):
+        self.free[color] -= size
+        return size
+
+    def give(self, color: int, room):
+        self.free[color] += room
+
+
+class _Coloring:
+    def __init__(self, adjacency: list, sizes: list, n_colors: int, pool, color_costs):
+        self.adjacency = adjacency
+        self.sizes = sizes
+        self.n_colors = n_colors
+        self.pool = pool
+        # color_costs(v, color) هزینه نرم گره v در هر رنگ را با رنگ‌های فعلی بقیه برمی‌گرداند
+        self.color_costs = color_costs
+        self.members = [0] * n_colors
+        self.color = [None] * len(adjacency)
+        self.room = [None] * len(adjacency)
+
+    def feasible(self, v: int, c: int) -> bool:
+        return not self.adjacency[v] & self.members[c] and self.pool.fits(c, self.sizes[v])
+
+    def place(self, v: int, c: int):
+        self.members[c] |= 1 << v
+        self.color[v] = c
+        self.room[v] = self.pool.take(c, self.sizes[v])
+
+    def remove(self, v: int):
+        c = self.color[v]
+        self.members[c] &= ~(1 << v)
+        self.pool.give(c, self.room[v])
+        self.color[v] = self.room[v] = None
+
+    def best_color(self, v: int, exclude: int = None):
+        costs = self.color_costs(v, self.color)
+        best = None
+        for c in range(self.n_colors):
+            if c != exclude and self.feasible(v, c) and (best is None or costs[c] < costs[best]):
+                best = c
+        return best
+
+    def repair(self, v: int) -> bool:
+        """Place ``v`` by moving the only neighbour that blocks some slot."""
+        for c in range(self.n_colors):
+            blockers = self.adjacency[v] & self.members[c]
+            if not blockers or blockers & (blockers - 1):
+                continue
+            w = blockers.bit_length() - 1
+            self.remove(w)
+            if self.feasible(v, c):
+                other = self.best_color(w, exclude=c)
+                if other is not None:
+                    self.place(w, other)
+                    self.place(v, c)
+                    return True
+            self.place(w, c)
+        return False
+
+    def dsatur(self, progress=None) -> list[int]:
+        """Colour every node; return the nodes left without a feasible slot."""
+        n = len(self.adjacency)
+        degree = [adj.bit_count() for adj in self.adjacency]
+        saturation = [0] * n
+        heap = [(0, -degree[v], v) for v in range(n)]
+        heapq.heapify(heap)
+        unplaced = {}
+        done = 0
+        while heap:
+            sat, _, v = heapq.heappop(heap)
+            if self.color[v] is not None or v in unplaced or -sat != saturation[v].bit_count():
+                continue
+            c = self.best_color(v)
+            if c is not None:
+                self.place(v, c)
+            elif not self.repair(v):
+                unplaced[v] = None
+                continue
+            for u in _bits(self.adjacency[v]):
+                if self.color[u] is None and not saturation[u] >> self.color[v] & 1:
+                    saturation[u] |= 1 << self.color[v]
+                    heapq.heappush(heap, (-saturation[u].bit_count(), -degree[u], u))
+            done += 1
+            if progress and done % PROGRESS_EVERY == 0:
+                progress(done / n)
+        return list(unplaced)
+
+    def improve(self, deadline: float) -> int:
+        """Move nodes to cheaper feasible slots until none helps or ``deadline``; return moves."""
+        moves = 0
+        improved = True
+        while improved and time.monotonic() < deadline:
+            improved = False
+            for v, c in enumerate(self.color):
+                if c is None:
+                    continue
+                costs = self.color_costs(v, self.color)
+                self.remove(v)
+                best = self.best_color(v)
+                if best is not None and costs[best] < costs[c]:
+                    self.place(v, best)
+                    moves += 1
+                    improved = True
+                else:
+                    self.place(v, c)
+                if time.monotonic() >= deadline:
+                    break
+        return moves
+
+
+def _course_graph(courses: list, teachers: dict, counts: dict, min_shared: int):
+    """Hard course-level adjacency bitsets and soft ``[(j, shared)]`` lists."""
+    index = {course["cid"]: i for i, course in enumerate(courses)}
+    adjacency = [0] * len(courses)
+    soft = [[] for _ in courses]
+    by_professor = {}
+    for cid, lids in teachers.items():
+        if cid in index:
+            for lid in lids:
+                by_professor[lid] = by_professor.get(lid, 0) | 1 << index[cid]
+    for mask in by_professor.values():
+        for i in _bits(mask):
+            adjacency[i] |= mask & ~(1 << i)
+    for (i, j), shared in counts.items():
+        if shared >= min_shared:
+            adjacency[i] |= 1 << j
+            adjacency[j] |= 1 << i
+        else:
+            soft[i].append((j, shared))
+            soft[j].append((i, shared))
+    return adjacency, soft
+
+
+def solve_timetable(courses: list, teachers: dict, enrollments: dict, rooms: list,
+                    days: list, periods: list, avoid: dict = None, min_shared: int = 1,
+                    deadline: float = None, progress=None, counts: dict = None) -> dict:
+    """Assign every weekly meeting of ``courses`` a slot and a room.
+
+    ``courses`` are ``{"cid", "credit"}`` dicts, ``teachers`` and
+    ``enrollments`` map a course id to its professor and student ids, and
+    ``avoid`` maps a professor id to slot labels such as ``"0 08:00-09:30"``.
+    Each course gets a ``schedule`` string in the format used by sections.
+    """
+    index = {course["cid"]: i for i, course in enumerate(courses)}
+    if counts is None:
+        counts = shared_counts(enrollments, index)
+    course_adj, soft = _course_graph(courses, teachers, counts, min_shared)
+    slots = [(day, period) for day in days for period in periods]
+    labels = [f"{day} {period}" for day, period in slots]
+    slot_index = {label: c for c, label in enumerate(labels)}
+
+    # گره‌ها: جلسه‌های هر درس
+    owner, course_nodes = [], []
+    for i, course in enumerate(courses):
+        meetings = MEETINGS_BY_CREDIT.get(course.get("credit"), 1)
+        course_nodes.append(list(range(len(owner), len(owner) + meetings)))
+        owner += [i] * meetings
+    node_mask = [sum(1 << v for v in nodes) for nodes in course_nodes]
+    adjacency = []
+    for v, i in enumerate(owner):
+        mask = node_mask[i] & ~(1 << v)
+        for j in _bits(course_adj[i]):
+            mask |= node_mask[j]
+        adjacency.append(mask)
+    sizes = [len(enrollments.get(courses[i]["cid"], ())) for i in owner]
+
+    avoided = []
+    for course in courses:
+        penalty = [0] * len(slots)
+        for lid in teachers.get(course["cid"], ()):
+            for label in (avoid or {}).get(lid, ()):
+                if label in slot_index:
+                    penalty[slot_index[label]] += AVOID_PENALTY
+        avoided.append(penalty)
+
+    def color_costs(v, color):
+        i = owner[v]
+        costs = list(avoided[i])
+        for u in course_nodes[i]:
+            if u != v and color[u] is not None:
+                day = slots[color[u]][0]
+                for c, (other_day, _) in enumerate(slots):
+                    if other_day == day:
+                        costs[c] += SAME_DAY_PENALTY
+        for j, shared in soft[i]:
+            for u in course_nodes[j]:
+                if color[u] is not None:
+                    costs[color[u]] += shared * SHARED_PENALTY
+        return costs
+
+    coloring = _Coloring(adjacency, sizes, len(slots), _Rooms(rooms, len(slots)), color_costs)
+    unplaced = coloring.dsatur(progress and (lambda f: progress("timetable", f)))
+    if progress:
+        progress("timetable", 1.0)
+    moves = coloring.improve(deadline or time.monotonic() + 1)
+
+    result, cost = [], {"avoided_slots": 0, "same_day_meetings": 0, "shared_students": 0}
+    for i, course in enumerate(courses):
+        placed = sorted((slots[coloring.color[v]], coloring.room[v][1])
+                        for v in course_nodes[i] if coloring.color[v] is not None)
+        result.append({
+            "cid": course["cid"],
+            "schedule": ", ".join(f"{day} {period}" for (day, period), _ in placed),
+            "meetings": [{"day": day, "period": period, "room": room}
+                         for (day, period), room in placed],
+            "lids": list(teachers.get(course["cid"], ())),
+            "students": len(enrollments.get(course["cid"], ())),
+        })
+        for v in course_nodes[i]:
+            c = coloring.color[v]
+            if c is None:
+                continue
+            cost["avoided_slots"] += avoided[i][c] // AVOID_PENALTY
+            cost["same_day_meetings"] += sum(
+                1 for u in course_nodes[i] if u > v and coloring.color[u] is not None
+                and slots[coloring.color[u]][0] == slots[c][0])
+            cost["shared_students"] += sum(
+                shared for j, shared in soft[i] if j > i
+                for u in course_nodes[j] if coloring.color[u] == c)
+    return {
+        "courses": result,
+        "unscheduled": [{"cid": courses[owner[v]]["cid"], "students": sizes[v],
+                         "reason": "no room large enough" if not any(
+                             room["capacity"] >= sizes[v] for room in rooms) else "no conflict-free slot"}
+                        for v in unplaced],
+        "cost": cost,
+        "graph": {"nodes": len(adjacency), "edges": sum(a.bit_count() for a in adjacency) // 2,
+                  "slots": len(slots), "improvement_moves": moves},
+    }
+
+
+def solve_exams(courses: list, enrollments: dict, rooms: list, exam_days: int, exam_times: list,
+                deadline: float = None, progress=None, counts: dict = None) -> dict:
+    """Give every course an exam slot so that no student sits two exams at once.
+
+    Seats are pooled across ``rooms`` per slot.  Exams that share students
+    on the same day cost ``SHARED_PENALTY`` per shared student.
+    """
+    index = {course["cid"]: i for i, course in enumerate(courses)}
+    if counts is None:
+        counts = shared_counts(enrollments, index)
+    adjacency = [0] * len(courses)
+    shared_with = [[] for _ in courses]
+    for (i, j), shared in counts.items():
+        adjacency[i] |= 1 << j
+        adjacency[j] |= 1 << i
+        shared_with[i].append((j, shared))
+        shared_with[j].append((i, shared))
+    slots = [(day, at) for day in range(1, exam_days + 1) for at in exam_times]
+    sizes = [len(enrollments.get(course["cid"], ())) for course in courses]
+
+    def color_costs(v, color):
+        costs = [0] * len(slots)
+        for u, shared in shared_with[v]:
+            if color[u] is not None:
+                day = slots[color[u]][0]
+                for c, (other_day, _) in enumerate(slots):
+                    if other_day == day:
+                        costs[c] += shared * SHARED_PENALTY
+        return costs
+
+    coloring = _Coloring(adjacency, sizes, len(slots), _Seats(rooms, len(slots)), color_costs)
+    unplaced = coloring.dsatur(progress and (lambda f: progress("exams", f)))
+    if progress:
+        progress("exams", 1.0)
+    moves = coloring.improve(deadline or time.monotonic() + 1)
+
+    same_day = sum(shared for (i, j), shared in counts.items()
+                   if coloring.color[i] is not None and coloring.color[j] is not None
+                   and slots[coloring.color[i]][0] == slots[coloring.color[j]][0])
+    return {
+        "exams": [{"cid": course["cid"], "day": slots[coloring.color[i]][0],
+                   "time": slots[coloring.color[i]][1], "students": sizes[i]}
+                  for i, course in enumerate(courses) if coloring.color[i] is not None],
+        "unscheduled": [{"cid": courses[v]["cid"], "students": sizes[v]} for v in unplaced],
+        "cost": {"same_day_shared_students": same_day},
+        "graph": {"nodes": len(adjacency), "edges": sum(a.bit_count() for a in adjacency) // 2,
+                  "slots": len(slots), "improvement_moves": moves},
+    }
+
+
+def solve(courses: list, teachers: dict, enrollments: dict, rooms: list, days: list, periods: list,
+          exam_days: int, exam_times: list, avoid: dict = None, min_shared: int = 1,
+          time_limit: float = 10.0, progress=None) -> dict:
+    """Build the weekly timetable and the exam schedule for the same courses.
+
+    ``progress(phase, fraction)`` is called from the solving thread as work
+    advances.  Two thirds of ``time_limit`` is spent improving the
+    timetable and the rest on the exams; the greedy passes always run to
+    completion.
+    """
+    started = time.monotonic()
+    if progress:
+        progress("graph", 0.0)
+    index = {course["cid"]: i for i, course in enumerate(courses)}
+    counts = shared_counts(enrollments, index)
+    timetable = solve_timetable(
+        courses, teachers, enrollments, rooms, days, periods, avoid, min_shared,
+        started + time_limit * 2 / 3, progress, counts)
+    exams = solve_exams(courses, enrollments, rooms, exam_days, exam_times,
+                        started + time_limit, progress, counts)
+    return {"timetable": timetable, "exams": exams,
+            "seconds": round(time.monotonic() - started, 3)}
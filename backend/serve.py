@@ -0,0 +1,43 @@
+"""Start the API with one or more uvicorn worker processes.
+
+Usage::
+
+    UNI_WORKERS=4 python serve.py
+
+Migrations run once here, before any worker starts, and the workers skip
+them (``UNI_SKIP_MIGRATIONS``).  All workers share one SQLite file in WAL
+mode: readers never block, writers queue on the write lock for up to
+``UNI_SQLITE_BUSY_TIMEOUT`` ms and the write handlers retry with backoff if
+SQLite still reports busy.  The in-process entity cache cannot see writes
+made by other workers, so it is turned off for more than one worker unless
+``UNI_CACHE_SIZE`` is set explicitly.  See SCALING.md for measured throughput.
+"""
+import os
+import asyncio
+import logging
+
+import uvicorn
+
+WORKERS = int(os.environ.get("UNI_WORKERS", "1"))
+HOST = os.environ.get("UNI_HOST", "0.0.0.0")
+PORT = int(os.environ.get("UNI_PORT", "8000"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def main():
+    if WORKERS > 1:
+        os.environ.setdefault("UNI_CACHE_SIZE", "0")
+    if os.environ.get("UNI_SQLITE_JOURNAL_MODE", "WAL").upper() != "WAL" and WORKERS > 1:
+        logger.warning("Running %d workers without WAL; readers will block on writers", WORKERS)
+
+    import Uni
+    asyncio.run(Uni.create_db_and_tables())
+    asyncio.run(Uni.engine.dispose())
+
+    os.environ["UNI_SKIP_MIGRATIONS"] = "1"
+    uvicorn.run("Uni:app", host=HOST, port=PORT, workers=WORKERS)
+
+
+if __name__ == "__main__":
+    main()
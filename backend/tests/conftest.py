@@ -0,0 +1,69 @@
+"""Shared fixtures: a throwaway database per test and an in-process client for the API."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+import Uni
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Point the app at a fresh SQLite file for this test."""
+    engine = Uni._create_engine(tmp_path / "test.db")
+    monkeypatch.setattr(Uni, "engine", engine)
+    # ردیف‌های کش‌شده آزمون قبلی از پایگاه داده دیگری آمده‌اند
+    monkeypatch.setattr(Uni, "entity_cache", Uni.EntityCache(Uni.ENTITY_CACHE_SIZE, Uni.ENTITY_CACHE_TTL))
+    return engine
+
+
+@pytest.fixture
+async def client(engine):
+    """An ``httpx.AsyncClient`` wired to the app, with its lifespan running."""
+    async with Uni.app.router.lifespan_context(Uni.app):
+        transport = httpx.ASGITransport(app=Uni.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+
+
+def national_id(n: int) -> str:
+    """A valid, distinct national id for every ``n``."""
+    digits = f"{100000000 + n:09d}"
+    s = sum(int(d) * (10 - i) for i, d in enumerate(digits)) % 11
+    return digits + str(s if s < 2 else 11 - s)
+
+
+def student(n: int, **fields) -> dict:
+    """A valid student body; ``n`` (0-99) picks the student id and national id."""
+    body = {"stid": f"403114150{n:02d}", "fname": "علی", "lname": "رضایی", "father": "حسن",
+            "birth": "1/1/1380", "ids_number": "123456", "ids_letter": "ب", "ids_code": "12",
+            "borncity": "تهران", "address": "تهران", "postalcode": "1234567890",
+            "cphone": "09121234567", "hphone": "02112345678", "department": "فنی مهندسی",
+            "married": "مجرد", "nid": national_id(n), "major": "مهندسی کامپیوتر",
+            "courseids": "", "lids": ""}
+    body.update(fields)
+    return body
+
+
+def course(cid: str, **fields) -> dict:
+    body = {"cid": cid, "course_name": "ریاضی", "credit": 3, "department": "اقتصاد"}
+    body.update(fields)
+    return body
+
+
+def professor(n: int, **fields) -> dict:
+    """A valid professor body; ``n`` picks the professor id and national id."""
+    body = {"lid": f"{100000 + n}", "fname": "مریم", "lname": "کریمی", "nation_id": national_id(500 + n),
+            "department": "فنی مهندسی", "major": "مهندسی برق", "birth_date": "1/1/1350",
+            "born_city": "تهران", "address": "تهران", "postal_code": "1234567890",
+            "cphone": "09121234567", "hphone": "02112345678", "course_ids": ""}
+    body.update(fields)
+    return body
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import Uni
+from conftest import course, professor
+
+pytestmark = pytest.mark.anyio
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+async def _course_count(client) -> int:
+    r = await client.get("/api/courses/", params={"limit": 1, "count": "true"})
+    return int(r.headers["x-total-count"])
+
+
+async def test_invalid_line_after_committed_batch_is_a_row_error(client):
+    good = [json.dumps(course(str(10000 + n))) for n in range(Uni.BULK_BATCH_SIZE + 200)]
+    lines = good + ["{not json", json.dumps(course("19999"))]
+
+    r = await client.post("/api/courses/bulk", content="\n".join(lines).encode(), headers=NDJSON)
+
+    assert r.status_code == 200
+    summary = r.json()
+    assert (summary["inserted"], summary["failed"]) == (len(good) + 1, 1)
+    assert summary["errors"] == [{"index": len(good), "detail": f"Invalid JSON on line {len(good) + 1}"}]
+    assert await _course_count(client) == len(good) + 1
+
+
+async def test_invalid_json_array_body_is_rejected_before_writing(client):
+    r = await client.post("/api/courses/bulk", content=b"[{", headers={"Content-Type": "application/json"})
+    assert r.status_code == 400
+    assert await _course_count(client) == 0
+
+
+async def test_duplicate_nation_id_is_a_conflict_everywhere(client):
+    taken = professor(1)["nation_id"]
+    assert (await client.post("/api/professors/", json=professor(1))).status_code == 200
+
+    r = await client.post("/api/professors/", json=professor(2, nation_id=taken))
+    assert r.status_code == 409
+    assert (await client.post("/api/professors/", json=professor(2))).status_code == 200
+    r = await client.patch("/api/professors/100002", json={"nation_id": taken})
+    assert r.status_code == 409
+
+    r = await client.post("/api/professors/bulk", json=[professor(3, nation_id=taken)])
+    assert (r.status_code, r.json()["inserted"], r.json()["failed"]) == (200, 0, 1)
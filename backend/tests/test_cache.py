@@ -0,0 +1,84 @@
+import pytest
+
+import Uni
+from conftest import course, student
+
+pytestmark = pytest.mark.anyio
+
+
+async def _read(client, url: str) -> tuple:
+    """Read ``url`` twice so the second reply comes from the entity cache."""
+    await client.get(url)
+    r = await client.get(url)
+    assert r.status_code == 200
+    return r.json(), r.headers["etag"]
+
+
+async def _assert_fresh(client, url: str, etag: str) -> dict:
+    """The old validator no longer matches and the body is the current row."""
+    r = await client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    return r.json()
+
+
+async def test_put_patch_and_delete_are_seen_by_cached_reads(client):
+    await client.post("/api/courses/", json=course("70001"))
+    url = "/api/courses/70001"
+
+    _, etag = await _read(client, url)
+    assert Uni.entity_cache.hits >= 1
+    await client.put(url, json=course("70001", credit=2))
+    assert (await _assert_fresh(client, url, etag))["credit"] == 2
+
+    _, etag = await _read(client, url)
+    await client.patch(url, json={"course_name": "فیزیک"})
+    assert (await _assert_fresh(client, url, etag))["course_name"] == "فیزیک"
+
+    _, etag = await _read(client, url)
+    await client.delete(url)
+    assert await _assert_fresh(client, url, etag) == {"message": "Course not found"}
+
+
+async def test_bulk_upsert_is_seen_by_cached_reads(client):
+    await client.post("/api/courses/", json=course("70001"))
+    url = "/api/courses/70001"
+
+    _, etag = await _read(client, url)
+    r = await client.post("/api/courses/bulk?mode=upsert", json=[course("70001", credit=1)])
+    assert r.json()["updated"] == 1
+    assert (await _assert_fresh(client, url, etag))["credit"] == 1
+
+    items = (await client.post("/api/courses/batch-get", json={"ids": ["70001"]})).json()["items"]
+    assert items[0]["credit"] == 1
+
+
+async def test_registration_paths_are_seen_by_cached_reads(client):
+    await client.post("/api/courses/", json=course("70001"))
+    for n in (1, 2):
+        await client.post("/api/students/", json=student(n))
+    section = {"section_id": "7000101", "cid": "70001", "capacity": 1, "schedule": "0 08:00-09:30"}
+    await client.post("/api/sections/", json=section)
+    first, second = (f"/api/students/{student(n)['stid']}" for n in (1, 2))
+
+    _, etag = await _read(client, first)
+    r = await client.post("/api/sections/7000101/enroll", json={"stid": student(1)["stid"]})
+    assert r.status_code == 200
+    assert "70001" in (await _assert_fresh(client, first, etag))["courseids"]
+
+    r = await client.post("/api/sections/7000101/enroll", json={"stid": student(2)["stid"]})
+    assert r.status_code == 202
+    _, first_etag = await _read(client, first)
+    waiting, second_etag = await _read(client, second)
+    assert "70001" not in waiting["courseids"]
+
+    # با رفتن نفر اول، نفر دوم از صف انتظار جای او را می‌گیرد
+    assert (await client.post("/api/sections/7000101/drop",
+                              json={"stid": student(1)["stid"]})).json()["promoted"] == [student(2)["stid"]]
+    assert "70001" not in (await _assert_fresh(client, first, first_etag))["courseids"]
+    assert "70001" in (await _assert_fresh(client, second, second_etag))["courseids"]
+
+    _, etag = await _read(client, second)
+    assert (await client.delete(second)).json() == {"message": "Student deleted"}
+    assert await _assert_fresh(client, second, etag) == {"message": "Student not found"}
+    assert (await client.get("/api/sections/7000101")).json()["enrolled"] == 0
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+import Uni
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+
+async def _changes(client, **params) -> dict:
+    r = await client.get("/api/changes", params=params)
+    assert r.status_code == 200
+    return r.json()
+
+
+async def test_change_appears_after_since_cursor(client):
+    await client.post("/api/courses/", json=course("23001"))
+    feed = await _changes(client, since=0, wait=5)
+    assert [(c["entity"], c["key"], c["op"]) for c in feed["changes"]] == [("course", "23001", "create")]
+    since = feed["next"]
+
+    # long-poll: درخواست پیش از نوشتن فرستاده می‌شود و با flush بعدی پاسخ می‌گیرد
+    waiting = asyncio.create_task(_changes(client, since=since, wait=5))
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+    await client.patch("/api/courses/23001", json={"credit": 2})
+    feed = await waiting
+    assert [(c["key"], c["op"], c["fields"]) for c in feed["changes"]] == [("23001", "update", ["credit"])]
+    assert feed["next"] > since
+
+    # چیزی بعد از آخرین cursor نیست
+    assert await _changes(client, since=feed["next"]) == {"changes": [], "next": feed["next"]}
+    assert (await _changes(client, since=0, entity="student"))["changes"] == []
+
+
+class _OpenRequest:
+    """The only part of a Request that the SSE generator uses; the client never disconnects."""
+
+    async def is_disconnected(self):
+        return False
+
+
+async def test_sse_stream_resumes_after_since(client):
+    await client.post("/api/courses/", json=course("23001"))
+    since = (await _changes(client, since=0, wait=5))["next"]
+
+    stream = Uni._stream_changes(_OpenRequest(), since, None)
+    try:
+        await client.delete("/api/courses/23001")
+        event = await asyncio.wait_for(anext(stream), timeout=5)
+    finally:
+        await stream.aclose()
+
+    head, data = event.split("\ndata: ")
+    assert head == f"id: {since + 1}\nevent: change"
+    assert json.loads(data)["op"] == "delete"
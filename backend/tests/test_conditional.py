@@ -0,0 +1,69 @@
+from email.utils import formatdate, parsedate_to_datetime
+
+import pytest
+
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+URL = "/api/courses/"
+
+
+@pytest.fixture
+async def courses(client):
+    r = await client.post("/api/courses/bulk", json=[course(str(60000 + n)) for n in range(50)])
+    assert r.json()["inserted"] == 50
+
+
+async def test_matching_weak_etag_answers_304(client, courses):
+    r = await client.get(URL)
+    etag = r.headers["etag"]
+    assert etag.startswith('W/"')
+
+    for header in (etag, etag.removeprefix("W/"), f'W/"other", {etag}', "*"):
+        r = await client.get(URL, headers={"If-None-Match": header})
+        assert r.status_code == 304
+        assert r.headers["etag"] == etag
+        assert r.content == b""
+
+    r = await client.get(URL, headers={"If-None-Match": 'W/"other"'})
+    assert r.status_code == 200
+
+
+async def test_compressed_reply_and_304_share_the_validator(client, courses):
+    r = await client.get(URL, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    plain = await client.get(URL, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == r.headers["etag"]
+
+    r304 = await client.get(URL, headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]})
+    assert (r304.status_code, r304.headers["etag"]) == (304, r.headers["etag"])
+
+
+async def test_if_modified_since(client, courses):
+    r = await client.get(URL)
+    modified = r.headers["last-modified"]
+
+    assert (await client.get(URL, headers={"If-Modified-Since": modified})).status_code == 304
+    earlier = formatdate(parsedate_to_datetime(modified).timestamp() - 60, usegmt=True)
+    assert (await client.get(URL, headers={"If-Modified-Since": earlier})).status_code == 200
+    assert (await client.get(URL, headers={"If-Modified-Since": "yesterday"})).status_code == 200
+    # If-None-Match بر If-Modified-Since مقدم است
+    r = await client.get(URL, headers={"If-Modified-Since": modified, "If-None-Match": 'W/"other"'})
+    assert r.status_code == 200
+
+
+async def test_write_changes_the_validator(client, courses):
+    etag = (await client.get(URL)).headers["etag"]
+    single = (await client.get(f"{URL}60001")).headers["etag"]
+    other = (await client.get(f"{URL}60002")).headers["etag"]
+
+    await client.patch(f"{URL}60001", json={"credit": 1})
+
+    r = await client.get(URL, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert (await client.get(f"{URL}60001", headers={"If-None-Match": single})).status_code == 200
+    # نسخه در سطح جدول است، پس رکوردهای دیگر همان جدول هم اعتبارسنج تازه می‌گیرند
+    assert (await client.get(f"{URL}60002", headers={"If-None-Match": other})).status_code == 200
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from Uni import _encode_cursor
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+DEPARTMENTS = ["اقتصاد", "علوم پایه", "فنی مهندسی"]
+
+
+@pytest.fixture
+async def courses(client):
+    for n in range(8):
+        cid = f"150{n:02d}"
+        r = await client.post("/api/courses/", json=course(cid, department=DEPARTMENTS[n % 3]))
+        assert r.status_code == 200
+
+
+@pytest.mark.parametrize("sort", [None, "department", "-department"])
+async def test_cursor_pages_match_offset_listing(client, courses, sort):
+    params = {"sort": sort} if sort else {}
+    expected = [row["cid"] for row in (await client.get(
+        "/api/courses/", params={**params, "limit": 100})).json()]
+    assert len(expected) == 8
+
+    seen, after = [], ""
+    while after is not None:
+        r = await client.get("/api/courses/", params={**params, "limit": 3, "after": after})
+        assert r.status_code == 200
+        seen += [row["cid"] for row in r.json()]
+        after = r.headers.get("x-next-cursor")
+
+    assert seen == expected
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    _encode_cursor("not json"),
+    _encode_cursor("5"),
+    _encode_cursor("null"),
+    _encode_cursor(json.dumps({"department": "اقتصاد"})),
+    _encode_cursor(json.dumps(["اقتصاد"])),
+    _encode_cursor(json.dumps(["اقتصاد", "15001", "15002"])),
+    _encode_cursor(json.dumps([["اقتصاد"], "15001"])),
+])
+async def test_malformed_sorted_cursor_is_rejected(client, cursor):
+    r = await client.get("/api/courses/", params={"sort": "department", "limit": 3, "after": cursor})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("cursor", ["%%%", "!!!", "MTUwMDE=", "MTUwMDE+", "_w"])
+async def test_malformed_key_cursor_is_rejected(client, courses, cursor):
+    r = await client.get("/api/courses/", params={"limit": 3, "after": cursor})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,28 @@
+import pytest
+
+import Uni
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_format_query_parameter_selects_the_export(client):
+    await client.post("/api/courses/", json=course("30001"))
+
+    r = await client.get("/api/courses/export", params={"format": "csv"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert r.text.splitlines()[1].startswith("30001,")
+
+    r = await client.get("/api/courses/export")
+    assert r.headers["content-type"] == "application/x-ndjson"
+
+    assert (await client.get("/api/courses/export", params={"format": "xml"})).status_code == 422
+
+
+@pytest.mark.skipif(Uni.pyarrow is None, reason="pyarrow is not installed")
+async def test_arrow_export(client):
+    await client.post("/api/courses/", json=course("30001"))
+    r = await client.get("/api/courses/export", params={"format": "arrow"})
+    table = Uni.pyarrow.ipc.open_stream(r.content).read_all()
+    assert table.column("cid").to_pylist() == ["30001"]
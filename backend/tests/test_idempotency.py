@@ -0,0 +1,43 @@
+import pytest
+
+import writequeue
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=[False, True], ids=["direct", "write-queue"])
+def engine(engine, request, monkeypatch):
+    """The per-test database, with writes committed directly or through the write queue."""
+    monkeypatch.setattr(writequeue, "ENABLED", request.param)
+    return engine
+
+
+async def test_replay_returns_stored_response(client):
+    headers = {"Idempotency-Key": "create-25001"}
+
+    first = await client.post("/api/courses/", json=course("25001"), headers=headers)
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+
+    again = await client.post("/api/courses/", json=course("25001"), headers=headers)
+    assert again.status_code == 200
+    assert again.headers["idempotent-replayed"] == "true"
+    assert again.json() == first.json()
+
+    patch = {"credit": 2, "version": 0}
+    headers = {"Idempotency-Key": "patch-25001"}
+    assert (await client.patch("/api/courses/25001", json=patch, headers=headers)).status_code == 200
+    # بدون کلید همین درخواست با نسخه کهنه 409 می‌گرفت؛ تکرار آن نباید دوباره بنویسد
+    replayed = await client.patch("/api/courses/25001", json=patch, headers=headers)
+    assert (replayed.status_code, replayed.json()["version"]) == (200, 1)
+    assert (await client.get("/api/courses/25001")).json()["version"] == 1
+
+
+async def test_key_reused_for_different_request_is_rejected(client):
+    headers = {"Idempotency-Key": "create-25002"}
+
+    assert (await client.post("/api/courses/", json=course("25002"), headers=headers)).status_code == 200
+    r = await client.post("/api/courses/", json=course("25003"), headers=headers)
+    assert r.status_code == 422
+    assert (await client.get("/api/courses/25003")).json() == {"message": "Course not found"}
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import select
+
+import Uni
+from conftest import course, professor, student
+
+pytestmark = pytest.mark.anyio
+
+
+async def _links(model) -> list:
+    async with Uni.engine.connect() as conn:
+        return [tuple(row) for row in (await conn.execute(select(model))).all()]
+
+
+async def test_deleting_course_removes_links_to_it(client):
+    await client.post("/api/courses/", json=course("40001"))
+    await client.post("/api/courses/", json=course("40002"))
+    await client.post("/api/professors/", json=professor(1, course_ids="40001, 40002"))
+    await client.post("/api/students/", json=student(1, courseids="40001,40002"))
+
+    assert (await client.delete("/api/courses/40001")).json() == {"message": "Course deleted"}
+
+    assert await _links(Uni.Enrollment) == [(student(1)["stid"], "40002")]
+    assert await _links(Uni.Teaching) == [("100001", "40002")]
+
+
+async def test_deleting_professor_removes_links_and_respects_sections(client):
+    await client.post("/api/courses/", json=course("40001"))
+    await client.post("/api/professors/", json=professor(1, course_ids="40001"))
+    await client.post("/api/students/", json=student(1, lids="100001"))
+    section = {"section_id": "4000101", "cid": "40001", "lid": "100001", "capacity": 5,
+               "schedule": "0 08:00-09:30"}
+    assert (await client.post("/api/sections/", json=section)).status_code == 200
+
+    assert (await client.delete("/api/professors/100001")).status_code == 409
+    assert await _links(Uni.StudentProfessor) == [(student(1)["stid"], "100001")]
+
+    assert (await client.delete("/api/sections/4000101")).status_code == 200
+    assert (await client.delete("/api/professors/100001")).json() == {"message": "Professor deleted"}
+    assert await _links(Uni.StudentProfessor) == []
+    assert await _links(Uni.Teaching) == []
+
+
+async def test_section_needs_an_existing_professor(client):
+    await client.post("/api/courses/", json=course("40001"))
+    section = {"section_id": "4000101", "cid": "40001", "lid": "100009", "capacity": 5,
+               "schedule": "0 08:00-09:30"}
+    assert (await client.post("/api/sections/", json=section)).status_code == 404
+
+    del section["lid"]
+    assert (await client.post("/api/sections/", json=section)).status_code == 200
+    r = await client.put("/api/sections/4000101", json={**section, "lid": "100009"})
+    assert r.status_code == 404
+    assert (await client.get("/api/sections/4000101")).json()["lid"] is None
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from conftest import course, student
+
+pytestmark = pytest.mark.anyio
+
+CAPACITY = 5
+STUDENTS = range(0, 20)
+
+
+async def test_concurrent_enroll_respects_capacity(client):
+    assert (await client.post("/api/courses/", json=course("21001"))).status_code == 200
+    for n in STUDENTS:
+        assert (await client.post("/api/students/", json=student(n))).status_code == 200
+    section = {"section_id": "2100101", "cid": "21001", "capacity": CAPACITY,
+               "schedule": "0 08:00-09:30"}
+    assert (await client.post("/api/sections/", json=section)).status_code == 200
+
+    responses = await asyncio.gather(*(
+        client.post("/api/sections/2100101/enroll", json={"stid": student(n)["stid"]})
+        for n in STUDENTS))
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200] * CAPACITY + [202] * (len(STUDENTS) - CAPACITY)
+    positions = sorted(r.json()["position"] for r in responses if r.status_code == 202)
+    assert positions == list(range(1, len(STUDENTS) - CAPACITY + 1))
+    assert (await client.get("/api/sections/2100101")).json()["enrolled"] == CAPACITY
+    waitlist = (await client.get("/api/sections/2100101/waitlist")).json()
+    assert len(waitlist) == len(STUDENTS) - CAPACITY
+
+    # بدون صف انتظار، گروه پر با 409 رد می‌شود
+    assert (await client.post("/api/sections/2100101/drop",
+                              json={"stid": waitlist[0]["stid"]})).status_code == 200
+    r = await client.post("/api/sections/2100101/enroll?waitlist=false",
+                          json={"stid": waitlist[0]["stid"]})
+    assert r.status_code == 409
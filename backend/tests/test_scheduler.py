@@ -0,0 +1,121 @@
+import time
+from collections import OrderedDict
+
+import pytest
+
+import scheduler
+import Uni
+from conftest import course, professor, student
+
+pytestmark = pytest.mark.anyio
+
+DAYS = [0, 1]
+PERIODS = ["08:00-09:30", "09:45-11:15"]
+
+
+def _assert_conflict_free(timetable: dict, teachers: dict, enrollments: dict, rooms: list):
+    """No slot holds two meetings of one professor, of students in common, or in one room."""
+    capacity = {room["name"]: room["capacity"] for room in rooms}
+    by_slot = {}
+    for placed in timetable["courses"]:
+        for meeting in placed["meetings"]:
+            assert capacity[meeting["room"]] >= placed["students"]
+            by_slot.setdefault((meeting["day"], meeting["period"]), []).append((placed["cid"], meeting["room"]))
+    for meetings in by_slot.values():
+        cids = [cid for cid, _ in meetings]
+        assert len(set(cids)) == len(cids)
+        assert len({room for _, room in meetings}) == len(meetings)
+        for n, a in enumerate(cids):
+            for b in cids[n + 1:]:
+                assert not set(teachers.get(a, ())) & set(teachers.get(b, ()))
+                assert not set(enrollments.get(a, ())) & set(enrollments.get(b, ()))
+
+
+def test_feasible_timetable_is_conflict_free():
+    # ۸ جلسه در ۴ ساعت و ۲ کلاس؛ دقیقاً جا می‌شود
+    courses = [{"cid": cid, "credit": 3} for cid in ("c1", "c2", "c3", "c4")]
+    teachers = {"c1": ["p1"], "c2": ["p1"], "c3": ["p2"], "c4": ["p2"]}
+    enrollments = {"c1": ["s1", "s2"], "c3": ["s1"], "c4": [f"s{n}" for n in range(3, 33)]}
+    rooms = [{"name": "A", "capacity": 40}, {"name": "B", "capacity": 10}]
+
+    timetable = scheduler.solve_timetable(courses, teachers, enrollments, rooms, DAYS, PERIODS,
+                                          deadline=time.monotonic() + 0.2)
+
+    assert timetable["unscheduled"] == []
+    assert [len(placed["meetings"]) for placed in timetable["courses"]] == [2, 2, 2, 2]
+    for placed in timetable["courses"]:
+        assert placed["schedule"] == ", ".join(f"{m['day']} {m['period']}" for m in placed["meetings"])
+    _assert_conflict_free(timetable, teachers, enrollments, rooms)
+
+
+def test_infeasible_timetable_reports_unscheduled_meetings():
+    # سه درس یک استاد در دو ساعت، و درسی که در هیچ کلاسی جا نمی‌شود
+    courses = [{"cid": cid, "credit": 1} for cid in ("c1", "c2", "c3", "c4")]
+    teachers = {"c1": ["p1"], "c2": ["p1"], "c3": ["p1"]}
+    enrollments = {"c4": [f"s{n}" for n in range(20)]}
+    rooms = [{"name": "A", "capacity": 10}, {"name": "B", "capacity": 10}]
+
+    timetable = scheduler.solve_timetable(courses, teachers, enrollments, rooms, [0], PERIODS,
+                                          deadline=time.monotonic() + 0.2)
+
+    unscheduled = sorted(timetable["unscheduled"], key=lambda item: item["cid"])
+    assert [item["reason"] for item in unscheduled] == ["no conflict-free slot", "no room large enough"]
+    assert unscheduled[0]["cid"] in {"c1", "c2", "c3"}
+    assert unscheduled[1] == {"cid": "c4", "students": 20, "reason": "no room large enough"}
+    _assert_conflict_free(timetable, teachers, enrollments, rooms)
+
+
+def test_exams_keep_shared_students_apart():
+    # سه درس دوبه‌دو دانشجوی مشترک دارند
+    courses = [{"cid": cid, "credit": 3} for cid in ("c1", "c2", "c3")]
+    enrollments = {"c1": ["s1", "s2"], "c2": ["s2", "s3"], "c3": ["s1", "s3"]}
+    rooms = [{"name": "A", "capacity": 10}]
+
+    exams = scheduler.solve_exams(courses, enrollments, rooms, 2, ["09:00"],
+                                  deadline=time.monotonic() + 0.2)
+    assert len(exams["exams"]) == 2
+    assert [item["students"] for item in exams["unscheduled"]] == [2]
+    assert len({(exam["day"], exam["time"]) for exam in exams["exams"]}) == 2
+
+    exams = scheduler.solve_exams(courses, enrollments, rooms, 3, ["09:00", "14:00"],
+                                  deadline=time.monotonic() + 0.2)
+    assert exams["unscheduled"] == []
+    assert len({(exam["day"], exam["time"]) for exam in exams["exams"]}) == 3
+    # با سه روز هیچ دو امتحان مشترکی هم‌روز نمی‌افتند
+    assert exams["cost"]["same_day_shared_students"] == 0
+
+
+async def test_schedule_job_lifecycle(client, monkeypatch):
+    monkeypatch.setattr(Uni, "schedule_jobs", OrderedDict())
+    for cid in ("50001", "50002", "50003"):
+        await client.post("/api/courses/", json=course(cid))
+    await client.post("/api/courses/", json=course("50004", department="علوم پایه"))
+    await client.post("/api/professors/", json=professor(1, course_ids="50001, 50002"))
+    await client.post("/api/students/", json=student(1, courseids="50002,50003"))
+    body = {"department": "اقتصاد", "rooms": [{"name": "A", "capacity": 30}, {"name": "B", "capacity": 30}],
+            "days": DAYS, "periods": PERIODS, "exam_days": 3, "time_limit": 0.5}
+
+    r = await client.post("/api/schedule/jobs", json=body)
+    assert r.status_code == 202
+    submitted = r.json()
+    assert submitted["status"] == "queued"
+    assert submitted["url"] == f"/api/schedule/jobs/{submitted['id']}"
+
+    r = await client.get(submitted["url"], params={"wait": 10})
+    assert r.status_code == 200
+    job = r.json()
+    assert (job["status"], job["phase"], job["progress"], job["error"]) == ("done", "done", 1.0, None)
+
+    timetable = job["result"]["timetable"]
+    assert [placed["cid"] for placed in timetable["courses"]] == ["50001", "50002", "50003"]
+    assert timetable["unscheduled"] == [] and job["result"]["exams"]["unscheduled"] == []
+    _assert_conflict_free(timetable, {"50001": ["100001"], "50002": ["100001"]},
+                          {"50002": [student(1)["stid"]], "50003": [student(1)["stid"]]},
+                          body["rooms"])
+
+    listed = (await client.get("/api/schedule/jobs")).json()
+    assert [item["id"] for item in listed] == [submitted["id"]]
+    assert "result" not in listed[0]
+
+    assert (await client.get("/api/schedule/jobs/missing")).status_code == 404
+    assert (await client.post("/api/schedule/jobs", json={**body, "rooms": []})).status_code == 422
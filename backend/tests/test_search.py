@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import professor, student
+
+pytestmark = pytest.mark.anyio
+
+
+async def _search(client, q: str, **params) -> list:
+    r = await client.get("/api/search", params={"q": q, **params})
+    assert r.status_code == 200
+    return [hit["id"] for hit in r.json()]
+
+
+async def test_search_folds_arabic_letters_and_matches_prefixes(client):
+    await client.post("/api/students/", json=student(1, fname="کیوان", lname="یزدانی"))
+    await client.post("/api/professors/", json=professor(1, fname="مریم", lname="کاظمی"))
+    stid = student(1)["stid"]
+
+    # ي و ك عربی همان ی و ک فارسی هستند
+    assert await _search(client, "كيوان") == [stid]
+    assert await _search(client, "يزد") == [stid]
+    assert await _search(client, "کاظ") == ["100001"]
+    assert await _search(client, "کاظ", kind="student") == []
+    persian_digits = student(1)["nid"].translate(str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹"))
+    assert await _search(client, persian_digits) == [stid]
+
+
+async def test_search_follows_writes(client):
+    await client.post("/api/students/", json=student(1, fname="کیوان"))
+    stid = student(1)["stid"]
+    assert await _search(client, "کیوان") == [stid]
+
+    await client.patch(f"/api/students/{stid}", json={"fname": "بهرام"})
+    assert await _search(client, "کیوان") == []
+    assert await _search(client, "بهر") == [stid]
+
+    r = await client.post("/api/students/bulk?mode=upsert", json=[student(1, fname="کاوه")])
+    assert r.json()["updated"] == 1
+    assert await _search(client, "کاوه") == [stid]
+
+    await client.delete(f"/api/students/{stid}")
+    assert await _search(client, "کاوه") == []
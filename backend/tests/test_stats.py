@@ -0,0 +1,33 @@
+import pytest
+
+from conftest import course, professor, student
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_counters_match_a_recompute_after_writes(client):
+    await client.post("/api/courses/bulk", json=[course(str(16000 + n), credit=1 + n % 3) for n in range(6)])
+    await client.post("/api/courses/", json=course("16100", department="علوم پایه"))
+    for n in range(4):
+        await client.post("/api/students/", json=student(n, married="متاهل" if n % 2 else "مجرد"))
+    await client.post("/api/professors/", json=professor(1))
+
+    await client.patch("/api/courses/16000", json={"credit": 4, "department": "فنی مهندسی"})
+    await client.put("/api/students/40311415001", json=student(1, borncity="شیراز"))
+    await client.delete("/api/courses/16001")
+    await client.delete("/api/students/40311415002")
+    await client.post("/api/courses/bulk?mode=upsert", json=[course("16002", credit=1), course("16200")])
+
+    stats = (await client.get("/api/stats")).json()
+    recomputed = (await client.get("/api/stats", params={"recompute": "true"})).json()
+    assert recomputed.pop("recomputed") == {"mismatches": []}
+    assert stats == recomputed
+
+    assert stats["courses"] == {
+        "total": 7,
+        "by_department": {"اقتصاد": 5, "فنی مهندسی": 1, "علوم پایه": 1},
+        "credits_by_department": {"اقتصاد": 10, "فنی مهندسی": 4, "علوم پایه": 3},
+    }
+    assert stats["students"]["by_borncity"] == {"تهران": 2, "شیراز": 1}
+    assert stats["students"]["by_married"] == {"مجرد": 2, "متاهل": 1}
+    assert stats["professors"]["total"] == 1
@@ -0,0 +1,35 @@
+import pytest
+
+from conftest import course
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_put_with_stale_version_is_rejected(client):
+    created = (await client.post("/api/courses/", json=course("24001"))).json()
+    assert created["version"] == 0
+
+    r = await client.put("/api/courses/24001", json=course("24001", credit=2, version=0))
+    assert r.status_code == 200
+    assert r.json()["version"] == 1
+
+    r = await client.put("/api/courses/24001", json=course("24001", credit=1, version=0))
+    assert r.status_code == 409
+    current = (await client.get("/api/courses/24001")).json()
+    assert (current["credit"], current["version"]) == (2, 1)
+
+
+async def test_patch_with_stale_version_is_rejected(client):
+    await client.post("/api/courses/", json=course("24002"))
+
+    r = await client.patch("/api/courses/24002", json={"credit": 2, "version": 0})
+    assert r.status_code == 200
+    assert r.json()["version"] == 1
+
+    r = await client.patch("/api/courses/24002", json={"credit": 1, "version": 0})
+    assert r.status_code == 409
+    assert (await client.get("/api/courses/24002")).json()["credit"] == 2
+
+    # بدون version نوشتن بدون شرط انجام می‌شود
+    r = await client.patch("/api/courses/24002", json={"credit": 1})
+    assert (r.status_code, r.json()["version"]) == (200, 2)
@@ -0,0 +1,309 @@
+"""Validation rules shared by the Professor, Student, Course and Section models.
+
+Every lookup table, regular expression and error message lives here and is
+built once at import time.  ``RULES`` maps an entity and field name to its
+checker, so the model validators, partial updates and bulk imports all run
+exactly the same code.
+"""
+import re
+
+from pydantic import ValidationError
+
+PERSIAN_TEXT = re.compile(r"[\u0600-\u06FF\s]+")
+
+DEPARTMENTS = frozenset(["فنی مهندسی", "علوم پایه", "اقتصاد"])
+
+PROFESSOR_MAJORS = frozenset([
+    "مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک",
+    "مهندسی معدن", "مهندسی عمران", "مهندسی شهرسازی", "مهندسی پلیمر",
+])
+
+STUDENT_MAJORS_BY_DEPARTMENT = {
+    "فنی مهندسی": frozenset(["مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک"]),
+    "علوم پایه": frozenset(["ریاضی", "فیزیک", "شیمی"]),
+    "اقتصاد": frozenset(["اقتصاد", "مدیریت", "حسابداری"]),
+}
+STUDENT_MAJORS = frozenset().union(*STUDENT_MAJORS_BY_DEPARTMENT.values())
+
+CITIES = frozenset([
+    "تهران", "مشهد", "اصفهان", "کرج", "شیراز", "تبریز", "قم", "اهواز", "کرمانشاه",
+    "ارومیه", "رشت", "زاهدان", "همدان", "کرمان", "یزد", "اردبیل", "بندرعباس",
+    "اراک", "اسلامشهر", "زنجان", "سنندج", "قزوین", "خرم‌آباد", "گرگان",
+    "ساری", "بجنورد", "بوشهر", "بیرجند", "ایلام", "شهرکرد", "یاسوج",
+])
+
+HOME_PHONE_PREFIXES = frozenset(
+    ["021", "031", "041", "042", "045"] + [f"0{n}" for n in range(51, 60)] +
+    [f"0{n}" for n in range(61, 100)])
+
+PERSIAN_LETTERS = frozenset("آابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی")
+
+MARITAL_STATUSES = frozenset(["مجرد", "متاهل"])
+
+# روزهای هر ماه شمسی (اسفند بدون در نظر گرفتن سال کبیسه)
+MONTH_DAYS = {month: 31 if month <= 6 else 30 for month in range(1, 13)}
+
+# هر جلسه گروه درسی: روز هفته از شنبه (0) تا جمعه (6) و ساعت شروع-پایان
+SCHEDULE_SLOT = re.compile(r"\s*([0-6])\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*")
+
+
+# بررسی‌کننده‌های عمومی
+
+
+def persian_text(message: str, max_length: int = None, length_message: str = None):
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError(message)
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(length_message)
+        if not PERSIAN_TEXT.fullmatch(value):
+            raise ValueError(message)
+        return value
+    return check
+
+
+def digits(length: int, length_message: str, digits_message: str = None):
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError(digits_message or length_message)
+        if len(value) != length:
+            raise ValueError(length_message)
+        if not value.isdigit():
+            raise ValueError(digits_message or length_message)
+        return value
+    return check
+
+
+def choice(choices: frozenset, message: str):
+    def check(value):
+        if not isinstance(value, str) or value not in choices:
+            raise ValueError(message)
+        return value
+    return check
+
+
+def national_id_checksum_ok(nid: str) -> bool:
+    check = int(nid[9])
+    s = sum(int(nid[i]) * (10 - i) for i in range(9)) % 11
+    return check == s if s < 2 else check == 11 - s
+
+
+def national_id(nid):
+    if not isinstance(nid, str) or not nid.isdigit():
+        raise ValueError("کد ملی تنها باید از ارقام تشکیل شده باشد.")
+    if len(nid) != 10:
+        raise ValueError("کد ملی باید عددی ده‌رقمی باشد.")
+    if len(set(nid)) == 1:
+        raise ValueError("کد ملی نمی‌تواند از ارقام تکراری تشکیل شده باشد.")
+    if not national_id_checksum_ok(nid):
+        raise ValueError("کد ملی وارد شده نامعتبر است.")
+    return nid
+
+
+def birth_date(date):
+    parts = date.split("/") if isinstance(date, str) else []
+    if len(parts) != 3:
+        raise ValueError("فرمت تاریخ باید به صورت YYYY/MM/DD باشد")
+    try:
+        day, month, year = map(int, parts)
+    except ValueError:
+        raise ValueError(
+            "تاریخ باید فقط شامل اعداد صحیح باشد (مثلاً ۱۳۷۵/۰۵/۲۳)")
+    if not (1300 <= year <= 1400):
+        raise ValueError("سال باید بین ۱۳۰۰ تا ۱۴۰۰ باشد")
+    if not (1 <= month <= 12):
+        raise ValueError("ماه باید بین ۱ تا ۱۲ باشد")
+    if not (1 <= day <= 31):
+        raise ValueError("روز باید بین ۱ تا ۳۱ باشد")
+    if day > MONTH_DAYS[month]:
+        if month == 12:
+            raise ValueError(
+                "اسفندماه حداکثر ۳۰ روز دارد (بدون در نظر گرفتن سال کبیسه)")
+        raise ValueError(f"ماه {month} حداکثر ۳۰ روز دارد")
+    return date
+
+
+def cell_phone(phone_number):
+    if not isinstance(phone_number, str) or not phone_number.isdigit():
+        raise ValueError("شماره تلفن همراه باید تنها متشکل از اعداد باشد")
+    if len(phone_number) != 11:
+        raise ValueError("شماره تلفن همراه باید دارای 11 رقم باشد")
+    if not phone_number.startswith("09"):
+        raise ValueError("شماره تلفن همراه باید با 09 شروغ شود")
+    return phone_number
+
+
+def home_phone(phone_number):
+    if not isinstance(phone_number, str) or len(phone_number) != 11:
+        raise ValueError("شماره تلفن ثابت باید 11 رقم باشد")
+    if phone_number[:3] not in HOME_PHONE_PREFIXES:
+        raise ValueError("پیش شماره تلفن ثابت نادرست است")
+    return phone_number
+
+
+def address(value):
+    if not isinstance(value, str) or len(value) > 100:
+        raise ValueError("آدرس باید حداکثر دارای ۱۰۰ حرف باشد")
+    if len(value) < 1:
+        raise ValueError("آدرس نمیتواند خالی باشد")
+    return value
+
+
+def student_id(value):
+    if not isinstance(value, str):
+        raise ValueError("کد دانشجویی را در قالب یک رشته وارد کنید")
+    if not value.isdigit():
+        raise ValueError("شماره دانشجویی باید تنها متشکل از اعداد باشد")
+    if not value.startswith("403114150"):
+        raise ValueError(
+            "قالب شماره دانشجویی صحیح نیست ( شماره دانشجویی باید با 403114150 شروع بشود)")
+    if len(value) != 11:
+        raise ValueError("شماره دانشجویی باید دارای 11 رقم باشد")
+    return value
+
+
+def parse_schedule(value) -> list[tuple[int, int, int]]:
+    """Parse ``"0 08:00-09:30, 2 08:00-09:30"`` into sorted ``(day, start, end)`` minutes."""
+    message = "برنامه زمانی باید به شکل «روز ساعت شروع-ساعت پایان» باشد، مثلاً 0 08:00-09:30"
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(message)
+    slots = []
+    for part in value.split(","):
+        match = SCHEDULE_SLOT.fullmatch(part)
+        if not match:
+            raise ValueError(message)
+        day, start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+        if start_minute >= 60 or end_minute >= 60:
+            raise ValueError(message)
+        start, end = start_hour * 60 + start_minute, end_hour * 60 + end_minute
+        if not start < end <= 24 * 60:
+            raise ValueError("ساعت پایان هر جلسه باید بعد از ساعت شروع آن باشد")
+        slots.append((day, start, end))
+    slots.sort()
+    for (day, _, end), (next_day, next_start, _) in zip(slots, slots[1:]):
+        if day == next_day and next_start < end:
+            raise ValueError("جلسه های یک گروه درسی نباید با هم تداخل داشته باشند")
+    return slots
+
+
+def schedule(value):
+    return ", ".join(
+        f"{day} {start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+        for day, start, end in parse_schedule(value))
+
+
+def capacity(value):
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= 1000:
+        raise ValueError("ظرفیت گروه درسی عددی صحیح از بازه 1 تا 1000 است")
+    return value
+
+
+def optional(rule):
+    def check(value):
+        return value if value is None else rule(value)
+    return check
+
+
+def credit(value):
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= 4:
+        raise ValueError("تعداد واحد عددی صحیح از بازه 1 تا 4 است")
+    return value
+
+
+postal_code = digits(10, "کد پستی باید عدد ۱۰ رقمی باشد")
+department = choice(
+    DEPARTMENTS, "دانشکده باید یکی از دانشکده های مجاز یعنی فنی مهندسی، علوم پایه یا اقتصاد باشد")
+born_city = choice(CITIES, "شهر محل تولد باید یکی از مراکز استان ها باشد")
+professor_id = digits(6, "کد استاد باید شش رقمی باشد", "کد استادی متشکل از اعداد است")
+course_id = digits(5, "کد درس باید پنج رقمی باشد", "کد درس تنها متشکل از اعداد است")
+
+
+RULES = {
+    "professor": {
+        "lid": professor_id,
+        "fname": persian_text("نام باید فقط حاوی کاراکترهای فارسی باشد",
+                              10, "حداکثر طول نام باید 10 باشد"),
+        "lname": persian_text("نام خانوادگی باید فقط حاوی کاراکترهای فارسی باشد",
+                              10, "حداکثر طول نام خانوادگی باید 10 باشد"),
+        "nation_id": national_id,
+        "department": department,
+        "major": choice(PROFESSOR_MAJORS, "رشته تحصیلی باید یکی از رشته های مجاز دانشکده باشد"),
+        "birth_date": birth_date,
+        "born_city": born_city,
+        "address": address,
+        "postal_code": postal_code,
+        "cphone": cell_phone,
+        "hphone": home_phone,
+    },
+    "student": {
+        "stid": student_id,
+        "fname": persian_text("نام باید تنها متشکل از حروف فارسی باشد"),
+        "lname": persian_text("نام خانوادگی باید تنها متشکل از حروف فارسی باشد"),
+        "father": persian_text("نام پدر باید تنها متشکل از حروف فارسی باشد"),
+        "birth": birth_date,
+        "ids_number": digits(6, "سریال شناسنامه باید عدد ۶ رقمی باشد"),
+        "ids_letter": choice(PERSIAN_LETTERS, "حرف سریال شناسنامه باید یکی از حروف فارسی باشد"),
+        "ids_code": digits(2, "کد سریال شناسنامه باید عدد ۲ رقمی باشد"),
+        "borncity": born_city,
+        "address": address,
+        "postalcode": postal_code,
+        "cphone": cell_phone,
+        "hphone": home_phone,
+        "department": department,
+        "married": choice(MARITAL_STATUSES, "وضعیت تأهل باید {مجرد یا متاهل} باشد"),
+        "nid": national_id,
+        "major": choice(STUDENT_MAJORS, "رشته تحصیلی باید معتبر و مرتبط با دانشکده باشد"),
+    },
+    "course": {
+        "cid": course_id,
+        "course_name": persian_text("نام درس تنها باید حاوی حروف فارسی باشد",
+                                    25, "حداکثر طول نام درس باید 25 حرف باشد"),
+        "credit": credit,
+        "department": department,
+    },
+    "section": {
+        "section_id": digits(7, "کد گروه درسی باید هفت رقمی باشد", "کد گروه درسی تنها متشکل از اعداد است"),
+        "cid": course_id,
+        "lid": optional(professor_id),
+        "capacity": capacity,
+        "schedule": schedule,
+    },
+}
+
+
+def check(entity: str, field: str, value):
+    """Run the rule for ``entity.field`` on ``value``; raise ValueError if invalid."""
+    rule = RULES[entity].get(field)
+    return value if rule is None else rule(value)
+
+
+def check_fields(entity: str, values: dict) -> dict:
+    """Check only the fields present in ``values``; return ``{field: message}``."""
+    errors = {}
+    for field, value in values.items():
+        try:
+            check(entity, field, value)
+        except ValueError as e:
+            errors[field] = str(e)
+    return errors
+
+
+def validate_many(model, rows: list, start: int = 0):
+    """Validate raw ``rows`` against ``model``.
+
+    Returns ``(valid, errors)`` where ``valid`` is a list of
+    ``(index, instance)`` pairs and ``errors`` holds one
+    ``{"index", "detail"}`` entry per rejected row, ``detail`` being a
+    list of ``{"loc", "msg"}`` items in FastAPI's error format.
+    """
+    valid, errors = [], []
+    for index, row in enumerate(rows, start):
+        if not isinstance(row, dict):
+            errors.append({"index": index, "detail": "Row must be a JSON object"})
+            continue
+        try:
+            valid.append((index, model.model_validate(row)))
+        except ValidationError as e:
+            errors.append({"index": index, "detail": [
+                {"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]})
+    return valid, errors
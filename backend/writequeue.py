@@ -0,0 +1,110 @@
+"""Optional group commit for entity writes.
+
+With ``UNI_WRITE_QUEUE=1`` the create and update handlers do not open a
+transaction of their own.  They hand a sync ``operation(conn, *args)`` to
+:func:`submit` and await it.  A single writer task gathers the operations
+queued within ``UNI_WRITE_QUEUE_MS`` milliseconds, at most
+``UNI_WRITE_QUEUE_BATCH`` of them, and runs them in one ``BEGIN IMMEDIATE``
+transaction.  Each operation runs inside its own SAVEPOINT, so one that
+raises is rolled back alone and its caller gets the exception.  Every
+caller's future resolves only after the batch commits.
+
+If the transaction itself fails, every caller in the batch gets the error,
+and the write handlers retry on SQLITE_BUSY as usual.  The queue is per
+process; with several workers each one commits its own batches.
+"""
+import os
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+
+import metrics
+
+ENABLED = os.environ.get("UNI_WRITE_QUEUE", "0") == "1"
+WINDOW_MS = float(os.environ.get("UNI_WRITE_QUEUE_MS", "1"))
+BATCH = int(os.environ.get("UNI_WRITE_QUEUE_BATCH", "200"))
+
+_queue = None
+_task = None
+
+
+async def submit(operation, *args):
+    """Queue ``operation(conn, *args)`` and return its result once its batch has committed."""
+    future = asyncio.get_running_loop().create_future()
+    _queue.put_nowait((operation, args, future))
+    return await future
+
+
+def _apply(conn, batch: list) -> list:
+    outcomes = []
+    for operation, args, _ in batch:
+        savepoint = conn.begin_nested()
+        try:
+            result = operation(conn, *args)
+        except OperationalError:
+            # قفل یا دیسک: کل دسته شکست می‌خورد، نه فقط این عملیات
+            savepoint.rollback()
+            raise
+        except Exception as e:
+            savepoint.rollback()
+            outcomes.append((False, e))
+            continue
+        savepoint.commit()
+        outcomes.append((True, result))
+    return outcomes
+
+
+async def _commit(engine, batch: list):
+    try:
+        async with engine.begin() as conn:
+            # قفل نوشتن از ابتدا گرفته می‌شود تا SAVEPOINT اول تراکنش جدایی باز نکند
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+            outcomes = await conn.run_sync(_apply, batch)
+    except Exception as e:
+        for *_, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    metrics.WRITE_BATCH_SIZE.observe(value=len(batch))
+    for (*_, future), (ok, value) in zip(batch, outcomes):
+        # درخواستی که در این فاصله لغو شده نتیجه‌ای نمی‌گیرد
+        if future.done():
+            continue
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+
+async def _run(engine):
+    stopping = False
+    while not stopping:
+        batch = [await _queue.get()]
+        if WINDOW_MS > 0:
+            await asyncio.sleep(WINDOW_MS / 1000)
+        while len(batch) < BATCH and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        if None in batch:
+            # نشانه توقف؛ نوشتن‌هایی که پیش از آن آمده‌اند هنوز ثبت می‌شوند
+            stopping = True
+            batch = [item for item in batch if item is not None]
+        if batch:
+            await _commit(engine, batch)
+
+
+def start(engine):
+    global _queue, _task
+    if not ENABLED or _task is not None:
+        return
+    _queue = asyncio.Queue()
+    _task = asyncio.create_task(_run(engine))
+
+
+async def stop():
+    """Commit whatever is already queued, then stop the writer."""
+    global _task
+    if _task is None:
+        return
+    _queue.put_nowait(None)
+    await _task
+    _task = None
@@ -1,23 +1,45 @@
+import uuid
 import streamlit as st
 import requests
 import pandas as pd
-from typing import Dict, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Optional, Tuple
 
 BASE_URL = "http://backend:8000/api"
 
-
-def submit_form(endpoint: str, data: Dict):
-    try:
-        response = requests.post(
-            f"{BASE_URL}/{endpoint}/",
-            json=data,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        st.error(f"خطا در ارسال داده: {str(e)}")
-        return None
+# (مهلت اتصال، مهلت خواندن) به ثانیه
+REQUEST_TIMEOUT = (3.05, 30)
+# مدت اعتبار فهرست‌های کش‌شده به ثانیه
+LIST_CACHE_TTL = 30
+
+# اندازه‌های مجاز صفحه در جدول‌ها (سقف API در حالت offset برابر ۱۰۰ است)
+PAGE_SIZES = [25, 50, 100]
+ALL_OPTION = "همه"
+
+DEPARTMENTS = ["فنی مهندسی", "علوم پایه", "اقتصاد"]
+STUDENT_MAJORS = ["مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک",
+                  "ریاضی", "فیزیک", "شیمی", "اقتصاد", "مدیریت", "حسابداری"]
+PROFESSOR_MAJORS = ["مهندسی کامپیوتر", "مهندسی برق", "مهندسی مکانیک", "مهندسی معدن",
+                    "مهندسی عمران", "مهندسی شهرسازی", "مهندسی پلیمر"]
+CITIES = ["تهران", "مشهد", "اصفهان", "کرج", "شیراز", "تبریز", "قم", "اهواز",
+          "کرمانشاه", "ارومیه", "رشت", "زاهدان", "همدان", "کرمان", "یزد",
+          "اردبیل", "بندرعباس", "اراک", "اسلامشهر", "زنجان", "سنندج",
+          "قزوین", "خرم‌آباد", "گرگان", "ساری", "بجنورد", "بوشهر",
+          "بیرجند", "ایلام", "شهرکرد", "یاسوج"]
+
+
+@st.cache_resource
+def get_http() -> requests.Session:
+    """One pooled keep-alive session shared by every rerun and browser tab."""
+    session = requests.Session()
+    # POST و PATCH فرم‌ها با سرآیند Idempotency-Key فرستاده می‌شوند، پس تکرارشان هم امن است
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                  allowed_methods=frozenset(["GET", "PUT", "DELETE", "POST", "PATCH"]))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 st.set_page_config(page_title="سیستم مدیریت دانشگاه",
@@ -143,8 +165,10 @@ def display_error(error_response: Dict):
 
 def delete_item(endpoint: str, item_id: str):
     try:
-        response = requests.delete(f"{BASE_URL}/{endpoint}/{item_id}")
+        response = get_http().delete(
+            f"{BASE_URL}/{endpoint}/{item_id}", timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
+        get_list.clear()
         st.success(f"با موفقیت حذف شد: {item_id}")
     except requests.RequestException as e:
         display_error({"detail": str(e)})
@@ -154,7 +178,8 @@ def delete_item(endpoint: str, item_id: str):
 
 def fetch_item(endpoint: str, item_id: str) -> Dict:
     try:
-        response = requests.get(f"{BASE_URL}/{endpoint}/{item_id}")
+        response = get_http().get(
+            f"{BASE_URL}/{endpoint}/{item_id}", timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
@@ -162,25 +187,112 @@ def fetch_item(endpoint: str, item_id: str) -> Dict:
         return {}
 
 
-def fetch_data(endpoint: str) -> List[Dict]:
+def fetch_for_edit(endpoint: str, item_id: str) -> Dict:
+    """The record as it was when its edit form was first shown; edits are diffed against it."""
+    key = f"{endpoint}_{item_id}_edit"
+    if key not in st.session_state:
+        item = fetch_item(endpoint, item_id)
+        if "version" not in item:
+            return item
+        st.session_state[key] = item
+    return st.session_state[key]
+
+
+@st.cache_data(ttl=LIST_CACHE_TTL, show_spinner=False)
+def get_list(endpoint: str, params: Dict = None) -> Tuple[List[Dict], Optional[int]]:
+    # خطاها کش نمی‌شوند؛ پس از هر نوشتن موفق کل کش پاک می‌شود
+    response = get_http().get(
+        f"{BASE_URL}/{endpoint}/", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    total = response.headers.get("X-Total-Count")
+    return response.json(), int(total) if total is not None else None
+
+
+def fetch_page(endpoint: str, params: Dict, page: int, page_size: int) -> Tuple[List[Dict], int]:
+    page_params = {**params, "offset": page * page_size, "limit": page_size, "count": "true"}
+    return get_list(endpoint, page_params)
+
+
+def show_table(endpoint: str, columns: List[str], labels: List[str], filters: Dict[str, Tuple[str, List[str]]]):
+    """Browse ``endpoint`` page by page with server-side filters; the next page is prefetched."""
+    params = {"fields": ",".join(columns)}
+    filter_columns = st.columns(len(filters) + 1)
+    for column, (name, (label, options)) in zip(filter_columns, filters.items()):
+        value = column.selectbox(label, [ALL_OPTION] + options, key=f"{endpoint}_filter_{name}")
+        if value != ALL_OPTION:
+            params[name] = value
+    page_size = filter_columns[-1].selectbox(
+        "تعداد در صفحه", PAGE_SIZES, index=1, key=f"{endpoint}_page_size")
+
+    # با تغییر فیلترها یا اندازه صفحه به صفحه اول برمی‌گردیم
+    page_key = f"{endpoint}_page"
+    signature = repr((sorted(params.items()), page_size))
+    if st.session_state.get(f"{endpoint}_signature") != signature:
+        st.session_state[f"{endpoint}_signature"] = signature
+        st.session_state[page_key] = 0
+
     try:
-        response = requests.get(f"{BASE_URL}/{endpoint}")
-        response.raise_for_status()
-        return response.json()
+        rows, total = fetch_page(endpoint, params, st.session_state[page_key], page_size)
+        pages = max(1, -(-total // page_size))
+        if st.session_state[page_key] >= pages:
+            st.session_state[page_key] = pages - 1
+            rows, total = fetch_page(endpoint, params, st.session_state[page_key], page_size)
     except requests.RequestException as e:
         st.error(f"خطا در دریافت داده از API: {str(e)}")
-        return []
+        return
+    page = st.session_state[page_key]
+
+    if rows:
+        df = pd.DataFrame(rows)[columns]
+        df.columns = labels
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        first = page * page_size + 1
+        st.caption(f"ردیف {first} تا {first + len(rows) - 1} از {total} — صفحه {page + 1} از {pages}")
+    else:
+        st.info("موردی یافت نشد.")
+
+    def go_to(target: int):
+        st.session_state[page_key] = max(0, min(pages - 1, target))
+
+    previous_column, page_column, next_column = st.columns([1, 2, 1])
+    previous_column.button("قبلی", key=f"{endpoint}_previous", disabled=page == 0,
+                           on_click=go_to, args=(page - 1,))
+    next_column.button("بعدی", key=f"{endpoint}_next", disabled=page >= pages - 1,
+                       on_click=go_to, args=(page + 1,))
+    page_column.number_input("رفتن به صفحه", min_value=1, max_value=pages, value=page + 1,
+                             key=f"{endpoint}_goto_{page}",
+                             on_change=lambda: go_to(st.session_state[f"{endpoint}_goto_{page}"] - 1))
+
+    # پیش‌بارگیری صفحه بعد تا کلیک «بعدی» از کش پاسخ داده شود
+    if page + 1 < pages:
+        try:
+            fetch_page(endpoint, params, page + 1, page_size)
+        except requests.RequestException:
+            pass
 # تابع برای ارسال فرم (ایجاد یا ویرایش)
 
 
-def submit_form(endpoint: str, data: Dict, is_edit: bool = False, item_id: str = None):
+def submit_form(endpoint: str, data: Dict, is_edit: bool = False, item_id: str = None, original: Dict = None):
+    # هر ارسال کلید خودش را دارد؛ تلاش دوباره همان کلید را می‌فرستد و دو بار ثبت نمی‌شود
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
     try:
         if is_edit:
-            response = requests.put(
-                f"{BASE_URL}/{endpoint}/{item_id}", json=data)
+            # فقط فیلدهای تغییرکرده با PATCH فرستاده می‌شوند؛ version از ویرایش همزمان جلوگیری می‌کند
+            changed = {key: value for key, value in data.items() if original.get(key) != value}
+            if not changed:
+                st.info("تغییری ایجاد نشده است.")
+                return True
+            response = get_http().patch(
+                f"{BASE_URL}/{endpoint}/{item_id}", json={**changed, "version": original.get("version")},
+                headers=headers, timeout=REQUEST_TIMEOUT)
         else:
-            response = requests.post(f"{BASE_URL}/{endpoint}/", json=data)
+            response = get_http().post(
+                f"{BASE_URL}/{endpoint}/", json=data, headers=headers, timeout=REQUEST_TIMEOUT)
+        if is_edit and response.status_code in (200, 409):
+            # پس از ذخیره یا برخورد با ویرایش دیگری، فرم با آخرین نسخه دوباره پر می‌شود
+            st.session_state.pop(f"{endpoint}_{item_id}_edit", None)
         response.raise_for_status()
+        get_list.clear()
         st.success("با موفقیت ثبت شد!")
         return True
     except requests.RequestException as e:
@@ -208,13 +320,15 @@ if section == "دانشجو":
     action = st.selectbox("عملیات", ["نمایش", "افزودن", "ویرایش", "حذف"])
 
     if action == "نمایش":
-        students = fetch_data("students")
-        if students:
-            df = pd.DataFrame(students)[
-                ["stid", "fname", "lname", "father", "nid", "department", "major", "birth", "borncity"]]
-            df.columns = ["شماره دانشجویی", "نام", "نام خانوادگی", "نام پدر",
-                          "کد ملی", "دانشکده", "رشته", "تاریخ تولد", "شهر محل تولد"]
-            st.dataframe(df, use_container_width=True)
+        show_table(
+            "students",
+            ["stid", "fname", "lname", "father", "nid", "department", "major", "birth", "borncity"],
+            ["شماره دانشجویی", "نام", "نام خانوادگی", "نام پدر",
+             "کد ملی", "دانشکده", "رشته", "تاریخ تولد", "شهر محل تولد"],
+            {"department": ("دانشکده", DEPARTMENTS),
+             "major": ("رشته", STUDENT_MAJORS),
+             "borncity": ("شهر محل تولد", CITIES),
+             "married": ("وضعیت تأهل", ["مجرد", "متاهل"])})
 
     elif action == "افزودن":
         with st.form("student_form"):
@@ -281,7 +395,7 @@ if section == "دانشجو":
     elif action == "ویرایش":
         student_id = st.text_input("شماره دانشجویی برای ویرایش")
         if student_id:
-            student = fetch_item("students", student_id)
+            student = fetch_for_edit("students", student_id)
             if student:
                 with st.form("student_edit_form"):
                     fname = st.text_input(
@@ -362,7 +476,7 @@ if section == "دانشجو":
                             "lids": lids
                         }
                         submit_form("students", student_data,
-                                    is_edit=True, item_id=student_id)
+                                    is_edit=True, item_id=student_id, original=student)
 
     elif action == "حذف":
         student_id = st.text_input("شماره دانشجویی برای حذف")
@@ -375,13 +489,14 @@ elif section == "استاد":
     action = st.selectbox("عملیات", ["نمایش", "افزودن", "ویرایش", "حذف"])
 
     if action == "نمایش":
-        professors = fetch_data("professors")
-        if professors:
-            df = pd.DataFrame(professors)[
-                ["lid", "fname", "lname", "nation_id", "department", "major", "birth_date", "born_city"]]
-            df.columns = ["کد استاد", "نام", "نام خانوادگی", "کد ملی",
-                          "دانشکده", "رشته", "تاریخ تولد", "شهر محل تولد"]
-            st.dataframe(df, use_container_width=True)
+        show_table(
+            "professors",
+            ["lid", "fname", "lname", "nation_id", "department", "major", "birth_date", "born_city"],
+            ["کد استاد", "نام", "نام خانوادگی", "کد ملی",
+             "دانشکده", "رشته", "تاریخ تولد", "شهر محل تولد"],
+            {"department": ("دانشکده", DEPARTMENTS),
+             "major": ("رشته", PROFESSOR_MAJORS),
+             "born_city": ("شهر محل تولد", CITIES)})
 
     elif action == "افزودن":
         with st.form("professor_form"):
@@ -433,7 +548,7 @@ elif section == "استاد":
     elif action == "ویرایش":
         lid = st.text_input("کد استاد برای ویرایش")
         if lid:
-            professor = fetch_item("professors", lid)
+            professor = fetch_for_edit("professors", lid)
             if professor:
                 with st.form("professor_edit_form"):
                     fname = st.text_input(
@@ -493,7 +608,7 @@ elif section == "استاد":
                             "course_ids": course_ids
                         }
                         submit_form("professors", professor_data,
-                                    is_edit=True, item_id=lid)
+                                    is_edit=True, item_id=lid, original=professor)
 
     elif action == "حذف":
         lid = st.text_input("کد استاد برای حذف")
@@ -506,12 +621,12 @@ elif section == "درس":
     action = st.selectbox("عملیات", ["نمایش", "افزودن", "ویرایش", "حذف"])
 
     if action == "نمایش":
-        courses = fetch_data("courses")
-        if courses:
-            df = pd.DataFrame(courses)[
-                ["cid", "course_name", "credit", "department"]]
-            df.columns = ["کد درس", "نام درس", "واحد", "دانشکده"]
-            st.dataframe(df, use_container_width=True)
+        show_table(
+            "courses",
+            ["cid", "course_name", "credit", "department"],
+            ["کد درس", "نام درس", "واحد", "دانشکده"],
+            {"department": ("دانشکده", DEPARTMENTS),
+             "credit": ("واحد", ["1", "2", "3", "4"])})
 
     elif action == "افزودن":
         with st.form("course_form"):
@@ -535,7 +650,7 @@ elif section == "درس":
     elif action == "ویرایش":
         course_id = st.text_input("کد درس برای ویرایش")
         if course_id:
-            course = fetch_item("courses", course_id)
+            course = fetch_for_edit("courses", course_id)
             if course:
                 with st.form("course_edit_form"):
                     course_name = st.text_input(
@@ -554,7 +669,7 @@ elif section == "درس":
                             "department": department
                         }
                         submit_form("courses", course_data,
-                                    is_edit=True, item_id=course_id)
+                                    is_edit=True, item_id=course_id, original=course)
 
     elif action == "حذف":
         course_id = st.text_input("کد درس برای حذف")